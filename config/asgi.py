@@ -0,0 +1,130 @@
+"""
+ASGI config for config project.
+
+It exposes the ASGI callable as a module-level variable named ``application``.
+
+Django 2.2 has neither an ASGI handler nor async views, so the WSGI
+application is adapted here: the event loop reads the requests and writes
+the responses, while the views, and so the database access, run in a bounded
+thread pool of ASGI_THREADS threads. The views stay synchronous and a request
+holds a thread from start to end, so this serves no more requests at once
+than a threaded WSGI server with as many threads; it only lets ASGI servers
+run the project. Async views need Django 3.1 or later. Serve it with, for
+example:
+
+    gunicorn config.asgi:application -k uvicorn.workers.UvicornWorker
+"""
+
+import asyncio
+import io
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.wsgi import get_wsgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+
+
+class WsgiToAsgi:
+    """
+    Serve a WSGI application over ASGI with a thread pool
+
+    A request is handled from start to end in one thread of the pool, since
+    the database connections of Django belong to a thread.
+    """
+
+    def __init__(self, wsgi_application, max_workers=None):
+        self.wsgi_application = wsgi_application
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='asgi')
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self.lifespan(receive, send)
+        if scope['type'] != 'http':
+            raise ValueError('Unsupported scope type: {}'.format(scope['type']))
+
+        body = await self.read_body(receive)
+        if body is None:
+            return
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(
+            self.executor, self.run_wsgi_application, self.build_environ(scope, body), send, loop
+        )
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                self.executor.shutdown(wait=False)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def read_body(self, receive):
+        body = bytearray()
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                return None
+            body += message.get('body', b'')
+            if not message.get('more_body', False):
+                return bytes(body)
+
+    def build_environ(self, scope, body):
+        server = scope.get('server') or ('localhost', 80)
+        environ = {
+            'REQUEST_METHOD': scope['method'],
+            'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+            'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+            'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+            'SERVER_NAME': server[0],
+            'SERVER_PORT': str(server[1]),
+            'SERVER_PROTOCOL': 'HTTP/{}'.format(scope.get('http_version', '1.1')),
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': scope.get('scheme', 'http'),
+            'wsgi.input': io.BytesIO(body),
+            'wsgi.errors': sys.stderr,
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': True,
+            'wsgi.run_once': False,
+        }
+        if scope.get('client'):
+            environ['REMOTE_ADDR'], environ['REMOTE_PORT'] = scope['client'][0], str(scope['client'][1])
+        for name, value in scope.get('headers', []):
+            name = name.decode('latin-1').upper().replace('-', '_')
+            if name not in ('CONTENT_LENGTH', 'CONTENT_TYPE'):
+                name = 'HTTP_' + name
+            value = value.decode('latin-1')
+            environ[name] = environ[name] + ',' + value if name in environ else value
+        return environ
+
+    def run_wsgi_application(self, environ, send, loop):
+        def call(message):
+            # Wait for the event loop, which holds the thread back on slow clients
+            asyncio.run_coroutine_threadsafe(send(message), loop).result()
+
+        status_and_headers = []
+
+        def start_response(status, headers, exc_info=None):
+            status_and_headers[:] = [int(status.split(' ', 1)[0]), [
+                (name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers
+            ]]
+
+        result = self.wsgi_application(environ, start_response)
+        try:
+            status, headers = status_and_headers
+            call({'type': 'http.response.start', 'status': status, 'headers': headers})
+            for chunk in result:
+                if chunk:
+                    call({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+            call({'type': 'http.response.body', 'body': b''})
+        finally:
+            if hasattr(result, 'close'):
+                result.close()
+
+
+application = WsgiToAsgi(
+    get_wsgi_application(), max_workers=int(os.environ.get('ASGI_THREADS', 0)) or None
+)
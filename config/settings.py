@@ -49,6 +49,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'memo.middleware.RequestMetricsMiddleware',
+    'memo.middleware.ReplicaRoutingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -93,9 +95,52 @@ DATABASES = {
         'PASSWORD': env.get_value('DATABASE_PASSWORD', default='root'),
         'HOST': env.get_value('DATABASE_HOST', default='localhost'),
         'PORT': env.get_value('DATABASE_PORT', default='5432'),
+        # Seconds to keep a connection open across requests, 0 to close it after each one
+        'CONN_MAX_AGE': env.int('DATABASE_CONN_MAX_AGE', default=0),
+        # Whether reused connections are checked before the requests
+        'CONN_HEALTH_CHECKS': env.bool('DATABASE_CONN_HEALTH_CHECKS', default=False),
     }
 }
 
+# Bounded pool of connections per process, PostgreSQL only. The connections
+# go back to the pool at the end of the requests, so keep CONN_MAX_AGE at 0.
+DATABASE_POOL_SIZE = env.int('DATABASE_POOL_SIZE', default=0)
+if DATABASE_POOL_SIZE and DATABASES['default']['ENGINE'] == 'django.db.backends.postgresql':
+    DATABASES['default']['ENGINE'] = 'memo.backends.postgresql_pool'
+    DATABASES['default']['POOL'] = {
+        'MAX_SIZE': DATABASE_POOL_SIZE,
+        'TIMEOUT': env.float('DATABASE_POOL_TIMEOUT', default=10),
+    }
+
+# Read replicas of the default database, given as the NAME of SQLite databases
+# or the HOST[:PORT] of the others, which serve the reads of the memo pages and
+# APIs. The tests run them as mirrors of the default database. The pages read
+# from a replica are only cached for MEMO_REPLICA_STICKY_SECONDS, a lagging
+# replica could be behind the last write.
+MEMO_READ_REPLICAS = []
+for i, replica in enumerate(env.list('DATABASE_REPLICAS', default=[]), 1):
+    alias = 'replica{}'.format(i)
+    DATABASES[alias] = dict(DATABASES['default'], TEST={'MIRROR': 'default'})
+    if DATABASES[alias]['ENGINE'] == 'django.db.backends.sqlite3':
+        DATABASES[alias]['NAME'] = replica
+    else:
+        host, _, port = replica.partition(':')
+        DATABASES[alias].update(HOST=host, PORT=port or DATABASES['default']['PORT'])
+    MEMO_READ_REPLICAS.append(alias)
+
+DATABASE_ROUTERS = ['memo.routers.ReplicaRouter']
+
+# Seconds during which the reads of a client who wrote go to the primary
+MEMO_REPLICA_STICKY_SECONDS = env.int('MEMO_REPLICA_STICKY_SECONDS', default=10)
+
+
+# Cache
+# https://docs.djangoproject.com/en/2.2/topics/cache/
+
+CACHES = {
+    'default': env.cache('CACHE_URL', default='locmemcache://'),
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
@@ -140,3 +185,53 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'static')
 # MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
 AUTH_USER_MODEL = 'memo.Author'
+
+# Search mode of the memos: 'ngram' (substring, n-gram index backed),
+# 'fulltext' (ranked, word based) or 'substring' (no index)
+MEMO_SEARCH_MODE = env.get_value('MEMO_SEARCH_MODE', default='ngram')
+
+# Pagination of the memo list: 'page' (page numbers) or 'cursor' (keyset)
+MEMO_LIST_PAGINATION = env.get_value('MEMO_LIST_PAGINATION', default='page')
+
+# Whether the cursor paginated memo API returns the total count by default
+MEMO_PAGINATION_COUNT = env.bool('MEMO_PAGINATION_COUNT', default=False)
+
+# Timeout in seconds of the cached memo pages and payloads in a shared cache
+MEMO_CACHE_TIMEOUT = env.int('MEMO_CACHE_TIMEOUT', default=3600)
+
+# Whether CACHE_URL is shared by every worker, e.g. memcached or redis. The
+# invalidation of the memo pages, payloads and states on writes only reaches
+# the other workers through a shared cache. Unset, any cache but the local
+# memory one of the default CACHE_URL, which is per process, is taken as shared.
+MEMO_CACHE_SHARED = env.bool('MEMO_CACHE_SHARED', default=None)
+
+# Timeout in seconds of the cached memo pages and payloads in a cache which is
+# not shared, which bounds how long the writes of the other workers go unseen
+MEMO_LOCAL_CACHE_TIMEOUT = env.int('MEMO_LOCAL_CACHE_TIMEOUT', default=5)
+
+# Maximum number of memos accepted by a bulk API request
+MEMO_BULK_MAX_SIZE = env.int('MEMO_BULK_MAX_SIZE', default=1000)
+
+# Codec compressing the memo bodies and their rendered HTML, e.g. 'zlib', or
+# empty to store them as is. Only the bodies of MEMO_BODY_COMPRESSION_THRESHOLD bytes or more are
+# compressed; run compress_memos after changing these, as the search only
+# reads compressed bodies while compression is on
+MEMO_BODY_COMPRESSION = env.get_value('MEMO_BODY_COMPRESSION', default='')
+MEMO_BODY_COMPRESSION_THRESHOLD = env.int('MEMO_BODY_COMPRESSION_THRESHOLD', default=4096)
+
+# Maximum number of compressed bodies, the latest first, decompressed by a
+# search for a keyword of three characters or more
+MEMO_SEARCH_DECOMPRESS_LIMIT = env.int('MEMO_SEARCH_DECOMPRESS_LIMIT', default=1000)
+
+# Every how many revisions of a memo one stores its whole text, the others
+# storing the delta from the previous one
+MEMO_REVISION_SNAPSHOT_INTERVAL = env.int('MEMO_REVISION_SNAPSHOT_INTERVAL', default=10)
+
+# Whether the memo list API renders JSON with orjson, when it is installed
+MEMO_FAST_JSON = env.bool('MEMO_FAST_JSON', default=False)
+
+# Whether the requests are measured, reported in Server-Timing headers and
+# aggregated for the metrics endpoint, which is open to INTERNAL_IPS and staff
+MEMO_METRICS = env.bool('MEMO_METRICS', default=False)
+
+INTERNAL_IPS = env.list('INTERNAL_IPS', default=['127.0.0.1'])
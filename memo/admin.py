@@ -1,16 +1,88 @@
 from django.contrib import admin
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.contrib.admin.views.main import ORDER_VAR, ChangeList
 
 from .models import (
     Author, Memo
 )
+from .pagination import CursorPaginator, EstimatedCountPaginator, InvalidCursor
+from .search import search_memos
 
 
 # Register your models here.
 
+CURSOR_VAR = 'cursor'
+
+
+class MemoChangeList(ChangeList):
+    """
+    Changelist paging with cursors over the default ordering
+
+    Sorted by another column, the pages are numbered as usual. Either way
+    the number of memos is estimated rather than counted.
+    """
+
+    def get_filters_params(self, params=None):
+        params = super().get_filters_params(params)
+        params.pop(CURSOR_VAR, None)
+        return params
+
+    def get_query_string(self, new_params=None, remove=None):
+        # A cursor is only valid for the filters and the ordering it came with
+        if CURSOR_VAR not in (new_params or {}):
+            remove = list(remove or []) + [CURSOR_VAR]
+        return super().get_query_string(new_params, remove)
+
+    def use_cursor(self):
+        return ORDER_VAR not in self.params and not self.show_all
+
+    def get_results(self, request):
+        self.cursor_page = None
+        if not self.use_cursor():
+            return super().get_results(request)
+
+        paginator = CursorPaginator(self.queryset, self.list_per_page)
+        try:
+            page = paginator.page(request.GET.get(CURSOR_VAR))
+        except InvalidCursor:
+            raise IncorrectLookupParameters
+        self.cursor_page = page
+        self.result_count = self.model_admin.get_paginator(request, self.queryset, self.list_per_page).count
+        self.show_full_result_count = False
+        self.show_admin_actions = True
+        self.full_result_count = None
+        self.result_list = page.object_list
+        self.can_show_all = False
+        self.multi_page = page.has_other_pages()
+        self.paginator = paginator
+
+    def get_cursor_url(self, cursor):
+        return self.get_query_string({CURSOR_VAR: cursor})
+
+    def next_url(self):
+        return self.get_cursor_url(self.cursor_page.next_cursor) if self.cursor_page.has_next() else None
+
+    def previous_url(self):
+        return self.get_cursor_url(self.cursor_page.previous_cursor) if self.cursor_page.has_previous() else None
+
+
 class MemoAdmin(admin.ModelAdmin):
     list_display = ('id', 'title', 'slug', 'created_datetime', 'updated_datetime')
     list_display_links = ('id', 'title')
+    search_fields = ('title', 'body__text')
+    date_hierarchy = 'created_datetime'
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_changelist(self, request, **kwargs):
+        return MemoChangeList
+
+    def get_search_results(self, request, queryset, search_term):
+        # Through the search index rather than icontains on every row
+        if not search_term:
+            return queryset, False
+        return search_memos(queryset, search_term), False
 
 
 admin.site.register(Author)
-admin.site.register(Memo, MemoAdmin)
\ No newline at end of file
+admin.site.register(Memo, MemoAdmin)
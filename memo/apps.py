@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class MemoConfig(AppConfig):
     name = 'memo'
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,59 @@
+"""
+PostgreSQL backend taking its connections from a bounded pool per process
+
+Configured with the POOL entry of the database settings:
+
+    'POOL': {'MAX_SIZE': 10, 'TIMEOUT': 10}
+
+Closing a connection, at the end of a request when CONN_MAX_AGE is 0, gives
+it back to the pool instead of disconnecting.
+"""
+from django.db.backends.postgresql import base
+
+from memo.pool import get_pool
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+
+    def get_pool(self, conn_params):
+        pool_settings = self.settings_dict.get('POOL') or {}
+        return get_pool(
+            self.alias,
+            lambda: base.Database.connect(**conn_params),
+            max_size=pool_settings.get('MAX_SIZE', 10),
+            timeout=pool_settings.get('TIMEOUT', 10),
+            check=self.check_pooled_connection if self.settings_dict.get('CONN_HEALTH_CHECKS') else None,
+            params=conn_params,
+        )
+
+    def get_new_connection(self, conn_params):
+        self.pool = self.get_pool(conn_params)
+        connection = self.pool.acquire()
+        # As the parent does, for the new and the reused connections alike
+        options = self.settings_dict['OPTIONS']
+        self.isolation_level = options.get('isolation_level', connection.isolation_level)
+        if self.isolation_level != connection.isolation_level:
+            connection.set_session(isolation_level=self.isolation_level)
+        return connection
+
+    def check_pooled_connection(self, connection):
+        if connection.closed:
+            return False
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+            return True
+        except base.Database.Error:
+            return False
+
+    def _close(self):
+        connection = self.connection
+        # A connection closed in a transaction stays referenced by this
+        # wrapper, so it can't be shared anymore
+        discard = self.in_atomic_block or self.errors_occurred or connection.closed
+        if not discard:
+            try:
+                connection.rollback()
+            except base.Database.Error:
+                discard = True
+        self.pool.release(connection, discard=discard)
@@ -0,0 +1,377 @@
+import platform
+import statistics
+import threading
+import time
+
+import django
+import factory
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.signals import request_finished, request_started
+from django.db import connection, connections
+from django.db.backends.signals import connection_created
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from .bulk import bulk_create_memos
+from .factories import MemoFactory
+from .models import Memo
+from .pool import pool_stats
+from .serializers import MemoRetrieveSerializer
+
+
+class BenchmarkError(Exception):
+    pass
+
+
+def seed_memos(count, batch_size=1000, text_size=0):
+    """
+    Insert count memos built with MemoFactory, batch_size at a time
+
+    With text_size the texts are repeated up to text_size characters.
+    """
+    for start in range(0, count, batch_size):
+        memos = MemoFactory.build_batch(
+            min(batch_size, count - start),
+            title=factory.Sequence(lambda n: 'Memo {}'.format(n)),
+            slug=factory.Sequence(lambda n: 'memo-{}'.format(n)),
+            text=factory.Sequence(lambda n: _memo_text(n, text_size)),
+        )
+        bulk_create_memos(memos, batch_size=batch_size)
+
+
+def _memo_text(n, text_size):
+    text = 'メモ {} の本文です。keyword{}'.format(n, n % 100)
+    if len(text) < text_size:
+        text = (text * (text_size // len(text) + 1))[:text_size]
+    return text
+
+
+def _json(client, method, url, data):
+    return getattr(client, method)(url, data, content_type='application/json')
+
+
+def _prepare_memos(prefix, count):
+    def prepare(i):
+        memos = [
+            Memo(title='Memo {}'.format(n), slug='{}-{}-{}'.format(prefix, i, n))
+            for n in range(count)
+        ]
+        bulk_create_memos(memos)
+    return prepare
+
+
+def get_cases(bulk_size=100):
+    """
+    Return the benchmark cases as {name: (request, prepare)}
+
+    request(client, i) sends the i-th request of the case, after prepare(i)
+    has set up its data outside of the measurement. The writing cases come
+    last so that they don't change what the reading cases see.
+    """
+    slug = Memo.objects.order_by('id').values_list('slug', flat=True).first()
+    slugs = list(Memo.objects.order_by('id').values_list('slug', flat=True)[:bulk_size])
+    if slug is None:
+        raise BenchmarkError('There are no memos to benchmark')
+
+    detail_kwargs = {'slug': slug}
+    return {
+        'index': (lambda client, i: client.get(reverse('memo:index')), None),
+        'index_keyword': (
+            lambda client, i: client.get(reverse('memo:index'), {'keyword': 'keyword1'}), None
+        ),
+        'detail': (lambda client, i: client.get(reverse('memo:detail', kwargs=detail_kwargs)), None),
+        'admin_changelist': (lambda client, i: client.get(reverse('admin:memo_memo_changelist')), None),
+        'api_list': (lambda client, i: client.get(reverse('memo:api_list')), None),
+        'api_search': (
+            lambda client, i: client.get(reverse('memo:api_search'), {'keyword': 'keyword1'}), None
+        ),
+        'api_retrieve': (
+            lambda client, i: client.get(reverse('memo:api_retrieve', kwargs=detail_kwargs)), None
+        ),
+        'api_changes': (lambda client, i: client.get(reverse('memo:api_changes')), None),
+        'api_export': (lambda client, i: client.get(reverse('memo:api_export')), None),
+        'api_create': (
+            lambda client, i: _json(client, 'post', reverse('memo:api_create'), {
+                'title': 'New memo', 'slug': 'bench-create-{}'.format(i), 'text': '本文',
+            }),
+            None,
+        ),
+        'api_update': (
+            lambda client, i: _json(client, 'put', reverse('memo:api_update', kwargs=detail_kwargs), {
+                'title': 'Updated memo {}'.format(i), 'slug': slug, 'text': '本文',
+            }),
+            None,
+        ),
+        'api_delete': (
+            lambda client, i: client.delete(
+                reverse('memo:api_delete', kwargs={'slug': 'bench-delete-{}-0'.format(i)})
+            ),
+            _prepare_memos('bench-delete', 1),
+        ),
+        'api_bulk_create': (
+            lambda client, i: _json(client, 'post', reverse('memo:api_bulk_create'), [
+                {'title': 'New memo', 'slug': 'bench-bulk-create-{}-{}'.format(i, n)}
+                for n in range(bulk_size)
+            ]),
+            None,
+        ),
+        'api_bulk_update': (
+            lambda client, i: _json(client, 'patch', reverse('memo:api_bulk_update'), [
+                {'slug': memo_slug, 'title': 'Updated memo {}'.format(i)} for memo_slug in slugs
+            ]),
+            None,
+        ),
+        'api_bulk_delete': (
+            lambda client, i: _json(client, 'delete', reverse('memo:api_bulk_delete'), [
+                'bench-bulk-delete-{}-{}'.format(i, n) for n in range(bulk_size)
+            ]),
+            _prepare_memos('bench-bulk-delete', bulk_size),
+        ),
+    }
+
+
+def run_case(client, request, prepare=None, iterations=10, clear_cache=True):
+    """
+    Measure a case and return its statistics
+
+    The first request warms up the process and is only used to count the
+    queries, so that capturing them doesn't weigh on the timings.
+    """
+    timings = []
+    queries = None
+    for i in range(iterations + 1):
+        if prepare is not None:
+            prepare(i)
+        if clear_cache:
+            cache.clear()
+        if i == 0:
+            with CaptureQueriesContext(connection) as captured:
+                response = _send(client, request, i)
+            queries = len(captured)
+            sql_ms = sum(float(query['time']) for query in captured) * 1000
+            continue
+        started = time.perf_counter()
+        response = _send(client, request, i)
+        timings.append(time.perf_counter() - started)
+
+    timings.sort()
+    total = sum(timings)
+    return {
+        'iterations': iterations,
+        'queries': queries,
+        'sql_ms': round(sql_ms, 3),
+        'mean_ms': round(total / len(timings) * 1000, 3),
+        'p50_ms': round(statistics.median(timings) * 1000, 3),
+        'p95_ms': round(timings[min(len(timings) - 1, int(len(timings) * 0.95))] * 1000, 3),
+        'max_ms': round(timings[-1] * 1000, 3),
+        'throughput_rps': round(len(timings) / total, 1) if total else None,
+        'status': response.status_code,
+    }
+
+
+def _send(client, request, i):
+    response = request(client, i)
+    if response.streaming:
+        for chunk in response.streaming_content:
+            pass
+    if response.status_code >= 400:
+        raise BenchmarkError('{} returned {}'.format(response.request['PATH_INFO'], response.status_code))
+    return response
+
+
+def run_benchmarks(names=None, iterations=10, clear_cache=True, bulk_size=100):
+    """
+    Run the cases named in names, all of them by default, on the memos in
+    the database and return the results
+    """
+    cases = get_cases(bulk_size=bulk_size)
+    unknown = set(names or ()) - set(cases)
+    if unknown:
+        raise BenchmarkError('Unknown cases: {}'.format(', '.join(sorted(unknown))))
+
+    User = get_user_model()
+    admin, created = User.objects.get_or_create(
+        username='benchmark-admin', defaults={'is_staff': True, 'is_superuser': True}
+    )
+    client = Client()
+    client.force_login(admin)
+
+    results = {}
+    for name, (request, prepare) in cases.items():
+        if names and name not in names:
+            continue
+        results[name] = run_case(client, request, prepare, iterations, clear_cache)
+    return {
+        'meta': {
+            'vendor': connection.vendor,
+            'memos': Memo.objects.count(),
+            'iterations': iterations,
+            'clear_cache': clear_cache,
+            'python': platform.python_version(),
+            'django': django.get_version(),
+        },
+        'cases': results,
+    }
+
+
+def run_connection_benchmark(threads=1, requests=100):
+    """
+    Measure the latency of requests as the connection settings see it
+
+    Each thread runs requests cycles of request_started, the queries of
+    api_retrieve and request_finished, so the connections are opened, checked,
+    kept or given back to the pool as CONN_MAX_AGE, CONN_HEALTH_CHECKS and
+    DATABASE_POOL_SIZE set it. Run it under different settings to compare them.
+    """
+    slugs = list(Memo.objects.order_by('id').values_list('slug', flat=True)[:requests])
+    if not slugs:
+        raise BenchmarkError('There are no memos to benchmark')
+    connection.close()
+
+    timings = []
+    opened = []
+    errors = []
+    lock = threading.Lock()
+
+    def count_connection(sender, connection, **kwargs):
+        with lock:
+            opened.append(connection.alias)
+
+    def worker():
+        worker_timings = []
+        try:
+            for i in range(requests):
+                started = time.perf_counter()
+                request_started.send(sender=None)
+                try:
+                    memo = Memo.objects.get(slug=slugs[i % len(slugs)])
+                    MemoRetrieveSerializer(memo).data
+                finally:
+                    request_finished.send(sender=None)
+                worker_timings.append(time.perf_counter() - started)
+        except Exception as e:
+            with lock:
+                errors.append(e)
+        finally:
+            connections.close_all()
+        with lock:
+            timings.extend(worker_timings)
+
+    connection_created.connect(count_connection)
+    try:
+        started = time.perf_counter()
+        workers = [threading.Thread(target=worker) for i in range(threads)]
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        elapsed = time.perf_counter() - started
+    finally:
+        connection_created.disconnect(count_connection)
+    if errors:
+        raise BenchmarkError('{} threads failed: {}'.format(len(errors), errors[0]))
+
+    timings.sort()
+    settings_dict = connection.settings_dict
+    return {
+        'vendor': connection.vendor,
+        'engine': settings_dict['ENGINE'],
+        'conn_max_age': settings_dict['CONN_MAX_AGE'],
+        'conn_health_checks': settings_dict.get('CONN_HEALTH_CHECKS', False),
+        'threads': threads,
+        'requests': len(timings),
+        'connections': len(opened),
+        'p50_ms': round(statistics.median(timings) * 1000, 3),
+        'p95_ms': round(timings[min(len(timings) - 1, int(len(timings) * 0.95))] * 1000, 3),
+        'max_ms': round(timings[-1] * 1000, 3),
+        'throughput_rps': round(len(timings) / elapsed, 1),
+        'pools': pool_stats(),
+    }
+
+
+LIST_COLUMNS = 'id, title, slug, created_datetime, updated_datetime, sequence'
+
+# Copies of the memos scanned by run_list_scan_benchmark, without and with
+# the text in their rows
+SCAN_TABLES = {
+    'split': ('memo_memo_split_benchmark', 'SELECT memo_memo.* FROM memo_memo'),
+    'wide': (
+        'memo_memo_wide_benchmark',
+        'SELECT memo_memo.*, text, text_html, text_html_key FROM memo_memo '
+        'INNER JOIN memo_memobody ON memo_memobody.memo_id = memo_memo.id',
+    ),
+}
+
+
+def run_list_scan_benchmark(iterations=10):
+    """
+    Compare the ordered scan of the list columns over the memos as they are
+    stored, with the text in MemoBody, and as they were, with the text in
+    the rows of the memo table
+
+    Both layouts are copied to tables built the same way, with the index of
+    the list ordering, so that only the width of the rows differs. The
+    copies are dropped afterwards.
+    """
+    with connection.cursor() as cursor:
+        try:
+            for table, select in SCAN_TABLES.values():
+                cursor.execute('DROP TABLE IF EXISTS {}'.format(table))
+                cursor.execute('CREATE TABLE {} AS {}'.format(table, select))
+                cursor.execute(
+                    'CREATE INDEX {0}_created_id_idx ON {0} (created_datetime DESC, id DESC)'.format(table)
+                )
+                cursor.execute('ANALYZE {}'.format(table))
+            cases = {
+                name: _time_scan(cursor, table, iterations) for name, (table, select) in SCAN_TABLES.items()
+            }
+        finally:
+            for table, select in SCAN_TABLES.values():
+                cursor.execute('DROP TABLE IF EXISTS {}'.format(table))
+    return {
+        'vendor': connection.vendor,
+        'iterations': iterations,
+        'cases': cases,
+        'speedup': round(cases['wide']['p50_ms'] / cases['split']['p50_ms'], 2) if cases['split']['p50_ms'] else None,
+    }
+
+
+def _time_scan(cursor, table, iterations):
+    sql = 'SELECT {} FROM {} ORDER BY created_datetime DESC, id DESC'.format(LIST_COLUMNS, table)
+    timings = []
+    # The first scan warms up the page cache and is not measured
+    for i in range(iterations + 1):
+        started = time.perf_counter()
+        cursor.execute(sql)
+        rows = len(cursor.fetchall())
+        if i:
+            timings.append(time.perf_counter() - started)
+    timings.sort()
+    return {
+        'rows': rows,
+        'p50_ms': round(statistics.median(timings) * 1000, 3),
+        'max_ms': round(timings[-1] * 1000, 3),
+    }
+
+
+def compare_results(results, baseline, threshold=0.2):
+    """
+    Return the regressions of results against baseline as messages
+
+    A case regresses when its median latency grows by more than threshold,
+    or when it issues more queries.
+    """
+    regressions = []
+    for name, result in results['cases'].items():
+        base = baseline['cases'].get(name)
+        if base is None:
+            continue
+        if result['p50_ms'] > base['p50_ms'] * (1 + threshold):
+            regressions.append('{}: p50 {}ms > {}ms (+{:.0%})'.format(
+                name, result['p50_ms'], base['p50_ms'], result['p50_ms'] / base['p50_ms'] - 1
+            ))
+        if result['queries'] > base['queries']:
+            regressions.append('{}: {} queries > {} queries'.format(name, result['queries'], base['queries']))
+    return regressions
@@ -0,0 +1,120 @@
+import collections
+import contextlib
+import logging
+import time
+import traceback
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+logger = logging.getLogger(__name__)
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+def _origin():
+    """
+    Return the formatted frames of the project which led to the current query
+    """
+    frames = [
+        frame for frame in traceback.extract_stack()[:-3]
+        if frame.filename.startswith(str(settings.BASE_DIR))
+        and 'site-packages' not in frame.filename
+        and frame.filename != __file__
+    ]
+    return ''.join(traceback.format_list(frames[-5:]))
+
+
+class QueryBudget(contextlib.ContextDecorator):
+    """
+    Context manager and decorator enforcing a budget on the queries of a block
+
+    The block may issue at most max_queries queries taking max_time_ms in
+    total, and run the same SQL at most max_repeats times, which catches the
+    N+1 patterns whatever the number of rows. A repeated query is reported
+    with the place it was first issued from. Over budget, QueryBudgetExceeded
+    is raised, or a warning is logged when action is 'warn'.
+    """
+
+    def __init__(self, max_queries=None, max_time_ms=None, max_repeats=None, using=None, action='raise'):
+        self.max_queries = max_queries
+        self.max_time_ms = max_time_ms
+        self.max_repeats = max_repeats
+        self.using = [using] if isinstance(using, str) else using
+        self.action = action
+
+    def _recreate_cm(self):
+        # Every decorated call gets its own records
+        return type(self)(self.max_queries, self.max_time_ms, self.max_repeats, self.using, self.action)
+
+    def __enter__(self):
+        self.queries = []
+        self.counts = collections.Counter()
+        self.origins = {}
+        self._wrappers = contextlib.ExitStack()
+        for alias in self.using or connections:
+            self._wrappers.enter_context(connections[alias].execute_wrapper(self._record))
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self._wrappers.close()
+        if exc_type is None:
+            self.check()
+        return False
+
+    def _record(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((sql, (time.perf_counter() - started) * 1000))
+            self.counts[sql] += 1
+            if sql not in self.origins:
+                self.origins[sql] = _origin()
+
+    @property
+    def time_ms(self):
+        return sum(duration for sql, duration in self.queries)
+
+    def problems(self):
+        problems = []
+        if self.max_queries is not None and len(self.queries) > self.max_queries:
+            problems.append('{} queries, more than {}'.format(len(self.queries), self.max_queries))
+        if self.max_time_ms is not None and self.time_ms > self.max_time_ms:
+            problems.append('{:.1f}ms of SQL, more than {}ms'.format(self.time_ms, self.max_time_ms))
+        if self.max_repeats is not None:
+            for sql, count in self.counts.most_common():
+                if count <= self.max_repeats:
+                    break
+                problems.append('{} times, more than {}: {}\nFirst issued from:\n{}'.format(
+                    count, self.max_repeats, sql, self.origins[sql]
+                ))
+        return problems
+
+    def check(self):
+        problems = self.problems()
+        if not problems:
+            return
+        message = 'Query budget exceeded:\n' + '\n'.join(problems)
+        if self.action == 'warn':
+            logger.warning(message)
+        else:
+            queries = '\n'.join('{:.1f}ms {}'.format(duration, sql) for sql, duration in self.queries)
+            raise QueryBudgetExceeded('{}\nQueries:\n{}'.format(message, queries))
+
+
+query_budget = QueryBudget
+
+
+class QueryBudgetMixin:
+    """
+    TestCase mixin asserting the query budget of a block
+
+        with self.assertQueryBudget(max_queries=3, max_repeats=1):
+            self.client.get(url)
+    """
+
+    def assertQueryBudget(self, max_queries=None, max_time_ms=None, max_repeats=None, using=DEFAULT_DB_ALIAS):
+        return QueryBudget(max_queries, max_time_ms, max_repeats, using=using)
@@ -0,0 +1,169 @@
+from django.db import router, transaction
+from django.db.models import prefetch_related_objects
+from django.utils import timezone
+
+from .cache import invalidate_memos
+from .models import BODY_FIELDS, Memo, MemoBody, MemoSequence
+from .rendering import render_memo_html
+from .revisions import record_revisions
+from .rollups import count_memos
+from .search import index_memos
+
+
+# Columns of the bodies storing the rendered text
+HTML_COLUMNS = ['text_html', 'html_data', 'html_codec', 'text_html_key']
+# Columns of the bodies which compression rewrites
+PACKED_COLUMNS = ['text', 'data', 'codec', 'text_html', 'html_data', 'html_codec']
+
+
+def number_memos(memos, using):
+    """Give the memos consecutive change sequences"""
+    if not memos:
+        return
+    last = MemoSequence.allocate(len(memos), using=using)
+    for sequence, memo in enumerate(memos, last - len(memos) + 1):
+        memo.sequence = sequence
+
+
+def bulk_create_memos(memos, batch_size=1000, using=None):
+    """
+    Insert the unsaved memos with bulk_create and return them
+
+    bulk_create skips save() and the model signals, so the bodies, the search
+    index, the rendered text, the revisions, the date rollups and the cache
+    are maintained here.
+    """
+    using = using or router.db_for_write(Memo)
+    bodies = [memo.get_body(load=False) for memo in memos]
+    for body in bodies:
+        render_memo_html(body)
+    with transaction.atomic(using=using, savepoint=False):
+        number_memos(memos, using)
+        Memo.objects.using(using).bulk_create(memos)
+        if memos and memos[0].pk is None:
+            # Primary keys are only returned by some backends
+            pks = dict(
+                Memo.objects.using(using).filter(
+                    slug__in=[memo.slug for memo in memos]
+                ).order_by().values_list('slug', 'pk')
+            )
+            for memo in memos:
+                memo.pk = pks[memo.slug]
+        for memo, body in zip(memos, bodies):
+            body.memo_id = memo.pk
+        MemoBody.objects.using(using).bulk_create(bodies)
+        index_memos(memos, using=using, batch_size=batch_size)
+        record_revisions(memos, created=True, using=using)
+        count_memos(memos, using=using)
+    invalidate_memos([memo.slug for memo in memos], using=using)
+    return memos
+
+
+def bulk_update_memos(memos, fields, batch_size=1000, using=None):
+    """
+    Update the fields of the saved memos with bulk_update and return them
+    """
+    using = using or router.db_for_write(Memo)
+    now = timezone.now()
+    update_body = not BODY_FIELDS.isdisjoint(fields)
+    fields = [field for field in fields if field not in BODY_FIELDS] + ['updated_datetime', 'sequence']
+    for memo in memos:
+        memo.updated_datetime = now
+    if update_body:
+        bodies = [memo.get_body(load=False) for memo in memos]
+        for memo, body in zip(memos, bodies):
+            body.memo_id = memo.pk
+            render_memo_html(body)
+    else:
+        # The search index reads the text of every memo
+        prefetch_related_objects(memos, 'body')
+    with transaction.atomic(using=using, savepoint=False):
+        number_memos(memos, using)
+        Memo.objects.using(using).bulk_update(memos, fields, batch_size=batch_size)
+        if update_body:
+            MemoBody.objects.using(using).bulk_update(
+                bodies, ['text', 'data', 'codec', *HTML_COLUMNS], batch_size=batch_size
+            )
+        index_memos(memos, using=using, batch_size=batch_size)
+        record_revisions(memos, using=using)
+    invalidate_memos([memo.slug for memo in memos], using=using)
+    return memos
+
+
+def bulk_delete_memos(slugs, using=None):
+    """
+    Delete the memos with the slugs and return the slugs which were deleted
+
+    The deletion goes through the model signals like a single deletion.
+    """
+    using = using or router.db_for_write(Memo)
+    memos = Memo.objects.using(using).filter(slug__in=slugs)
+    deleted = set(memos.values_list('slug', flat=True))
+    memos.delete()
+    return deleted
+
+
+def render_memos(batch_size=1000, using=None):
+    """
+    Store the rendered text of the memos whose stored HTML is missing or
+    stale, and return their number
+
+    The memos keep their update time, as their content does not change, but
+    those whose HTML changed get new sequences for the syncing clients.
+    """
+    using = using or router.db_for_write(Memo)
+    bodies = MemoBody.objects.using(using).select_related('memo').only(
+        'memo_id', 'memo__slug', 'text', 'data', 'codec', *HTML_COLUMNS
+    ).order_by('memo_id')
+    rendered = 0
+    batch = []
+    for body in bodies.iterator(chunk_size=batch_size):
+        text_html = body.get_text_html()
+        if render_memo_html(body):
+            batch.append((body, body.get_text_html() != text_html))
+        if len(batch) >= batch_size:
+            rendered += _save_rendered(batch, using)
+            batch = []
+    return rendered + _save_rendered(batch, using)
+
+
+def _save_rendered(batch, using):
+    if not batch:
+        return 0
+    bodies = [body for body, changed in batch]
+    memos = [body.memo for body, changed in batch if changed]
+    with transaction.atomic(using=using, savepoint=False):
+        number_memos(memos, using)
+        Memo.objects.using(using).bulk_update(memos, ['sequence'])
+        MemoBody.objects.using(using).bulk_update(bodies, HTML_COLUMNS)
+    invalidate_memos([body.memo.slug for body in bodies], using=using)
+    return len(bodies)
+
+
+def compress_memos(batch_size=1000, using=None):
+    """
+    Store the texts and the rendered texts of the memos compressed or not as
+    MEMO_BODY_COMPRESSION and MEMO_BODY_COMPRESSION_THRESHOLD say, and return
+    the number of memos whose storage changed
+
+    The texts don't change, so neither do the memos, the search index nor
+    the cache.
+    """
+    using = using or router.db_for_write(Memo)
+    bodies = MemoBody.objects.using(using).only('memo_id', *PACKED_COLUMNS).order_by('memo_id')
+    packed = 0
+    batch = []
+    for body in bodies.iterator(chunk_size=batch_size):
+        if body.pack():
+            batch.append(body)
+        if len(batch) >= batch_size:
+            packed += _save_packed(batch, using)
+            batch = []
+    return packed + _save_packed(batch, using)
+
+
+def _save_packed(bodies, using):
+    if not bodies:
+        return 0
+    MemoBody.objects.using(using).bulk_update(bodies, PACKED_COLUMNS)
+    return len(bodies)
@@ -0,0 +1,128 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+
+from .routers import reading_from_replica
+
+
+LIST_GENERATION_KEY = 'memo:list:generation'
+MEMO_VERSION_KEY = 'memo:version:{}'
+
+
+def get_cache_timeout():
+    """
+    Return the timeout of the cached memo entries, short in a cache which is
+    not shared by the workers
+    """
+    if not is_cache_shared():
+        return getattr(settings, 'MEMO_LOCAL_CACHE_TIMEOUT', 5)
+    return getattr(settings, 'MEMO_CACHE_TIMEOUT', 3600)
+
+
+def is_cache_shared():
+    """
+    Return whether the cache is shared by the workers, see MEMO_CACHE_SHARED
+    """
+    shared = getattr(settings, 'MEMO_CACHE_SHARED', None)
+    if shared is None:
+        return not isinstance(caches['default'], LocMemCache)
+    return shared
+
+
+def fill_cache(key, value):
+    """
+    Cache the value read for the request
+
+    A replica may return the state before the last write, which would then
+    be served from the cache until the next one, so the values read from a
+    replica expire after MEMO_REPLICA_STICKY_SECONDS, the lag the routing
+    already expects. The writes of the other workers don't invalidate a per
+    process cache, so the entries expire after MEMO_LOCAL_CACHE_TIMEOUT there.
+    """
+    timeout = get_cache_timeout()
+    if reading_from_replica():
+        timeout = min(timeout, getattr(settings, 'MEMO_REPLICA_STICKY_SECONDS', 10))
+    cache.set(key, value, timeout)
+
+
+def _new_generation():
+    # A fresh generation never collides with one used before the key was evicted
+    return int(time.time() * 1000)
+
+
+def _get_generation(key):
+    generation = cache.get(key)
+    if generation is None:
+        cache.add(key, _new_generation(), None)
+        generation = cache.get(key, 0)
+    return generation
+
+
+def _bump_generation(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, _new_generation(), None)
+
+
+def get_list_generation():
+    """
+    Return the generation of the memo lists, which changes on every memo write
+    """
+    return _get_generation(LIST_GENERATION_KEY)
+
+
+def bump_list_generation(using=None):
+    """
+    Invalidate every cached memo list entry once the current transaction of
+    the database using commits
+    """
+    # A read between the bump and the commit would cache the data before the
+    # write under the new generation
+    transaction.on_commit(lambda: _bump_generation(LIST_GENERATION_KEY), using=using)
+
+
+def list_cache_key(prefix, *parts):
+    """
+    Return a cache key for a memo list entry in the current generation
+    """
+    digest = hashlib.md5(repr(parts).encode()).hexdigest()
+    return 'memo:list:{}:{}:{}'.format(get_list_generation(), prefix, digest)
+
+
+def get_memo_version(slug):
+    """
+    Return the version of the memo, which changes on every write of the memo
+    """
+    return _get_generation(MEMO_VERSION_KEY.format(slug))
+
+
+def bump_memo_version(slug, using=None):
+    """
+    Invalidate every cached entry of the memo once the current transaction of
+    the database using commits
+    """
+    transaction.on_commit(lambda: _bump_generation(MEMO_VERSION_KEY.format(slug)), using=using)
+
+
+def memo_cache_key(prefix, slug, *parts):
+    """
+    Return a cache key for an entry of the memo in its current version
+    """
+    key = 'memo:{}:{}:{}'.format(prefix, slug, get_memo_version(slug))
+    if parts:
+        key += ':' + hashlib.md5(repr(parts).encode()).hexdigest()
+    return key
+
+
+def invalidate_memos(slugs, using=None):
+    """
+    Invalidate the cached entries of memos written without model signals
+    """
+    bump_list_generation(using=using)
+    for slug in slugs:
+        bump_memo_version(slug, using=using)
@@ -0,0 +1,55 @@
+import zlib
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+CODECS = {}
+
+
+def register_codec(name, compress, decompress):
+    """
+    Register a codec for MEMO_BODY_COMPRESSION
+
+    compress and decompress take and return bytes. The name is stored with
+    every body it compressed, so a codec must stay registered as long as
+    bodies use it.
+    """
+    CODECS[name] = (compress, decompress)
+
+
+register_codec('zlib', zlib.compress, zlib.decompress)
+
+
+def get_codec():
+    codec = getattr(settings, 'MEMO_BODY_COMPRESSION', '')
+    if codec and codec not in CODECS:
+        raise ImproperlyConfigured('Unknown MEMO_BODY_COMPRESSION codec: {}'.format(codec))
+    return codec
+
+
+def pack_text(text):
+    """
+    Return the (text, data, codec) columns storing the text
+
+    The text is compressed with MEMO_BODY_COMPRESSION when it is at least
+    MEMO_BODY_COMPRESSION_THRESHOLD bytes long and compressing shrinks it.
+    """
+    codec = get_codec()
+    if codec:
+        encoded = text.encode()
+        if len(encoded) >= getattr(settings, 'MEMO_BODY_COMPRESSION_THRESHOLD', 4096):
+            data = CODECS[codec][0](encoded)
+            if len(data) < len(encoded):
+                return '', data, codec
+    return text, None, ''
+
+
+def unpack_text(text, data, codec):
+    """
+    Return the text stored in the (text, data, codec) columns
+    """
+    if not codec:
+        return text
+    if codec not in CODECS:
+        raise ValueError('Unknown codec: {}'.format(codec))
+    return CODECS[codec][1](bytes(data)).decode()
@@ -0,0 +1,93 @@
+import csv
+import datetime
+import json
+
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from rest_framework.fields import DateTimeField
+
+from .compression import unpack_text
+from .models import Memo
+
+
+EXPORT_FIELDS = ('id', 'title', 'slug', 'text', 'created_datetime', 'updated_datetime')
+# The columns of EXPORT_FIELDS, the text being stored in MemoBody, followed
+# by the columns of the compressed text
+EXPORT_COLUMNS = (
+    'id', 'title', 'slug', 'body__text', 'created_datetime', 'updated_datetime', 'body__data', 'body__codec'
+)
+EXPORT_FORMATS = ('ndjson', 'csv')
+CONTENT_TYPES = {
+    'ndjson': 'application/x-ndjson; charset=utf-8',
+    'csv': 'text/csv; charset=utf-8',
+}
+
+
+def parse_timestamp(value):
+    """
+    Parse an ISO 8601 datetime or date into an aware datetime
+
+    Raise ValueError if the value is not a valid datetime or date.
+    """
+    parsed = parse_datetime(value)
+    if parsed is None:
+        date = parse_date(value)
+        if date is None:
+            raise ValueError('Invalid datetime: {}'.format(value))
+        parsed = datetime.datetime.combine(date, datetime.time())
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+def export_queryset(updated_since=None, updated_until=None):
+    """
+    Return the rows of the memos to export in the order of their ids
+    """
+    memos = Memo.objects.order_by('id')
+    if updated_since is not None:
+        memos = memos.filter(updated_datetime__gte=updated_since)
+    if updated_until is not None:
+        memos = memos.filter(updated_datetime__lt=updated_until)
+    return memos.values_list(*EXPORT_COLUMNS)
+
+
+def iter_rows(queryset, chunk_size=1000):
+    """
+    Yield the exported rows as dicts, fetching chunk_size rows at a time
+    """
+    datetime_field = DateTimeField()
+    for values in queryset.iterator(chunk_size=chunk_size):
+        row = dict(zip(EXPORT_FIELDS, values))
+        row['text'] = unpack_text(row['text'], *values[len(EXPORT_FIELDS):])
+        row['created_datetime'] = datetime_field.to_representation(row['created_datetime'])
+        row['updated_datetime'] = datetime_field.to_representation(row['updated_datetime'])
+        yield row
+
+
+def iter_ndjson(rows):
+    for row in rows:
+        yield json.dumps(row, ensure_ascii=False) + '\n'
+
+
+class _Echo:
+    """File-like object which returns what is written to it"""
+
+    def write(self, value):
+        return value
+
+
+def iter_csv(rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(EXPORT_FIELDS)
+    for row in rows:
+        yield writer.writerow([row[field] for field in EXPORT_FIELDS])
+
+
+def iter_export(export_format, rows):
+    """
+    Yield the rows serialized in the export format chunk by chunk
+    """
+    if export_format == 'csv':
+        return iter_csv(rows)
+    return iter_ndjson(rows)
@@ -0,0 +1,16 @@
+import factory
+from django.utils import timezone
+
+from .models import Memo
+
+
+class MemoFactory(factory.django.DjangoModelFactory):
+    """Create data for the Memo model used for tests"""
+    title = 'Example memo'
+    slug = 'example-memo'
+    text = 'This is an example memo.'
+    created_datetime = timezone.now()
+    updated_datetime = timezone.now()
+
+    class Meta:
+        model = Memo
@@ -1,7 +1,7 @@
 from django import forms
-from django.db.models import Q
 
 from .models import Memo
+from .search import get_search_mode, search_memos
 
 
 class MemoForm(forms.ModelForm):
@@ -31,6 +31,16 @@ class MemoForm(forms.ModelForm):
         model = Memo
         fields = ('title', 'slug', 'text')
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # The text is stored in MemoBody, which the model form doesn't see
+        if self.instance.pk is not None:
+            self.initial.setdefault('text', self.instance.text)
+
+    def save(self, commit=True):
+        self.instance.text = self.cleaned_data['text']
+        return super().save(commit)
+
 
 class MemoSearchForm(forms.Form):
     keyword = forms.CharField(
@@ -41,13 +51,20 @@ class MemoSearchForm(forms.Form):
         }),
         required=False,
     )
+    mode = forms.CharField(
+        label='',
+        widget=forms.HiddenInput,
+        required=False,
+    )
+
+    def clean_mode(self):
+        # An unknown mode falls back to MEMO_SEARCH_MODE rather than dropping the keyword
+        return get_search_mode(self.cleaned_data['mode'])
 
     def filter_memos(self, memos):
         if self.is_valid():
             keyword = self.cleaned_data.get('keyword')
             if keyword:
-                memos = memos.filter(
-                    Q(title__icontains=keyword) | Q(text__icontains=keyword)
-                )
+                memos = search_memos(memos, keyword, self.cleaned_data.get('mode'))
 
         return memos
\ No newline at end of file
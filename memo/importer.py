@@ -0,0 +1,126 @@
+import csv
+import json
+
+from django.db import router, transaction
+from rest_framework import serializers
+from rest_framework.settings import api_settings
+
+from .bulk import bulk_create_memos, bulk_update_memos
+from .models import Memo
+from .serializers import MemoCreateSerializer, without_unique_slug
+
+
+IMPORT_FORMATS = ('ndjson', 'csv')
+
+
+def read_rows(stream, import_format):
+    """
+    Yield (row number, row) from the NDJSON or CSV stream
+
+    The row is None when it can't be read as an object.
+    """
+    if import_format == 'csv':
+        for number, row in enumerate(csv.DictReader(stream), 1):
+            yield number, row
+        return
+
+    number = 0
+    for line in stream:
+        if not line.strip():
+            continue
+        number += 1
+        try:
+            row = json.loads(line)
+        except ValueError:
+            row = None
+        yield number, row if isinstance(row, dict) else None
+
+
+class MemoImporter:
+    """
+    Import rows of memos in batches written with bulk queries
+
+    Every row is validated with the MemoCreateSerializer rules, except that
+    the slugs of a batch are looked up with a single query. A slug repeated
+    in a batch keeps its last row. Memos whose slug already exists are
+    updated in the upsert mode and skipped otherwise.
+    """
+
+    def __init__(self, batch_size=1000, upsert=False, using=None, on_error=None):
+        self.batch_size = batch_size
+        self.upsert = upsert
+        self.using = using or router.db_for_write(Memo)
+        self.on_error = on_error
+        self.validator = without_unique_slug(MemoCreateSerializer())
+        self.stats = dict.fromkeys(('rows', 'created', 'updated', 'skipped', 'duplicated', 'invalid'), 0)
+
+    def import_rows(self, rows, start=0, on_batch=None):
+        """
+        Import the (row number, row) pairs after the row number start
+
+        on_batch is called with the last row number of every committed batch.
+        """
+        batch = []
+        for number, row in rows:
+            if number <= start:
+                continue
+            batch.append((number, row))
+            if len(batch) >= self.batch_size:
+                self.import_batch(batch)
+                if on_batch is not None:
+                    on_batch(number)
+                batch = []
+        if batch:
+            self.import_batch(batch)
+            if on_batch is not None:
+                on_batch(batch[-1][0])
+        return self.stats
+
+    def import_batch(self, batch):
+        memos = {}
+        for number, row in batch:
+            data = self.validate(number, row)
+            if data is None:
+                continue
+            if data['slug'] in memos:
+                self.stats['duplicated'] += 1
+            memos[data['slug']] = data
+
+        with transaction.atomic(using=self.using):
+            existing = {
+                memo.slug: memo
+                for memo in Memo.objects.using(self.using).select_for_update().filter(
+                    slug__in=list(memos)
+                ).only('id', 'slug')
+            }
+            created = [Memo(**data) for slug, data in memos.items() if slug not in existing]
+            updated = []
+            if self.upsert:
+                for slug, memo in existing.items():
+                    memo.title = memos[slug]['title']
+                    memo.text = memos[slug].get('text', '')
+                    updated.append(memo)
+            if created:
+                bulk_create_memos(created, batch_size=self.batch_size, using=self.using)
+            if updated:
+                bulk_update_memos(updated, ['title', 'text'], batch_size=self.batch_size, using=self.using)
+
+        self.stats['rows'] += len(batch)
+        self.stats['created'] += len(created)
+        self.stats['updated'] += len(updated)
+        self.stats['skipped'] += len(existing) - len(updated)
+
+    def validate(self, number, row):
+        if row is None:
+            self.add_error(number, {api_settings.NON_FIELD_ERRORS_KEY: ['This row is not an object.']})
+            return None
+        try:
+            return self.validator.run_validation(row)
+        except serializers.ValidationError as e:
+            self.add_error(number, e.detail)
+            return None
+
+    def add_error(self, number, detail):
+        self.stats['invalid'] += 1
+        if self.on_error is not None:
+            self.on_error(number, detail)
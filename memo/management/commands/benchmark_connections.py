@@ -0,0 +1,50 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from memo.benchmarks import BenchmarkError, run_connection_benchmark, seed_memos
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark the request latency under the connection settings, e.g. against a local '
+        'Postgres with DATABASE_ENGINE=django.db.backends.postgresql and either '
+        'DATABASE_CONN_MAX_AGE=60, DATABASE_CONN_HEALTH_CHECKS=True or DATABASE_POOL_SIZE=5. '
+        'The requests run on a throwaway database seeded with --memos memos.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--memos', type=int, default=100)
+        parser.add_argument('--threads', type=int, nargs='+', default=[1, 4, 16])
+        parser.add_argument('--requests', type=int, default=200, help='Requests per thread')
+        parser.add_argument('--output', help='File to write the JSON results to')
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        results = []
+        try:
+            seed_memos(options['memos'])
+            for threads in options['threads']:
+                results.append(run_connection_benchmark(threads, options['requests']))
+        except BenchmarkError as e:
+            raise CommandError(e)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        for result in results:
+            self.stdout.write(
+                '{vendor} CONN_MAX_AGE={conn_max_age} health checks={conn_health_checks} '
+                '{threads:3d} threads  p50 {p50_ms:8.2f}ms  p95 {p95_ms:8.2f}ms  '
+                '{throughput_rps:8.1f} req/s  {connections} connections'.format(**result)
+            )
+            for alias, stats in result['pools'].items():
+                self.stdout.write('    pool {}: {waits} waits, {wait_ms:.1f}ms waiting, {timeouts} timeouts'.format(
+                    alias, **stats
+                ))
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(results, f, indent=2)
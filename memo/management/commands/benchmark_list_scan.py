@@ -0,0 +1,39 @@
+import json
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from memo.benchmarks import run_list_scan_benchmark, seed_memos
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare the list scans of the memo table, which leaves the text to MemoBody, with a '
+        'copy of it keeping the text in its rows. The scans run on a throwaway database seeded '
+        'with --memos memos of --text-size characters.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--memos', type=int, default=10000)
+        parser.add_argument('--text-size', type=int, default=2000)
+        parser.add_argument('--iterations', type=int, default=10)
+        parser.add_argument('--output', help='File to write the JSON results to')
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            seed_memos(options['memos'], text_size=options['text_size'])
+            result = run_list_scan_benchmark(options['iterations'])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        result.update(memos=options['memos'], text_size=options['text_size'])
+        for name, case in result['cases'].items():
+            self.stdout.write('{:<6} {rows} rows  p50 {p50_ms:9.2f}ms  max {max_ms:9.2f}ms'.format(name, **case))
+        self.stdout.write('speedup {}x'.format(result['speedup']))
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(result, f, indent=2)
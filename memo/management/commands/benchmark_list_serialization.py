@@ -0,0 +1,71 @@
+import datetime
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from memo.models import Memo
+from memo.renderers import FastJSONRenderer, orjson
+from memo.serializers import MemoListSerializer, MemoListValuesSerializer
+
+
+class Command(BaseCommand):
+    help = 'Compare the list serialization of MemoListSerializer with the values_list path'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, nargs='+', default=[1000, 10000, 100000])
+        parser.add_argument('--repeat', type=int, default=3, help='The best of the runs is reported')
+
+    def handle(self, *args, **options):
+        if orjson is None:
+            self.stderr.write('orjson is not installed, FastJSONRenderer falls back to JSONRenderer')
+        for rows in options['rows']:
+            memos, values = self.build_rows(rows)
+            cases = [
+                ('MemoListSerializer + JSONRenderer', lambda: JSONRenderer().render(
+                    MemoListSerializer(memos, many=True).data
+                )),
+                ('MemoListValuesSerializer + JSONRenderer', lambda: JSONRenderer().render(
+                    MemoListValuesSerializer(values, many=True).data
+                )),
+                ('MemoListValuesSerializer + FastJSONRenderer', lambda: FastJSONRenderer().render(
+                    MemoListValuesSerializer(values, many=True).data
+                )),
+            ]
+            outputs = set()
+            baseline = None
+            self.stdout.write('{} rows'.format(rows))
+            for name, func in cases:
+                elapsed, output = self.measure(func, options['repeat'])
+                outputs.add(output)
+                baseline = baseline or elapsed
+                self.stdout.write('  {:<45} {:8.3f}s {:6.1f}x'.format(name, elapsed, baseline / elapsed))
+            if len(outputs) != 1:
+                self.stderr.write('  The outputs differ')
+
+    def build_rows(self, rows):
+        """
+        Build unsaved memos and their values_list rows, so that only the
+        serialization is measured
+        """
+        now = timezone.now()
+        memos = []
+        for i in range(rows):
+            created = now - datetime.timedelta(seconds=i)
+            memos.append(Memo(
+                id=i + 1, title='メモ {}'.format(i), slug='memo-{}'.format(i), text='',
+                created_datetime=created, updated_datetime=created, sequence=i + 1,
+            ))
+        columns = MemoListValuesSerializer().columns
+        values = [tuple(getattr(memo, column) for column in columns) for memo in memos]
+        return memos, values
+
+    def measure(self, func, repeat):
+        best = None
+        for i in range(repeat):
+            started = time.perf_counter()
+            output = func()
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        return best, output
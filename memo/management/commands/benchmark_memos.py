@@ -0,0 +1,60 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from memo.benchmarks import BenchmarkError, compare_results, run_benchmarks, seed_memos
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark the memo pages and APIs on a throwaway database seeded with --memos memos. '
+        'The database is created like the test database of the configured backend, so the '
+        'benchmark runs on SQLite or Postgres depending on DATABASE_ENGINE.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('cases', nargs='*', help='Cases to run, all of them by default')
+        parser.add_argument('--memos', type=int, default=1000)
+        parser.add_argument('--iterations', type=int, default=20)
+        parser.add_argument('--bulk-size', type=int, default=100)
+        parser.add_argument('--warm-cache', action='store_true', help='Keep the cache between requests')
+        parser.add_argument('--output', help='File to write the JSON results to')
+        parser.add_argument('--baseline', help='JSON results to compare with')
+        parser.add_argument('--threshold', type=float, default=0.2, help='Allowed growth of the median latency')
+
+    def handle(self, *args, **options):
+        baseline = None
+        if options['baseline']:
+            with open(options['baseline']) as f:
+                baseline = json.load(f)
+
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            seed_memos(options['memos'])
+            results = run_benchmarks(
+                options['cases'], iterations=options['iterations'],
+                clear_cache=not options['warm_cache'], bulk_size=options['bulk_size'],
+            )
+        except BenchmarkError as e:
+            raise CommandError(e)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        for name, result in results['cases'].items():
+            self.stdout.write(
+                '{:<20} p50 {p50_ms:9.2f}ms  p95 {p95_ms:9.2f}ms  {throughput_rps:8.1f} req/s  '
+                '{queries:3d} queries  {sql_ms:8.2f}ms SQL'.format(name, **result)
+            )
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(results, f, indent=2)
+
+        if baseline is not None:
+            regressions = compare_results(results, baseline, options['threshold'])
+            if regressions:
+                raise CommandError('Regressions:\n' + '\n'.join(regressions))
+            self.stdout.write(self.style.SUCCESS('No regression against {}'.format(options['baseline'])))
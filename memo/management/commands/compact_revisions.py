@@ -0,0 +1,33 @@
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+from django.utils import timezone
+
+from memo.revisions import compact_revisions
+
+
+class Command(BaseCommand):
+    help = (
+        'Drop the old revisions of the memos and re-encode the others with a snapshot every '
+        'MEMO_REVISION_SNAPSHOT_INTERVAL revisions. The latest revision of a memo is always kept.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--keep', type=int, help='Number of revisions to keep per memo')
+        parser.add_argument('--days', type=int, help='Drop the revisions older than this many days')
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+        parser.add_argument('--batch-size', type=int, default=100, help='Memos compacted per transaction')
+
+    def handle(self, *args, **options):
+        if options['keep'] is not None and options['keep'] < 1:
+            raise CommandError('--keep must be at least 1')
+        before = None
+        if options['days'] is not None:
+            before = timezone.now() - datetime.timedelta(days=options['days'])
+        stats = compact_revisions(
+            keep=options['keep'], before=before, batch_size=options['batch_size'], using=options['database']
+        )
+        self.stdout.write(self.style.SUCCESS(
+            'Deleted {deleted} revisions, rewrote {rewritten} revisions'.format(**stats)
+        ))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS
+
+from memo.bulk import compress_memos
+
+
+class Command(BaseCommand):
+    help = (
+        'Compress the memo bodies, or store them as is, as MEMO_BODY_COMPRESSION and '
+        'MEMO_BODY_COMPRESSION_THRESHOLD say. Run it after changing them.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        packed = compress_memos(batch_size=options['batch_size'], using=options['database'])
+        self.stdout.write(self.style.SUCCESS('Repacked {} memos'.format(packed)))
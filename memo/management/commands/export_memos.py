@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from memo.export import EXPORT_FORMATS, export_queryset, iter_export, iter_rows, parse_timestamp
+
+
+class Command(BaseCommand):
+    help = 'Export the memos as NDJSON or CSV with constant memory'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=EXPORT_FORMATS, default='ndjson')
+        parser.add_argument('--output', help='File to write to, stdout by default')
+        parser.add_argument('--updated-since', help='Only memos updated at or after this datetime')
+        parser.add_argument('--updated-until', help='Only memos updated before this datetime')
+        parser.add_argument('--chunk-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        try:
+            updated_since = options['updated_since'] and parse_timestamp(options['updated_since'])
+            updated_until = options['updated_until'] and parse_timestamp(options['updated_until'])
+        except ValueError as e:
+            raise CommandError(e)
+
+        queryset = export_queryset(updated_since or None, updated_until or None)
+        chunks = iter_export(options['format'], iter_rows(queryset, chunk_size=options['chunk_size']))
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8', newline='') as output:
+                output.writelines(chunks)
+        else:
+            for chunk in chunks:
+                self.stdout.write(chunk, ending='')
@@ -0,0 +1,77 @@
+import json
+import os
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from memo.importer import IMPORT_FORMATS, MemoImporter, read_rows
+
+
+class Command(BaseCommand):
+    help = 'Import memos from NDJSON or CSV in bulk_create batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', default='-', help='File to read from, stdin by default')
+        parser.add_argument('--format', choices=IMPORT_FORMATS, help='Guessed from the file extension by default')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--upsert', action='store_true', help='Update the memos whose slug already exists')
+        parser.add_argument('--progress-file', help='File recording the last imported row to resume from')
+        parser.add_argument('--resume-from', type=int, help='Skip the rows up to this row number')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        import_format = options['format'] or ('csv' if path.endswith('.csv') else 'ndjson')
+        progress_file = options['progress_file']
+        start = options['resume_from']
+        if start is None:
+            start = self.read_progress(progress_file)
+
+        importer = MemoImporter(
+            batch_size=options['batch_size'], upsert=options['upsert'], on_error=self.report_error
+        )
+        started = time.monotonic()
+
+        def on_batch(number):
+            if progress_file:
+                self.write_progress(progress_file, number)
+            self.stderr.write('{} rows ({:.0f} rows/s)'.format(
+                importer.stats['rows'], importer.stats['rows'] / max(time.monotonic() - started, 1e-9)
+            ))
+
+        stream = sys.stdin if path == '-' else open(path, encoding='utf-8', newline='')
+        try:
+            stats = importer.import_rows(read_rows(stream, import_format), start=start, on_batch=on_batch)
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+
+        if progress_file and os.path.exists(progress_file):
+            os.remove(progress_file)
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            'Imported {rows} rows in {elapsed:.1f}s ({rate:.0f} rows/s): '
+            '{created} created, {updated} updated, {skipped} skipped, '
+            '{duplicated} duplicated, {invalid} invalid'.format(
+                elapsed=elapsed, rate=stats['rows'] / max(elapsed, 1e-9), **stats
+            )
+        ))
+
+    def report_error(self, number, detail):
+        self.stderr.write('Row {}: {}'.format(number, json.dumps(detail, ensure_ascii=False)))
+
+    def read_progress(self, progress_file):
+        if not progress_file or not os.path.exists(progress_file):
+            return 0
+        try:
+            with open(progress_file) as f:
+                return int(f.read().strip())
+        except ValueError:
+            raise CommandError('Invalid progress file: {}'.format(progress_file))
+
+    def write_progress(self, progress_file, number):
+        # Replace the file at once so that an interruption never leaves it half written
+        tmp_file = progress_file + '.tmp'
+        with open(tmp_file, 'w') as f:
+            f.write(str(number))
+        os.replace(tmp_file, progress_file)
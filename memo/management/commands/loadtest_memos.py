@@ -0,0 +1,77 @@
+import statistics
+import threading
+import time
+from http.client import HTTPConnection
+from urllib.parse import urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = (
+        'Load test running servers with concurrent keep-alive connections, e.g. '
+        '"gunicorn config.wsgi:application" against '
+        '"gunicorn config.asgi:application -k uvicorn.workers.UvicornWorker"'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('servers', nargs='+', help='Base URLs of the servers, e.g. http://127.0.0.1:8000')
+        parser.add_argument('--path', action='append', dest='paths', help='Paths to request, repeatable')
+        parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 10, 50])
+        parser.add_argument('--duration', type=float, default=10, help='Seconds per server and concurrency')
+
+    def handle(self, *args, **options):
+        paths = options['paths'] or ['/', '/api/memos/', '/api/memos/search/?keyword=memo']
+        for server in options['servers']:
+            url = urlsplit(server)
+            if url.scheme != 'http' or not url.hostname:
+                raise CommandError('Invalid server: {}'.format(server))
+            for concurrency in options['concurrency']:
+                result = self.run(url.hostname, url.port or 80, paths, concurrency, options['duration'])
+                self.stdout.write(
+                    '{:<30} {:4d} connections {rps:8.1f} req/s  p50 {p50:8.2f}ms  p95 {p95:8.2f}ms  '
+                    '{errors} errors'.format(server, concurrency, **result)
+                )
+
+    def run(self, host, port, paths, concurrency, duration):
+        timings = []
+        errors = []
+        lock = threading.Lock()
+        deadline = time.monotonic() + duration
+
+        def worker():
+            connection = HTTPConnection(host, port, timeout=30)
+            worker_timings, worker_errors = [], 0
+            i = 0
+            while time.monotonic() < deadline:
+                started = time.perf_counter()
+                try:
+                    connection.request('GET', paths[i % len(paths)])
+                    response = connection.getresponse()
+                    response.read()
+                    if response.status >= 400:
+                        worker_errors += 1
+                except OSError:
+                    worker_errors += 1
+                    connection.close()
+                    connection = HTTPConnection(host, port, timeout=30)
+                worker_timings.append(time.perf_counter() - started)
+                i += 1
+            connection.close()
+            with lock:
+                timings.extend(worker_timings)
+                errors.append(worker_errors)
+
+        threads = [threading.Thread(target=worker) for i in range(concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        timings.sort()
+        return {
+            'rps': len(timings) / duration,
+            'p50': statistics.median(timings) * 1000 if timings else 0,
+            'p95': timings[int(len(timings) * 0.95)] * 1000 if timings else 0,
+            'errors': sum(errors),
+        }
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS
+
+from memo.rollups import rebuild_date_counts
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the per-day counts of the memos behind the archive and the date facets'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        days = rebuild_date_counts(using=options['database'], batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS('Rebuilt the counts of {} days'.format(days)))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS
+
+from memo.search import rebuild_index
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text search index of the memos'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+
+    def handle(self, *args, **options):
+        rebuild_index(using=options['database'])
+        self.stdout.write(self.style.SUCCESS('Rebuilt the search index'))
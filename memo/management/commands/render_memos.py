@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS
+
+from memo.bulk import render_memos
+
+
+class Command(BaseCommand):
+    help = 'Store the rendered HTML of the memos written before it was stored, or rendered differently'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        rendered = render_memos(batch_size=options['batch_size'], using=options['database'])
+        self.stdout.write(self.style.SUCCESS('Rendered {} memos'.format(rendered)))
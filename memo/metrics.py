@@ -0,0 +1,170 @@
+import bisect
+import contextlib
+import contextvars
+import threading
+import time
+
+
+# Upper bounds of the histogram buckets, the last bucket being unbounded
+DURATION_BUCKETS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+METRICS = {
+    'total_ms': DURATION_BUCKETS,
+    'sql_ms': DURATION_BUCKETS,
+    'queries': QUERY_BUCKETS,
+    'render_ms': DURATION_BUCKETS,
+    'serialize_ms': DURATION_BUCKETS,
+    'pool_wait_ms': DURATION_BUCKETS,
+}
+# Stats of the connection pools, see memo.pool
+POOL_METRICS = {
+    'connections': 'gauge',
+    'idle': 'gauge',
+    'max_size': 'gauge',
+    'acquired': 'counter',
+    'waits': 'counter',
+    'wait_ms': 'counter',
+    'timeouts': 'counter',
+    'discarded': 'counter',
+}
+
+_current = contextvars.ContextVar('memo_request_metrics', default=None)
+
+
+class RequestMetrics:
+    """Measurements of a single request"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.values = dict.fromkeys(METRICS, 0)
+
+    def add(self, name, value):
+        self.values[name] += value
+
+    def finish(self):
+        self.values['total_ms'] = (time.perf_counter() - self.started) * 1000
+        return self.values
+
+
+def start_request():
+    """
+    Start measuring the current request and return a token for end_request()
+    """
+    metrics = RequestMetrics()
+    return metrics, _current.set(metrics)
+
+
+def end_request(token):
+    _current.reset(token)
+
+
+def current_metrics():
+    return _current.get()
+
+
+@contextlib.contextmanager
+def timing(name):
+    """
+    Add the time spent in the block to the metric name of the current request
+    """
+    metrics = _current.get()
+    if metrics is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.add(name, (time.perf_counter() - started) * 1000)
+
+
+def query_wrapper(execute, sql, params, many, context):
+    """
+    Database execute wrapper counting the queries of the current request
+    """
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.add('sql_ms', (time.perf_counter() - started) * 1000)
+        metrics.add('queries', 1)
+
+
+class Histogram:
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def as_dict(self):
+        bounds = [str(bound) for bound in self.buckets] + ['+Inf']
+        return {'buckets': dict(zip(bounds, self.counts)), 'count': self.count, 'sum': self.sum}
+
+
+class MetricsRegistry:
+    """
+    Histograms of the request metrics of this process, by view name
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.views = {}
+
+    def observe(self, view_name, values):
+        with self.lock:
+            histograms = self.views.get(view_name)
+            if histograms is None:
+                histograms = self.views[view_name] = {
+                    name: Histogram(buckets) for name, buckets in METRICS.items()
+                }
+            for name, value in values.items():
+                histograms[name].observe(value)
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                view_name: {name: histogram.as_dict() for name, histogram in histograms.items()}
+                for view_name, histograms in self.views.items()
+            }
+
+    def clear(self):
+        with self.lock:
+            self.views = {}
+
+
+registry = MetricsRegistry()
+
+
+def format_prometheus(snapshot, pools=None):
+    """
+    Format a snapshot of the registry, and the stats of the connection pools,
+    in the Prometheus text format
+    """
+    lines = []
+    for name in METRICS:
+        metric = 'memo_request_{}'.format(name)
+        lines.append('# TYPE {} histogram'.format(metric))
+        for view_name, histograms in sorted(snapshot.items()):
+            histogram = histograms[name]
+            cumulative = 0
+            for bound, count in histogram['buckets'].items():
+                cumulative += count
+                lines.append('{}_bucket{{view="{}",le="{}"}} {}'.format(metric, view_name, bound, cumulative))
+            lines.append('{}_sum{{view="{}"}} {}'.format(metric, view_name, round(histogram['sum'], 3)))
+            lines.append('{}_count{{view="{}"}} {}'.format(metric, view_name, histogram['count']))
+    for name in POOL_METRICS:
+        metric = 'memo_pool_{}'.format(name)
+        lines.append('# TYPE {} {}'.format(metric, POOL_METRICS[name]))
+        for alias, stats in sorted((pools or {}).items()):
+            lines.append('{}{{database="{}"}} {}'.format(metric, alias, round(stats[name], 3)))
+    return '\n'.join(lines) + '\n'
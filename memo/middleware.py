@@ -0,0 +1,88 @@
+import contextlib
+import time
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+from . import routers
+from .metrics import current_metrics, end_request, query_wrapper, registry, start_request
+
+
+class RequestMetricsMiddleware:
+    """
+    Measure the queries, the SQL time, the rendering and the serialization of
+    every request
+
+    The measurements are sent back in a Server-Timing header and aggregated
+    into histograms by URL name. The middleware is only loaded when
+    MEMO_METRICS is on, and costs a couple of timer calls per query.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'MEMO_METRICS', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        metrics, token = start_request()
+        try:
+            with contextlib.ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(query_wrapper))
+                response = self.get_response(request)
+        finally:
+            end_request(token)
+
+        values = metrics.finish()
+        match = request.resolver_match
+        registry.observe(match.view_name if match is not None else 'unresolved', values)
+        response['Server-Timing'] = ', '.join([
+            'db;dur={:.1f};desc="{} queries"'.format(values['sql_ms'], values['queries']),
+            'serialize;dur={:.1f}'.format(values['serialize_ms']),
+            'render;dur={:.1f}'.format(values['render_ms']),
+            'pool;dur={:.1f}'.format(values['pool_wait_ms']),
+            'total;dur={:.1f}'.format(values['total_ms']),
+        ])
+        return response
+
+    def process_template_response(self, request, response):
+        # The response is rendered right after the template response middleware
+        metrics = current_metrics()
+        started = time.perf_counter()
+
+        def record_render(response):
+            metrics.add('render_ms', (time.perf_counter() - started) * 1000)
+
+        response.add_post_render_callback(record_render)
+        return response
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Track the routing of every request to the read replicas
+
+    A client who writes to the memo tables gets a cookie pinning its reads to
+    the primary for MEMO_REPLICA_STICKY_SECONDS, so it reads its own writes
+    whatever the replication lag. The middleware is only loaded when
+    MEMO_READ_REPLICAS is set.
+    """
+    cookie_name = 'memo_primary'
+
+    def __init__(self, get_response):
+        if not routers.get_replicas():
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        state, token = routers.start_request(pinned=self.cookie_name in request.COOKIES)
+        try:
+            response = self.get_response(request)
+        finally:
+            routers.end_request(token)
+
+        if state.wrote:
+            response.set_cookie(
+                self.cookie_name, '1', max_age=settings.MEMO_REPLICA_STICKY_SECONDS, httponly=True, samesite='Lax'
+            )
+        return response
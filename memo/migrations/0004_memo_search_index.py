@@ -0,0 +1,37 @@
+# Generated by Django 2.2.28 on 2026-10-18 13:27
+
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute('ALTER TABLE memo_memo ADD COLUMN search_vector tsvector')
+        schema_editor.execute(
+            "UPDATE memo_memo SET search_vector = "
+            "setweight(to_tsvector('simple', title), 'A') || setweight(to_tsvector('simple', text), 'B')"
+        )
+        schema_editor.execute('CREATE INDEX memo_memo_search_vector_idx ON memo_memo USING gin (search_vector)')
+    elif vendor == 'sqlite':
+        schema_editor.execute('CREATE VIRTUAL TABLE memo_memo_fts USING fts5(title, text)')
+        schema_editor.execute('INSERT INTO memo_memo_fts (rowid, title, text) SELECT id, title, text FROM memo_memo')
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX IF EXISTS memo_memo_search_vector_idx')
+        schema_editor.execute('ALTER TABLE memo_memo DROP COLUMN IF EXISTS search_vector')
+    elif vendor == 'sqlite':
+        schema_editor.execute('DROP TABLE IF EXISTS memo_memo_fts')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('memo', '0003_auto_20200621_1921'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 2.2.28 on 2026-10-18 13:29
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def build_memo_grams(apps, schema_editor):
+    Memo = apps.get_model('memo', 'Memo')
+    MemoGram = apps.get_model('memo', 'MemoGram')
+    db_alias = schema_editor.connection.alias
+    for memo in Memo.objects.using(db_alias).iterator():
+        grams = set()
+        for text in (memo.title.lower(), memo.text.lower()):
+            grams.update(text)
+            grams.update(text[i:i + 2] for i in range(len(text) - 1))
+        MemoGram.objects.using(db_alias).bulk_create(
+            [MemoGram(gram=gram, memo_id=memo.pk) for gram in grams]
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('memo', '0004_memo_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MemoGram',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('gram', models.CharField(max_length=2, verbose_name='グラム')),
+                ('memo', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='grams', to='memo.Memo')),
+            ],
+            options={
+                'unique_together': {('gram', 'memo')},
+            },
+        ),
+        migrations.RunPython(build_memo_grams, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 2.2.28 on 2026-10-18 13:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('memo', '0005_memogram'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='memo',
+            options={'ordering': ('-created_datetime', '-id')},
+        ),
+        migrations.AddIndex(
+            model_name='memo',
+            index=models.Index(fields=['-created_datetime', '-id'], name='memo_created_id_idx'),
+        ),
+    ]
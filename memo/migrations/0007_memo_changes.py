@@ -0,0 +1,47 @@
+# Generated by Django 2.2.28 on 2026-10-18 13:39
+
+from django.db import migrations, models
+
+
+def number_memos(apps, schema_editor):
+    Memo = apps.get_model('memo', 'Memo')
+    MemoSequence = apps.get_model('memo', 'MemoSequence')
+    db_alias = schema_editor.connection.alias
+    memos = Memo.objects.using(db_alias).order_by('updated_datetime', 'id')
+    sequence = 0
+    for sequence, pk in enumerate(list(memos.values_list('pk', flat=True)), 1):
+        Memo.objects.using(db_alias).filter(pk=pk).update(sequence=sequence)
+    MemoSequence.objects.using(db_alias).create(pk=1, value=sequence)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('memo', '0006_memo_keyset_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MemoSequence',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('value', models.BigIntegerField(default=0, verbose_name='値')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='MemoTombstone',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('slug', models.SlugField(unique=True, verbose_name='スラッグ')),
+                ('memo_id', models.IntegerField(verbose_name='メモID')),
+                ('sequence', models.BigIntegerField(db_index=True, verbose_name='変更番号')),
+                ('deleted_datetime', models.DateTimeField(verbose_name='削除日時')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='memo',
+            name='sequence',
+            field=models.BigIntegerField(db_index=True, default=0, editable=False, verbose_name='変更番号'),
+        ),
+        migrations.RunPython(number_memos, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 2.2.28 on 2026-10-18 13:54
+
+from django.db import migrations, models
+
+
+def create_trigram_indexes(apps, schema_editor):
+    # The substring search runs UPPER(column::text) LIKE UPPER(%s), which
+    # trigram indexes on the same expressions serve on PostgreSQL
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        for column in ('title', 'text'):
+            schema_editor.execute(
+                'CREATE INDEX memo_memo_{0}_trgm_idx ON memo_memo USING gin (UPPER({0}::text) gin_trgm_ops)'.format(column)
+            )
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        for column in ('title', 'text'):
+            schema_editor.execute('DROP INDEX IF EXISTS memo_memo_{}_trgm_idx'.format(column))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('memo', '0007_memo_changes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='memo',
+            index=models.Index(fields=['-updated_datetime', '-id'], name='memo_updated_id_idx'),
+        ),
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
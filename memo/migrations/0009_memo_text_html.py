@@ -0,0 +1,23 @@
+# Generated by Django 2.2.28 on 2026-10-18 13:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('memo', '0008_memo_updated_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='memo',
+            name='text_html',
+            field=models.TextField(blank=True, default='', editable=False, verbose_name='本文HTML'),
+        ),
+        migrations.AddField(
+            model_name='memo',
+            name='text_html_key',
+            field=models.CharField(blank=True, default='', editable=False, max_length=32, verbose_name='本文HTMLキー'),
+        ),
+    ]
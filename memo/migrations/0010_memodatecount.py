@@ -0,0 +1,39 @@
+# Generated by Django 2.2.28 on 2026-10-18 13:58
+
+import collections
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def count_memos(apps, schema_editor):
+    Memo = apps.get_model('memo', 'Memo')
+    MemoDateCount = apps.get_model('memo', 'MemoDateCount')
+    db_alias = schema_editor.connection.alias
+    tz = timezone.get_default_timezone()
+    days = collections.Counter(
+        timezone.localdate(created, tz)
+        for created in Memo.objects.using(db_alias).values_list('created_datetime', flat=True).iterator()
+    )
+    MemoDateCount.objects.using(db_alias).bulk_create(
+        [MemoDateCount(date=date, count=count) for date, count in days.items()]
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('memo', '0009_memo_text_html'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MemoDateCount',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(unique=True, verbose_name='日付')),
+                ('count', models.IntegerField(default=0, verbose_name='件数')),
+            ],
+        ),
+        migrations.RunPython(count_memos, migrations.RunPython.noop),
+    ]
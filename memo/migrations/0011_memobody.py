@@ -0,0 +1,78 @@
+# Generated by Django 2.2.28 on 2026-10-18 14:02
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+BATCH_SIZE = 1000
+
+
+def copy_bodies(apps, schema_editor):
+    Memo = apps.get_model('memo', 'Memo')
+    MemoBody = apps.get_model('memo', 'MemoBody')
+    db_alias = schema_editor.connection.alias
+    rows = Memo.objects.using(db_alias).order_by().values_list('id', 'text', 'text_html', 'text_html_key')
+    bodies = []
+    for memo_id, text, text_html, key in rows.iterator(chunk_size=BATCH_SIZE):
+        bodies.append(MemoBody(memo_id=memo_id, text=text, text_html=text_html, text_html_key=key))
+        if len(bodies) >= BATCH_SIZE:
+            MemoBody.objects.using(db_alias).bulk_create(bodies)
+            bodies = []
+    MemoBody.objects.using(db_alias).bulk_create(bodies)
+
+
+def copy_bodies_back(apps, schema_editor):
+    Memo = apps.get_model('memo', 'Memo')
+    MemoBody = apps.get_model('memo', 'MemoBody')
+    db_alias = schema_editor.connection.alias
+    rows = MemoBody.objects.using(db_alias).order_by().values_list('memo_id', 'text', 'text_html', 'text_html_key')
+    for memo_id, text, text_html, key in rows.iterator(chunk_size=BATCH_SIZE):
+        Memo.objects.using(db_alias).filter(pk=memo_id).update(text=text, text_html=text_html, text_html_key=key)
+
+
+def move_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX IF EXISTS memo_memo_text_trgm_idx')
+        schema_editor.execute(
+            'CREATE INDEX memo_memobody_text_trgm_idx ON memo_memobody USING gin (UPPER(text::text) gin_trgm_ops)'
+        )
+
+
+def move_trigram_index_back(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX IF EXISTS memo_memobody_text_trgm_idx')
+        schema_editor.execute(
+            'CREATE INDEX memo_memo_text_trgm_idx ON memo_memo USING gin (UPPER(text::text) gin_trgm_ops)'
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('memo', '0010_memodatecount'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MemoBody',
+            fields=[
+                ('memo', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='body', serialize=False, to='memo.Memo')),
+                ('text', models.TextField(blank=True, verbose_name='本文')),
+                ('text_html', models.TextField(blank=True, default='', editable=False, verbose_name='本文HTML')),
+                ('text_html_key', models.CharField(blank=True, default='', editable=False, max_length=32, verbose_name='本文HTMLキー')),
+            ],
+        ),
+        migrations.RunPython(copy_bodies, copy_bodies_back),
+        migrations.RunPython(move_trigram_index, move_trigram_index_back),
+        migrations.RemoveField(
+            model_name='memo',
+            name='text',
+        ),
+        migrations.RemoveField(
+            model_name='memo',
+            name='text_html',
+        ),
+        migrations.RemoveField(
+            model_name='memo',
+            name='text_html_key',
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 2.2.28 on 2026-10-18 14:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('memo', '0011_memobody'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='memobody',
+            name='codec',
+            field=models.CharField(blank=True, default='', editable=False, max_length=16, verbose_name='圧縮形式'),
+        ),
+        migrations.AddField(
+            model_name='memobody',
+            name='data',
+            field=models.BinaryField(null=True, verbose_name='圧縮本文'),
+        ),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 2.2.28 on 2026-10-18 14:17
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+from memo.compression import unpack_text
+
+BATCH_SIZE = 1000
+
+
+def snapshot_memos(apps, schema_editor):
+    # The history of the existing memos starts with their current version
+    Memo = apps.get_model('memo', 'Memo')
+    MemoRevision = apps.get_model('memo', 'MemoRevision')
+    db_alias = schema_editor.connection.alias
+    rows = Memo.objects.using(db_alias).order_by('id').values_list(
+        'id', 'title', 'updated_datetime', 'body__text', 'body__data', 'body__codec'
+    )
+    revisions = []
+    for memo_id, title, updated, text, data, codec in rows.iterator(chunk_size=BATCH_SIZE):
+        revisions.append(MemoRevision(
+            memo_id=memo_id, number=1, title=title, content=unpack_text(text or '', data, codec or ''),
+            is_snapshot=True, created_datetime=updated,
+        ))
+        if len(revisions) >= BATCH_SIZE:
+            MemoRevision.objects.using(db_alias).bulk_create(revisions)
+            revisions = []
+    MemoRevision.objects.using(db_alias).bulk_create(revisions)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('memo', '0012_memobody_compression'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MemoRevision',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('number', models.IntegerField(verbose_name='版')),
+                ('title', models.CharField(max_length=150, verbose_name='タイトル')),
+                ('content', models.TextField(blank=True, verbose_name='内容')),
+                ('is_snapshot', models.BooleanField(default=False, verbose_name='スナップショット')),
+                ('created_datetime', models.DateTimeField(default=django.utils.timezone.now, verbose_name='作成日時')),
+                ('memo', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='revisions', to='memo.Memo')),
+            ],
+            options={
+                'unique_together': {('memo', 'number')},
+            },
+        ),
+        migrations.RunPython(snapshot_memos, migrations.RunPython.noop),
+    ]
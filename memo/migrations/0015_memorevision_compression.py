@@ -0,0 +1,53 @@
+# Generated by Django 2.2.28 on 2026-10-18 14:52
+
+from django.db import migrations, models
+
+from memo.compression import pack_text, unpack_text
+
+BATCH_SIZE = 1000
+
+
+def pack_snapshots(apps, schema_editor):
+    # The snapshots taken by 0013 hold the whole texts, stored as the bodies are
+    MemoRevision = apps.get_model('memo', 'MemoRevision')
+    db_alias = schema_editor.connection.alias
+    revisions = MemoRevision.objects.using(db_alias).filter(is_snapshot=True).only('content', 'data', 'codec')
+    packed = []
+    for revision in revisions.order_by('id').iterator(chunk_size=BATCH_SIZE):
+        revision.content, revision.data, revision.codec = pack_text(revision.content)
+        if revision.codec:
+            packed.append(revision)
+        if len(packed) >= BATCH_SIZE:
+            MemoRevision.objects.using(db_alias).bulk_update(packed, ['content', 'data', 'codec'])
+            packed = []
+    MemoRevision.objects.using(db_alias).bulk_update(packed, ['content', 'data', 'codec'])
+
+
+def unpack_snapshots(apps, schema_editor):
+    MemoRevision = apps.get_model('memo', 'MemoRevision')
+    db_alias = schema_editor.connection.alias
+    revisions = MemoRevision.objects.using(db_alias).filter(codec__gt='')
+    for revision in revisions.order_by('id').iterator(chunk_size=BATCH_SIZE):
+        content = unpack_text(revision.content, revision.data, revision.codec)
+        MemoRevision.objects.using(db_alias).filter(pk=revision.pk).update(content=content, data=None, codec='')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('memo', '0014_memobody_html_compression'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='memorevision',
+            name='codec',
+            field=models.CharField(blank=True, default='', editable=False, max_length=16, verbose_name='圧縮形式'),
+        ),
+        migrations.AddField(
+            model_name='memorevision',
+            name='data',
+            field=models.BinaryField(null=True, verbose_name='圧縮内容'),
+        ),
+        migrations.RunPython(pack_snapshots, unpack_snapshots),
+    ]
@@ -0,0 +1,267 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, DateTimeField, Max, Subquery
+from django.http import HttpResponse
+from django.views.decorators.http import condition
+from rest_framework import serializers
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+
+from .cache import fill_cache, list_cache_key, memo_cache_key
+from .models import BODY_COLUMNS, BODY_FIELDS, Memo, MemoTombstone
+from .renderers import FastJSONRenderer
+from .rollups import date_facets
+from .routers import read_from_replica
+
+
+class ConditionalGetMixin:
+    """
+    Answer conditional requests with 304 before the view does any work
+
+    Subclasses provide the validators with get_etag() and get_last_modified(),
+    which take the same arguments as the view.
+    """
+
+    def get_etag(self, request, *args, **kwargs):
+        return None
+
+    def get_last_modified(self, request, *args, **kwargs):
+        return None
+
+    def dispatch(self, request, *args, **kwargs):
+        view = condition(
+            etag_func=self.get_etag, last_modified_func=self.get_last_modified
+        )(super().dispatch)
+        return view(request, *args, **kwargs)
+
+
+def make_etag(*parts):
+    return '"{}"'.format(hashlib.md5(repr(parts).encode()).hexdigest())
+
+
+class MemoListConditionalMixin(ConditionalGetMixin):
+    """
+    Validate the memo lists by the latest update and the number of memos
+
+    The state is cached in the list generation, and also counts the memos
+    of the unfiltered list.
+    """
+
+    def get_list_state(self):
+        if not hasattr(self, '_list_state'):
+            key = list_cache_key('state')
+            state = cache.get(key)
+            if state is None:
+                # Deletions don't show up in the latest update, the tombstones
+                # record them, the latest having the highest sequence
+                last_deleted = MemoTombstone.objects.order_by('-sequence').values('deleted_datetime')[:1]
+                state = Memo.objects.aggregate(
+                    last_updated=Max('updated_datetime'), count=Count('id'),
+                    last_deleted=Max(Subquery(last_deleted), output_field=DateTimeField()),
+                )
+                fill_cache(key, state)
+            self._list_state = state
+        return self._list_state
+
+    def get_etag(self, request, *args, **kwargs):
+        state = self.get_list_state()
+        return make_etag(
+            type(self).__name__, request.get_full_path(), state['last_updated'], state['count']
+        )
+
+    def get_last_modified(self, request, *args, **kwargs):
+        state = self.get_list_state()
+        modified = [state['last_updated'], state['last_deleted']]
+        modified = [value for value in modified if value is not None]
+        return max(modified) if modified else None
+
+
+class MemoDetailConditionalMixin(ConditionalGetMixin):
+    """
+    Validate a memo by its updated_datetime
+    """
+    slug_url_kwarg = 'slug'
+
+    def get_memo_state(self):
+        if not hasattr(self, '_memo_state'):
+            slug = self.kwargs[self.slug_url_kwarg]
+            key = memo_cache_key('state', slug)
+            state = cache.get(key)
+            if state is None:
+                state = Memo.objects.filter(slug=slug).order_by().values_list(
+                    'pk', 'updated_datetime'
+                ).first()
+                if state is not None:
+                    fill_cache(key, state)
+            self._memo_state = state
+        return self._memo_state
+
+    def get_etag(self, request, *args, **kwargs):
+        state = self.get_memo_state()
+        if state is None:
+            return None
+        return make_etag(type(self).__name__, *state)
+
+    def get_last_modified(self, request, *args, **kwargs):
+        state = self.get_memo_state()
+        return state[1] if state is not None else None
+
+
+class CachedListMixin:
+    """
+    Cache the rendered list page until the next memo write
+    """
+
+    def get(self, request, *args, **kwargs):
+        key = list_cache_key('page', request.get_full_path())
+        content = cache.get(key)
+        if content is not None:
+            return HttpResponse(content)
+
+        response = super().get(request, *args, **kwargs)
+        response.add_post_render_callback(
+            lambda response: fill_cache(key, response.content)
+        )
+        return response
+
+
+class CachedDetailMixin:
+    """
+    Cache the memo looked up by the slug until the memo is written
+    """
+
+    def get_object(self, queryset=None):
+        if queryset is not None:
+            return super().get_object(queryset)
+
+        key = memo_cache_key('object', self.kwargs[self.slug_url_kwarg])
+        memo = cache.get(key)
+        if memo is None:
+            memo = super().get_object()
+            fill_cache(key, memo)
+        return memo
+
+
+class CachedListAPIMixin:
+    """
+    Cache the serialized list payload until the next memo write
+    """
+
+    def list(self, request, *args, **kwargs):
+        key = list_cache_key('api', request.build_absolute_uri())
+        data = cache.get(key)
+        if data is None:
+            data = super().list(request, *args, **kwargs).data
+            fill_cache(key, data)
+        return Response(data)
+
+
+class CachedRetrieveAPIMixin:
+    """
+    Cache the serialized memo payload until the memo is written
+    """
+
+    def retrieve(self, request, *args, **kwargs):
+        key = memo_cache_key('api', self.kwargs[self.lookup_field], request.query_params.get('fields'))
+        data = cache.get(key)
+        if data is None:
+            data = super().retrieve(request, *args, **kwargs).data
+            fill_cache(key, data)
+        return Response(data)
+
+
+class DateFacetsAPIMixin:
+    """
+    Add the number of memos by month to the list payload with ?facets=month
+    """
+    facets_query_param = 'facets'
+
+    def list(self, request, *args, **kwargs):
+        response = super().list(request, *args, **kwargs)
+        if request.query_params.get(self.facets_query_param) != 'month':
+            return response
+        facets = date_facets(self.filter_queryset(self.get_queryset()))
+        facets = {'month': [{'month': month.strftime('%Y-%m'), 'count': count} for month, count in facets]}
+        # A paginated payload is already an object to add the facets to
+        if isinstance(response.data, dict):
+            response.data['facets'] = facets
+            return response
+        return Response({'results': response.data, 'facets': facets})
+
+
+class SparseFieldsAPIMixin:
+    """
+    Restrict the payload and the selected columns to the ?fields= of the request
+
+    Without the parameter every field of the serializer is returned, and
+    still only the columns it reads are selected, MemoBody being joined only
+    for the text. Views list in required_fields the columns they read
+    besides the payload. With use_values the queryset yields values_list
+    rows, starting with the columns of the serializer, instead of memos.
+    """
+    fields_query_param = 'fields'
+    required_fields = ()
+    use_values = False
+
+    def get_requested_fields(self):
+        if not hasattr(self, '_requested_fields'):
+            value = self.request.query_params.get(self.fields_query_param)
+            fields = None
+            if value:
+                fields = [name.strip() for name in value.split(',') if name.strip()]
+                unknown = [name for name in fields if name not in self.get_serializer_class()().fields]
+                if unknown:
+                    raise serializers.ValidationError(
+                        {self.fields_query_param: ['Unknown fields: {}'.format(', '.join(unknown))]}
+                    )
+            self._requested_fields = fields
+        return self._requested_fields
+
+    def get_queryset(self):
+        serializer = self.get_serializer_class()(fields=self.get_requested_fields())
+        columns = [field.source for field in serializer.fields.values()]
+        queryset = super().get_queryset()
+        if self.use_values:
+            extra = [column for column in self.required_fields if column not in columns]
+            return queryset.values_list(*columns, *extra, named=True)
+        columns = set(columns).union(self.required_fields)
+        body_columns = columns & BODY_FIELDS
+        if body_columns:
+            queryset = queryset.select_related('body')
+            columns = (columns - body_columns).union(*(BODY_COLUMNS[column] for column in body_columns))
+        return queryset.only(*columns)
+
+    def get_serializer(self, *args, **kwargs):
+        kwargs.setdefault('fields', self.get_requested_fields())
+        return super().get_serializer(*args, **kwargs)
+
+
+class FastJSONMixin:
+    """
+    Render JSON with FastJSONRenderer when MEMO_FAST_JSON is on
+    """
+
+    def get_renderers(self):
+        renderers = super().get_renderers()
+        if getattr(settings, 'MEMO_FAST_JSON', False):
+            renderers = [
+                FastJSONRenderer() if type(renderer) is JSONRenderer else renderer
+                for renderer in renderers
+            ]
+        return renderers
+
+
+class ReplicaReadMixin:
+    """
+    Read the memos from a replica, unless the client wrote recently
+
+    The whole request is routed, as the templates evaluate the querysets
+    after dispatch() has returned.
+    """
+
+    def dispatch(self, request, *args, **kwargs):
+        if request.method in ('GET', 'HEAD'):
+            read_from_replica()
+        return super().dispatch(request, *args, **kwargs)
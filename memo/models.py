@@ -1,5 +1,11 @@
 from django.contrib.auth.models import AbstractUser
-from django.db import models
+from django.db import models, router, transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.safestring import mark_safe
+
+from .compression import pack_text, unpack_text
+from .rendering import render_memo_html, render_text_html, text_html_key
 
 
 # Create your models here.
@@ -8,15 +14,231 @@ class Author(AbstractUser):
     pass
 
 
+# Fields of the memos stored in MemoBody, with the columns they read
+BODY_COLUMNS = {
+    'text': ('body__text', 'body__data', 'body__codec'),
+    # The stored HTML is only served while its key matches the text
+    'text_html': (
+        'body__text', 'body__data', 'body__codec',
+        'body__text_html', 'body__html_data', 'body__html_codec', 'body__text_html_key',
+    ),
+}
+BODY_FIELDS = set(BODY_COLUMNS)
+
+
 class Memo(models.Model):
     title = models.CharField('タイトル', max_length=150)
     slug = models.SlugField('スラッグ', unique=True)
-    text = models.TextField('本文', blank=True)
     created_datetime = models.DateTimeField('作成日時', auto_now_add=True)
     updated_datetime = models.DateTimeField('更新日時', auto_now=True)
+    sequence = models.BigIntegerField('変更番号', default=0, editable=False, db_index=True)
+
+    class Meta:
+        ordering = ('-created_datetime', '-id')
+        indexes = [
+            models.Index(fields=['-created_datetime', '-id'], name='memo_created_id_idx'),
+            models.Index(fields=['-updated_datetime', '-id'], name='memo_updated_id_idx'),
+        ]
+
+    def __str__(self):
+        return self.title
+
+    @property
+    def text(self):
+        return self.get_body().get_text()
+
+    @text.setter
+    def text(self, value):
+        self.get_body(load=False).set_text(value)
+
+    @property
+    def text_html(self):
+        return self.get_text_html()
+
+    def get_body(self, load=True):
+        """
+        Return the body of the memo, querying it on first access unless it is
+        selected with select_related('body')
+
+        With load false a missing body is not queried: a new one is returned,
+        which save() writes over the stored one.
+        """
+        related = Memo.body.related
+        if related.is_cached(self):
+            body = related.get_cached_value(self)
+        elif load and self.pk is not None:
+            body = MemoBody.objects.using(self._state.db).filter(memo_id=self.pk).first()
+        else:
+            body = None
+        if body is None:
+            body = MemoBody(memo_id=self.pk)
+        related.set_cached_value(self, body)
+        return body
+
+    def get_text_html(self):
+        """
+        Return the rendered text, from the stored HTML while it is current
+        """
+        body = self.get_body()
+        text = body.get_text()
+        if body.text_html_key == text_html_key(text):
+            return mark_safe(body.get_text_html())
+        return mark_safe(render_text_html(text))
+
+    def save(self, *args, **kwargs):
+        using = kwargs.get('using') or router.db_for_write(Memo, instance=self)
+        creating = self._state.adding
+        update_fields = kwargs.get('update_fields')
+        # The body is written when it was set or loaded, the list views never
+        # touch it
+        save_body = creating or Memo.body.related.is_cached(self)
+        if update_fields is not None:
+            save_body = save_body and not BODY_FIELDS.isdisjoint(update_fields)
+            kwargs['update_fields'] = set(update_fields).difference(BODY_FIELDS) | {'sequence'}
+        body = self.get_body(load=False) if save_body else None
+        # The counter stays locked until the memo is committed, so that the
+        # memos are committed in the order of their sequences
+        with transaction.atomic(using=using, savepoint=False):
+            self.sequence = MemoSequence.allocate(using=using)
+            super().save(*args, **kwargs)
+            if body is not None:
+                body.memo_id = self.pk
+                render_memo_html(body)
+                body.save(using=using, force_insert=creating)
+
+
+class MemoBody(models.Model):
+    """
+    Text of a memo, kept out of the memo table so that the list scans only
+    read the narrow rows of the memos
+
+    A text compressed with MEMO_BODY_COMPRESSION is stored in data, along
+    with the name of its codec, and text is left empty. Read and write the
+    text with get_text() and set_text(), and the rendered text, compressed
+    the same way in html_data, with get_text_html() and set_text_html().
+    """
+    memo = models.OneToOneField(Memo, on_delete=models.CASCADE, primary_key=True, related_name='body')
+    text = models.TextField('本文', blank=True)
+    text_html = models.TextField('本文HTML', blank=True, default='', editable=False)
+    text_html_key = models.CharField('本文HTMLキー', max_length=32, blank=True, default='', editable=False)
+    data = models.BinaryField('圧縮本文', null=True, editable=False)
+    codec = models.CharField('圧縮形式', max_length=16, blank=True, default='', editable=False)
+    html_data = models.BinaryField('圧縮本文HTML', null=True, editable=False)
+    html_codec = models.CharField('本文HTML圧縮形式', max_length=16, blank=True, default='', editable=False)
+
+    def __str__(self):
+        return str(self.memo_id)
+
+    def get_text(self):
+        if not self.codec:
+            return self.text
+        if self.__dict__.get('_text') is None:
+            self._text = unpack_text(self.text, self.data, self.codec)
+        return self._text
+
+    def set_text(self, text):
+        self.text, self.data, self.codec = pack_text(text)
+        self._text = text
+
+    def get_text_html(self):
+        if not self.html_codec:
+            return self.text_html
+        if self.__dict__.get('_text_html') is None:
+            self._text_html = unpack_text(self.text_html, self.html_data, self.html_codec)
+        return self._text_html
+
+    def set_text_html(self, text_html):
+        self.text_html, self.html_data, self.html_codec = pack_text(text_html)
+        self._text_html = text_html
+
+    def pack(self):
+        """
+        Store the text and the rendered text as MEMO_BODY_COMPRESSION says and
+        return whether the columns changed
+        """
+        columns = (self.text, self.data, self.codec, self.text_html, self.html_data, self.html_codec)
+        self.set_text(self.get_text())
+        self.set_text_html(self.get_text_html())
+        return (self.text, self.data, self.codec, self.text_html, self.html_data, self.html_codec) != columns
+
+
+class MemoRevision(models.Model):
+    """
+    Version of the title and the text of a memo
+
+    A snapshot stores the text in content; the other revisions store the
+    delta from the text of the previous revision, so a text is rebuilt
+    from the latest snapshot before it. The content is compressed like the
+    bodies of the memos, read and write it with get_content() and
+    set_content().
+    """
+    memo = models.ForeignKey(Memo, on_delete=models.CASCADE, related_name='revisions')
+    number = models.IntegerField('版')
+    title = models.CharField('タイトル', max_length=150)
+    content = models.TextField('内容', blank=True)
+    data = models.BinaryField('圧縮内容', null=True, editable=False)
+    codec = models.CharField('圧縮形式', max_length=16, blank=True, default='', editable=False)
+    is_snapshot = models.BooleanField('スナップショット', default=False)
+    created_datetime = models.DateTimeField('作成日時', default=timezone.now)
+
+    class Meta:
+        unique_together = ('memo', 'number')
+
+    def __str__(self):
+        return '{} #{}'.format(self.memo_id, self.number)
+
+    def get_content(self):
+        return unpack_text(self.content, self.data, self.codec)
+
+    def set_content(self, content):
+        self.content, self.data, self.codec = pack_text(content)
+
+
+class MemoSequence(models.Model):
+    """Single row counter of the changes of the memos"""
+    value = models.BigIntegerField('値', default=0)
+
+    @classmethod
+    def allocate(cls, count=1, using=None):
+        """
+        Reserve count sequences and return the last one
+
+        Call this inside the transaction which writes the changes.
+        """
+        using = using or router.db_for_write(cls)
+        sequences = cls.objects.using(using)
+        if not sequences.filter(pk=1).update(value=F('value') + count):
+            sequences.create(pk=1, value=count)
+        return sequences.values_list('value', flat=True).get(pk=1)
+
+
+class MemoTombstone(models.Model):
+    """Last deletion of a slug, kept for the clients syncing the changes"""
+    slug = models.SlugField('スラッグ', unique=True)
+    memo_id = models.IntegerField('メモID')
+    sequence = models.BigIntegerField('変更番号', db_index=True)
+    deleted_datetime = models.DateTimeField('削除日時')
+
+    def __str__(self):
+        return self.slug
+
+
+class MemoDateCount(models.Model):
+    """Number of memos created on a day, in the default time zone"""
+    date = models.DateField('日付', unique=True)
+    count = models.IntegerField('件数', default=0)
+
+    def __str__(self):
+        return str(self.date)
+
+
+class MemoGram(models.Model):
+    """N-gram inverted index over the title and the text of the memos"""
+    gram = models.CharField('グラム', max_length=2)
+    memo = models.ForeignKey(Memo, on_delete=models.CASCADE, related_name='grams')
 
     class Meta:
-        ordering = ('-created_datetime',)
+        unique_together = ('gram', 'memo')
 
     def __str__(self):
-        return self.title
\ No newline at end of file
+        return self.gram
@@ -0,0 +1,282 @@
+import base64
+import json
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+from .cache import fill_cache, list_cache_key
+from .search import is_ranked
+
+
+# Range of the primary keys, 64-bit integers in the databases
+MIN_PK, MAX_PK = -2 ** 63, 2 ** 63 - 1
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+class CachedCountPaginator(Paginator):
+    """
+    Paginator which caches the count of the memos until the next memo write
+
+    The count_key identifies the filtered list, e.g. the search keyword.
+    """
+
+    def __init__(self, *args, count_key=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.count_key = count_key
+
+    @cached_property
+    def count(self):
+        key = list_cache_key('count', self.count_key)
+        count = cache.get(key)
+        if count is None:
+            count = Paginator.count.func(self)
+            fill_cache(key, count)
+        return count
+
+
+class KnownCountPaginator(Paginator):
+    """Paginator given the number of objects, e.g. from the date rollups"""
+
+    def __init__(self, *args, count, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.known_count = count
+
+    @cached_property
+    def count(self):
+        return self.known_count
+
+
+def estimate_count(queryset, exact_below=1000):
+    """
+    Return the number of rows of the queryset estimated by the database
+
+    PostgreSQL estimates any query from the planner statistics, SQLite only
+    the whole table from the statistics of ANALYZE. Without an estimate, or
+    below exact_below rows where counting is cheap, the rows are counted.
+    """
+    connection = connections[queryset.db]
+    estimate = None
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            sql, params = queryset.query.sql_with_params()
+            cursor.execute('EXPLAIN (FORMAT JSON) ' + sql, params)
+            plan = cursor.fetchone()[0]
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            estimate = plan[0]['Plan']['Plan Rows']
+        elif connection.vendor == 'sqlite' and not queryset.query.where:
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'sqlite_stat1'")
+            if cursor.fetchone():
+                cursor.execute('SELECT stat FROM sqlite_stat1 WHERE tbl = %s', [queryset.model._meta.db_table])
+                row = cursor.fetchone()
+                estimate = int(row[0].split()[0]) if row else None
+    if estimate is None or estimate < exact_below:
+        return queryset.count()
+    return int(estimate)
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator which counts the objects with estimate_count()"""
+    exact_below = 1000
+
+    @cached_property
+    def count(self):
+        return estimate_count(self.object_list, exact_below=self.exact_below)
+
+
+def encode_cursor(memo, previous=False):
+    """
+    Encode the position of the memo into an opaque cursor
+    """
+    position = [memo.created_datetime.isoformat(), memo.id, previous]
+    return base64.urlsafe_b64encode(json.dumps(position).encode()).decode()
+
+
+def decode_cursor(cursor):
+    """
+    Decode the cursor into (created_datetime, pk, previous)
+    """
+    try:
+        created, pk, previous = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        created = parse_datetime(created)
+        # The position has to be comparable with the columns by the database
+        if created is None or timezone.is_naive(created):
+            raise ValueError
+        if not isinstance(pk, int) or isinstance(pk, bool) or not MIN_PK <= pk <= MAX_PK:
+            raise ValueError
+    except (TypeError, ValueError):
+        raise InvalidCursor('Invalid cursor')
+    return created, pk, bool(previous)
+
+
+def encode_offset_cursor(offset):
+    """
+    Encode the offset of a page of ranked memos into an opaque cursor
+    """
+    return base64.urlsafe_b64encode(json.dumps([offset]).encode()).decode()
+
+
+def decode_offset_cursor(cursor):
+    try:
+        offset, = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        if not isinstance(offset, int) or offset < 0:
+            raise ValueError
+    except (TypeError, ValueError):
+        raise InvalidCursor('Invalid cursor')
+    return offset
+
+
+class CursorPage:
+    """A page of memos returned by CursorPaginator"""
+
+    def __init__(self, object_list, paginator, next_cursor, previous_cursor):
+        self.object_list = object_list
+        self.paginator = paginator
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class CursorPaginator:
+    """
+    Keyset paginator over memos ordered by (-created_datetime, -id)
+
+    A page is fetched with a range condition on the position given by the
+    cursor, so its cost doesn't depend on how deep the page is. The total
+    count is only queried when it is accessed. The results of a fulltext
+    search keep their order by relevance, which has no stable position, and
+    are paged by offset behind the same cursors.
+    """
+    ordering = ('-created_datetime', '-id')
+    ordering_fields = ('created_datetime', 'id')
+
+    def __init__(self, queryset, per_page):
+        self.ranked = is_ranked(queryset)
+        self.queryset = queryset if self.ranked else queryset.order_by(*self.ordering)
+        self.per_page = int(per_page)
+        self._count = None
+
+    @property
+    def count(self):
+        if self._count is None:
+            self._count = self.queryset.count()
+        return self._count
+
+    def page(self, cursor=None):
+        if self.ranked:
+            return self._ranked_page(decode_offset_cursor(cursor) if cursor else 0)
+        if not cursor:
+            rows = list(self.queryset[:self.per_page + 1])
+            return self._build_page(rows, has_previous=False)
+
+        created, pk, previous = decode_cursor(cursor)
+        if previous:
+            queryset = self.queryset.filter(
+                Q(created_datetime__gt=created) | Q(created_datetime=created, id__gt=pk)
+            ).order_by('created_datetime', 'id')
+            rows = list(queryset[:self.per_page + 1])
+            has_previous = len(rows) > self.per_page
+            rows = rows[:self.per_page][::-1]
+            return self._build_page(rows, has_previous=has_previous, has_next=True)
+
+        queryset = self.queryset.filter(
+            Q(created_datetime__lt=created) | Q(created_datetime=created, id__lt=pk)
+        )
+        rows = list(queryset[:self.per_page + 1])
+        return self._build_page(rows, has_previous=True)
+
+    def _ranked_page(self, offset):
+        rows = list(self.queryset[offset:offset + self.per_page + 1])
+        next_cursor = None
+        if len(rows) > self.per_page:
+            rows = rows[:self.per_page]
+            next_cursor = encode_offset_cursor(offset + self.per_page)
+        previous_cursor = encode_offset_cursor(max(0, offset - self.per_page)) if offset else None
+        return CursorPage(rows, self, next_cursor, previous_cursor)
+
+    def _build_page(self, rows, has_previous, has_next=None):
+        if has_next is None:
+            has_next = len(rows) > self.per_page
+            rows = rows[:self.per_page]
+        next_cursor = encode_cursor(rows[-1]) if has_next and rows else None
+        previous_cursor = encode_cursor(rows[0], previous=True) if has_previous and rows else None
+        return CursorPage(rows, self, next_cursor, previous_cursor)
+
+
+class MemoCursorPagination(BasePagination):
+    """Cursor pagination of the memo API backed by CursorPaginator"""
+    page_size = 100
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+    cursor_query_param = 'cursor'
+    count_query_param = 'count'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        paginator = CursorPaginator(queryset, self.get_page_size(request))
+        try:
+            self.page = paginator.page(request.query_params.get(self.cursor_query_param))
+        except InvalidCursor:
+            raise NotFound(self.invalid_cursor_message)
+        self.count = paginator.count if self.include_count(request) else None
+        return list(self.page)
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if page_size <= 0:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+    def include_count(self, request):
+        value = request.query_params.get(self.count_query_param)
+        if value is None:
+            return getattr(settings, 'MEMO_PAGINATION_COUNT', False)
+        return value.lower() in ('1', 'true', 'yes')
+
+    def get_paginated_response(self, data):
+        fields = [
+            ('next', self.get_link(self.page.next_cursor)),
+            ('previous', self.get_link(self.page.previous_cursor)),
+        ]
+        if self.count is not None:
+            fields.append(('count', self.count))
+        fields.append(('results', data))
+        return Response(OrderedDict(fields))
+
+    def get_link(self, cursor):
+        if cursor is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, cursor)
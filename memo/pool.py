@@ -0,0 +1,131 @@
+import collections
+import threading
+import time
+
+from django.db import DatabaseError
+
+from .metrics import current_metrics
+
+
+class PoolTimeout(DatabaseError):
+    pass
+
+
+class ConnectionPool:
+    """
+    Bounded pool of DB-API connections shared by the threads of a process
+
+    At most max_size connections exist at a time; a thread asking for one
+    while they are all in use waits up to timeout seconds. The time spent
+    waiting is added to the pool_wait_ms metric of the current request.
+    """
+
+    def __init__(self, connect, max_size, timeout=10, check=None, params=None):
+        self.connect = connect
+        self.params = params
+        self.max_size = max_size
+        self.timeout = timeout
+        self.check = check
+        self.idle = collections.deque()
+        self.lock = threading.Lock()
+        self.slots = threading.BoundedSemaphore(max_size)
+        self.closed = False
+        self.stats = dict.fromkeys(('connections', 'acquired', 'waits', 'wait_ms', 'timeouts', 'discarded'), 0)
+
+    def acquire(self):
+        started = time.perf_counter()
+        if not self.slots.acquire(blocking=False):
+            if not self.slots.acquire(timeout=self.timeout):
+                with self.lock:
+                    self.stats['timeouts'] += 1
+                raise PoolTimeout('No database connection available after {}s'.format(self.timeout))
+            wait_ms = (time.perf_counter() - started) * 1000
+            with self.lock:
+                self.stats['waits'] += 1
+                self.stats['wait_ms'] += wait_ms
+            metrics = current_metrics()
+            if metrics is not None:
+                metrics.add('pool_wait_ms', wait_ms)
+
+        try:
+            connection = self._get_idle()
+            if connection is None:
+                connection = self.connect()
+                with self.lock:
+                    self.stats['connections'] += 1
+        except Exception:
+            self.slots.release()
+            raise
+        with self.lock:
+            self.stats['acquired'] += 1
+        return connection
+
+    def _get_idle(self):
+        while True:
+            with self.lock:
+                if not self.idle:
+                    return None
+                connection = self.idle.pop()
+            if self.check is None or self.check(connection):
+                return connection
+            self._discard(connection)
+
+    def release(self, connection, discard=False):
+        try:
+            if discard or self.closed:
+                self._discard(connection)
+            else:
+                with self.lock:
+                    self.idle.append(connection)
+        finally:
+            self.slots.release()
+
+    def _discard(self, connection):
+        with self.lock:
+            self.stats['connections'] -= 1
+            self.stats['discarded'] += 1
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    def close(self):
+        """
+        Close the idle connections, those in use are closed on release
+        """
+        self.closed = True
+        with self.lock:
+            idle, self.idle = list(self.idle), collections.deque()
+        for connection in idle:
+            self._discard(connection)
+
+    def get_stats(self):
+        with self.lock:
+            return dict(self.stats, idle=len(self.idle), max_size=self.max_size)
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(alias, connect, max_size, timeout=10, check=None, params=None):
+    """
+    Return the pool of the database alias, creating it on first use
+
+    The pool is replaced when the connection params change, as the test
+    runner does when it switches to the test database.
+    """
+    with _pools_lock:
+        pool = _pools.get(alias)
+        if pool is not None and pool.params != params:
+            pool.close()
+            pool = None
+        if pool is None:
+            pool = _pools[alias] = ConnectionPool(connect, max_size, timeout, check, params)
+        return pool
+
+
+def pool_stats():
+    with _pools_lock:
+        pools = dict(_pools)
+    return {alias: pool.get_stats() for alias, pool in pools.items()}
@@ -0,0 +1,31 @@
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer writing the same bytes with orjson when it is installed
+
+    Pretty printed output, and data which orjson can't serialize, go through
+    JSONRenderer. Floats may be written differently, so this is meant for
+    payloads without them like the memo lists.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if (
+            orjson is None or data is None or self.ensure_ascii or not self.compact
+            or self.get_indent(accepted_media_type, renderer_context or {}) is not None
+        ):
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            # Datetimes are passed to the encoder of JSONRenderer to keep its format
+            ret = orjson.dumps(
+                data, default=self.encoder_class().default, option=orjson.OPT_PASSTHROUGH_DATETIME
+            )
+        except TypeError:
+            return super().render(data, accepted_media_type, renderer_context)
+        return ret.replace('\u2028'.encode(), b'\\u2028').replace('\u2029'.encode(), b'\\u2029')
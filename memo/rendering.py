@@ -0,0 +1,31 @@
+import hashlib
+
+from django.template.defaultfilters import linebreaks_filter, urlize
+
+# Bump to have render_memos re-render the stored HTML of every memo
+RENDERING_VERSION = 1
+
+
+def render_text_html(text):
+    """
+    Render the text like {{ text|linebreaks|urlize }} in an autoescaped template
+    """
+    return urlize(linebreaks_filter(text, autoescape=True), autoescape=True)
+
+
+def text_html_key(text):
+    return hashlib.md5('{}:{}'.format(RENDERING_VERSION, text).encode()).hexdigest()
+
+
+def render_memo_html(body):
+    """
+    Store the rendered text on the memo body unless it is current and return
+    whether it was rendered
+    """
+    text = body.get_text()
+    key = text_html_key(text)
+    if body.text_html_key == key:
+        return False
+    body.set_text_html(render_text_html(text))
+    body.text_html_key = key
+    return True
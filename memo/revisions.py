@@ -0,0 +1,205 @@
+import collections
+import difflib
+import json
+
+from django.conf import settings
+from django.db import router, transaction
+from django.db.models import OuterRef, Subquery
+
+from .models import MemoRevision
+
+
+# Fields of a revision which its encoding sets
+STORED_FIELDS = ['content', 'data', 'codec', 'is_snapshot']
+
+
+def get_snapshot_interval():
+    return max(1, getattr(settings, 'MEMO_REVISION_SNAPSHOT_INTERVAL', 10))
+
+
+# Deltas
+
+def make_delta(old, new):
+    """
+    Return the delta turning the text old into new, as JSON
+
+    The delta lists the [start, end, lines] replacements of the lines of old,
+    the lines keeping their line breaks.
+    """
+    old_lines = old.splitlines(keepends=True)
+    new_lines = new.splitlines(keepends=True)
+    matcher = difflib.SequenceMatcher(None, old_lines, new_lines, autojunk=False)
+    ops = [
+        [i1, i2, new_lines[j1:j2]]
+        for tag, i1, i2, j1, j2 in matcher.get_opcodes() if tag != 'equal'
+    ]
+    return json.dumps(ops, ensure_ascii=False, separators=(',', ':'))
+
+
+def apply_delta(text, delta):
+    lines = text.splitlines(keepends=True)
+    result = []
+    position = 0
+    for start, end, new_lines in json.loads(delta):
+        result.extend(lines[position:start])
+        result.extend(new_lines)
+        position = end
+    result.extend(lines[position:])
+    return ''.join(result)
+
+
+def rebuild_text(chain):
+    """
+    Return the text of the last revision of chain, which starts with a
+    snapshot and follows with the consecutive deltas
+    """
+    text = chain[0].get_content()
+    for revision in chain[1:]:
+        text = apply_delta(text, revision.get_content())
+    return text
+
+
+# Reading
+
+def _chains(memo_ids, number=None, using=None):
+    """
+    Return the revisions from the latest snapshot up to the revision number,
+    the latest by default, of the memos as {memo_id: [revisions]}
+    """
+    snapshots = MemoRevision.objects.filter(memo_id=OuterRef('memo_id'), is_snapshot=True)
+    revisions = MemoRevision.objects.using(using).filter(memo_id__in=memo_ids)
+    if number is not None:
+        snapshots = snapshots.filter(number__lte=number)
+        revisions = revisions.filter(number__lte=number)
+    revisions = revisions.filter(
+        number__gte=Subquery(snapshots.order_by('-number').values('number')[:1])
+    ).order_by('memo_id', 'number')
+    chains = collections.defaultdict(list)
+    for revision in revisions:
+        chains[revision.memo_id].append(revision)
+    return chains
+
+
+def get_revision(memo_id, number, using=None):
+    """
+    Return the revision of the memo with its text rebuilt in revision.text
+
+    The text is rebuilt with at most MEMO_REVISION_SNAPSHOT_INTERVAL - 1
+    deltas. Raise MemoRevision.DoesNotExist if there is no such revision.
+    """
+    chain = _chains([memo_id], number, using=using).get(memo_id)
+    if not chain or chain[-1].number != number:
+        raise MemoRevision.DoesNotExist('Memo {} has no revision {}'.format(memo_id, number))
+    revision = chain[-1]
+    revision.text = rebuild_text(chain)
+    return revision
+
+
+# Writing
+
+def _encode(revision, chain, previous_text, text):
+    """
+    Store the text in the revision, as the delta from previous_text, the
+    text of the last revision of chain, unless a snapshot is due
+    """
+    if chain and len(chain) < get_snapshot_interval():
+        delta = make_delta(previous_text, text)
+        # A delta as large as the text saves nothing and lengthens the chain
+        if len(delta) < len(text):
+            revision.set_content(delta)
+            revision.is_snapshot = False
+            return
+    revision.set_content(text)
+    revision.is_snapshot = True
+
+
+def record_revisions(memos, created=False, using=None):
+    """
+    Add a revision to the saved memos whose title or text changed since
+    their latest revision, and return the revisions added
+
+    Every MEMO_REVISION_SNAPSHOT_INTERVAL revisions one is a snapshot. Pass
+    created for new memos, which have no revisions to look up.
+    """
+    using = using or router.db_for_write(MemoRevision)
+    chains = {} if created else _chains([memo.pk for memo in memos], using=using)
+    revisions = []
+    for memo in memos:
+        chain = chains.get(memo.pk, [])
+        text = memo.text
+        previous_text = rebuild_text(chain) if chain else None
+        if chain and chain[-1].title == memo.title and previous_text == text:
+            continue
+        revision = MemoRevision(
+            memo_id=memo.pk,
+            number=chain[-1].number + 1 if chain else 1,
+            title=memo.title,
+            created_datetime=memo.updated_datetime,
+        )
+        _encode(revision, chain, previous_text, text)
+        revisions.append(revision)
+    MemoRevision.objects.using(using).bulk_create(revisions)
+    return revisions
+
+
+def compact_revisions(keep=None, before=None, batch_size=100, using=None):
+    """
+    Drop the revisions beyond the latest keep of every memo, or created
+    before the datetime before, and re-encode the others with a snapshot
+    every MEMO_REVISION_SNAPSHOT_INTERVAL revisions
+
+    The latest revision of a memo is always kept. Return the numbers of
+    deleted and rewritten revisions.
+    """
+    using = using or router.db_for_write(MemoRevision)
+    memo_ids = list(
+        MemoRevision.objects.using(using).order_by('memo_id').values_list('memo_id', flat=True).distinct()
+    )
+    stats = {'deleted': 0, 'rewritten': 0}
+    for start in range(0, len(memo_ids), batch_size):
+        batch = memo_ids[start:start + batch_size]
+        with transaction.atomic(using=using):
+            revisions = MemoRevision.objects.using(using).filter(memo_id__in=batch).order_by('memo_id', 'number')
+            by_memo = collections.defaultdict(list)
+            for revision in revisions.select_for_update():
+                by_memo[revision.memo_id].append(revision)
+            deleted, rewritten = [], []
+            for memo_revisions in by_memo.values():
+                memo_deleted, memo_rewritten = _compact(memo_revisions, keep, before)
+                deleted.extend(memo_deleted)
+                rewritten.extend(memo_rewritten)
+            MemoRevision.objects.using(using).filter(pk__in=[revision.pk for revision in deleted]).delete()
+            MemoRevision.objects.using(using).bulk_update(rewritten, STORED_FIELDS)
+        stats['deleted'] += len(deleted)
+        stats['rewritten'] += len(rewritten)
+    return stats
+
+
+def _compact(revisions, keep, before):
+    # Rebuild every text once, in order, before anything is re-encoded
+    texts = []
+    for revision in revisions:
+        if revision.is_snapshot or not texts:
+            texts.append(revision.get_content())
+        else:
+            texts.append(apply_delta(texts[-1], revision.get_content()))
+
+    first = 0
+    if keep is not None:
+        first = max(first, len(revisions) - keep)
+    if before is not None:
+        while first < len(revisions) and revisions[first].created_datetime < before:
+            first += 1
+    first = min(first, len(revisions) - 1)
+
+    rewritten = []
+    chain = []
+    previous_text = None
+    for revision, text in zip(revisions[first:], texts[first:]):
+        stored = [getattr(revision, field) for field in STORED_FIELDS]
+        _encode(revision, chain, previous_text, text)
+        if [getattr(revision, field) for field in STORED_FIELDS] != stored:
+            rewritten.append(revision)
+        chain = [revision] if revision.is_snapshot else chain + [revision]
+        previous_text = text
+    return revisions[:first], rewritten
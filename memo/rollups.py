@@ -0,0 +1,110 @@
+import collections
+import datetime
+
+from django.core.cache import cache
+from django.db import IntegrityError, router, transaction
+from django.db.models import Count, F
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from .cache import bump_list_generation, fill_cache, list_cache_key
+from .models import Memo, MemoDateCount
+
+
+def memo_date(created_datetime):
+    """
+    Return the day of the creation time in the default time zone
+    """
+    return timezone.localdate(created_datetime, timezone.get_default_timezone())
+
+
+def count_memos(memos, delta=1, using=None):
+    """
+    Add delta to the rollups of the days the memos were created on
+    """
+    using = using or router.db_for_write(MemoDateCount)
+    days = collections.Counter(memo_date(memo.created_datetime) for memo in memos)
+    for date, count in days.items():
+        _add_count(date, count * delta, using)
+
+
+def _add_count(date, delta, using):
+    counts = MemoDateCount.objects.using(using)
+    if counts.filter(date=date).update(count=F('count') + delta):
+        return
+    try:
+        # Another transaction may create the day at the same time
+        with transaction.atomic(using=using):
+            counts.create(date=date, count=delta)
+    except IntegrityError:
+        counts.filter(date=date).update(count=F('count') + delta)
+
+
+def rebuild_date_counts(using=None, batch_size=1000):
+    """
+    Rebuild the rollups from the memo table
+    """
+    using = using or router.db_for_write(MemoDateCount)
+    days = collections.Counter(
+        memo_date(created) for created in
+        Memo.objects.using(using).order_by().values_list('created_datetime', flat=True).iterator(chunk_size=batch_size)
+    )
+    with transaction.atomic(using=using):
+        MemoDateCount.objects.using(using).all().delete()
+        MemoDateCount.objects.using(using).bulk_create(
+            [MemoDateCount(date=date, count=count) for date, count in sorted(days.items())],
+            batch_size=batch_size,
+        )
+    bump_list_generation(using=using)
+    return len(days)
+
+
+def month_range(year, month):
+    """
+    Return the start and the end of the month in the default time zone
+    """
+    tz = timezone.get_default_timezone()
+    start = datetime.datetime(year, month, 1)
+    end = datetime.datetime(year + month // 12, month % 12 + 1, 1)
+    return timezone.make_aware(start, tz), timezone.make_aware(end, tz)
+
+
+def get_day_counts(year, month, using=None):
+    """
+    Return the (date, count) of the days of the month which have memos
+    """
+    days = MemoDateCount.objects.using(using).filter(date__year=year, date__month=month, count__gt=0)
+    return list(days.order_by('date').values_list('date', 'count'))
+
+
+def get_month_counts(using=None):
+    """
+    Return the (first day, count) of the months which have memos, the latest
+    first, from the day rollups
+
+    They are cached until the next memo write, like the list pages.
+    """
+    key = list_cache_key('months', using)
+    months = cache.get(key)
+    if months is None:
+        counts = collections.Counter()
+        for date, count in MemoDateCount.objects.using(using).filter(count__gt=0).values_list('date', 'count'):
+            counts[date.replace(day=1)] += count
+        months = sorted(counts.items(), reverse=True)
+        fill_cache(key, months)
+    return months
+
+
+def date_facets(memos):
+    """
+    Return the (first day, count) of the months of the memos, the latest first
+
+    The months of all the memos come from the rollups; those of filtered
+    memos, e.g. search results, are counted over the matches.
+    """
+    if not memos.query.where:
+        return get_month_counts(using=memos.db)
+    months = memos.annotate(
+        month=TruncMonth('created_datetime', tzinfo=timezone.get_default_timezone())
+    ).order_by().values_list('month').annotate(count=Count('id'))
+    return sorted(((month.date(), count) for month, count in months), reverse=True)
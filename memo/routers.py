@@ -0,0 +1,89 @@
+import contextvars
+import random
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+_current = contextvars.ContextVar('memo_replica_state', default=None)
+
+
+class ReplicaState:
+    """
+    Routing of the current request
+
+    reading is set by the views reading from a replica, unless the client
+    wrote recently and is pinned to the primary; wrote is set on the writes
+    to the memo tables.
+    """
+
+    def __init__(self, pinned=False):
+        self.pinned = pinned
+        self.reading = False
+        self.wrote = False
+
+
+def start_request(pinned=False):
+    """
+    Start routing the current request and return its state and a token for
+    end_request()
+    """
+    state = ReplicaState(pinned)
+    return state, _current.set(state)
+
+
+def end_request(token):
+    _current.reset(token)
+
+
+def read_from_replica():
+    """
+    Send the reads of the memo tables to a replica for the rest of the request
+    """
+    state = _current.get()
+    if state is not None and not state.pinned:
+        state.reading = True
+
+
+def reading_from_replica():
+    """
+    Return whether the reads of the memo tables go to a replica
+    """
+    state = _current.get()
+    return state is not None and state.reading and bool(get_replicas())
+
+
+def get_replicas():
+    return getattr(settings, 'MEMO_READ_REPLICAS', [])
+
+
+class ReplicaRouter:
+    """
+    Send the reads of the memos to MEMO_READ_REPLICAS in the views which opt
+    in with ReplicaReadMixin, and everything else to the primary
+    """
+    read_models = {'memo.memo', 'memo.memobody', 'memo.memogram', 'memo.memodatecount', 'memo.memorevision'}
+
+    def db_for_read(self, model, **hints):
+        state = _current.get()
+        replicas = get_replicas()
+        if state is None or not state.reading or not replicas or model._meta.label_lower not in self.read_models:
+            return None
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        state = _current.get()
+        if state is not None and model._meta.app_label == 'memo':
+            state.wrote = True
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *get_replicas()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The replicas get the schema from the primary
+        if db in get_replicas():
+            return False
+        return None
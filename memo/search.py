@@ -0,0 +1,256 @@
+from django.conf import settings
+from django.db import connections, router
+from django.db.models import BooleanField, Count, FloatField, Q
+from django.db.models.expressions import RawSQL
+
+from .compression import get_codec
+from .models import BODY_COLUMNS, Memo, MemoBody, MemoGram
+
+
+SEARCH_MODES = ('ngram', 'fulltext', 'substring')
+
+FTS_TABLE = 'memo_memo_fts'
+TS_CONFIG = 'simple'
+FULLTEXT_VENDORS = ('postgresql', 'sqlite')
+RANK_ORDERING = '-search_rank'
+
+
+def get_search_mode(mode=None):
+    """
+    Return the requested search mode, falling back to MEMO_SEARCH_MODE
+    """
+    if mode in SEARCH_MODES:
+        return mode
+    return getattr(settings, 'MEMO_SEARCH_MODE', 'ngram')
+
+
+def search_memos(memos, keyword, mode=None):
+    """
+    Filter memos by the keyword with the given search mode
+
+    The fulltext mode ranks the results by relevance using the search index,
+    the ngram mode narrows the candidates with the n-gram index before the
+    substring check, and the substring mode only does the substring check.
+    The compressed texts can't be read in SQL, so their n-gram candidates
+    are decompressed and checked in Python.
+    """
+    mode = get_search_mode(mode)
+    vendor = connections[memos.db].vendor
+    if mode == 'fulltext' and vendor in FULLTEXT_VENDORS:
+        return _fulltext_search(memos, keyword, vendor)
+    if mode == 'ngram':
+        memos = memos.filter(id__in=_ngram_candidates(keyword))
+    return _substring_search(memos, keyword)
+
+
+def _substring_search(memos, keyword):
+    match = Q(title__icontains=keyword) | Q(body__text__icontains=keyword)
+    # Without MEMO_BODY_COMPRESSION, compress_memos has stored every text raw
+    if get_codec():
+        match |= Q(id__in=_compressed_matches(keyword, memos.db))
+    return memos.filter(match)
+
+
+def _compressed_matches(keyword, using):
+    """
+    Return the ids of the memos whose compressed text contains the keyword
+
+    The unigrams and bigrams of the index tell whether a keyword of up to
+    two characters is in a memo. Longer keywords are checked in the texts of
+    at most MEMO_SEARCH_DECOMPRESS_LIMIT candidates, the latest first.
+    """
+    keyword = keyword.lower()
+    bodies = MemoBody.objects.using(using).filter(codec__gt='', memo_id__in=_ngram_candidates(keyword))
+    if len(keyword) <= 2:
+        return bodies.values('memo_id')
+    limit = getattr(settings, 'MEMO_SEARCH_DECOMPRESS_LIMIT', 1000)
+    bodies = bodies.only('memo_id', 'text', 'data', 'codec').order_by('-memo_id')[:limit]
+    return [body.memo_id for body in bodies if keyword in body.get_text().lower()]
+
+
+def _ngram_candidates(keyword):
+    grams = set(query_grams(keyword))
+    return MemoGram.objects.filter(gram__in=grams).values('memo_id').annotate(
+        gram_count=Count('gram')
+    ).filter(gram_count=len(grams)).values('memo_id')
+
+
+def _fulltext_search(memos, keyword, vendor):
+    if vendor == 'postgresql':
+        tsquery = "plainto_tsquery('{}', %s)".format(TS_CONFIG)
+        memos = memos.annotate(
+            search_match=RawSQL(
+                'memo_memo.search_vector @@ {}'.format(tsquery),
+                (keyword,),
+                output_field=BooleanField(),
+            ),
+            search_rank=RawSQL(
+                'ts_rank(memo_memo.search_vector, {})'.format(tsquery),
+                (keyword,),
+                output_field=FloatField(),
+            ),
+        ).filter(search_match=True)
+    else:
+        match = _fts5_query(keyword)
+        if not match:
+            return memos
+        # The FTS5 table is joined by rowid so that bm25() can rank the matches
+        memos = memos.extra(
+            select={'search_rank': '-bm25({})'.format(FTS_TABLE)},
+            tables=[FTS_TABLE],
+            where=[
+                '{}.rowid = memo_memo.id'.format(FTS_TABLE),
+                '{} MATCH %s'.format(FTS_TABLE),
+            ],
+            params=[match],
+        )
+    return memos.order_by(RANK_ORDERING, *Memo._meta.ordering)
+
+
+def is_ranked(memos):
+    """
+    Return whether the memos are ordered by the relevance of a fulltext search
+    """
+    return memos.query.order_by[:1] == (RANK_ORDERING,)
+
+
+def _fts5_query(keyword):
+    # Quote every term so that FTS5 operators in the keyword are matched literally
+    terms = ['"{}"'.format(term.replace('"', '""')) for term in keyword.split()]
+    return ' '.join(terms)
+
+
+# N-gram extraction
+
+def text_grams(text):
+    """
+    Return the set of the unigrams and the bigrams in the text
+    """
+    text = text.lower()
+    grams = set(text)
+    grams.update(text[i:i + 2] for i in range(len(text) - 1))
+    return grams
+
+
+def query_grams(keyword):
+    """
+    Return the grams which every memo containing the keyword must have
+    """
+    keyword = keyword.lower()
+    if len(keyword) < 2:
+        return [keyword]
+    return [keyword[i:i + 2] for i in range(len(keyword) - 1)]
+
+
+def memo_grams(memo):
+    return text_grams(memo.title) | text_grams(memo.text)
+
+
+# Maintenance of the search index
+
+def index_memo(memo):
+    """
+    Add or refresh the search index entries of the memo
+    """
+    using = router.db_for_write(Memo, instance=memo)
+    _index_memo_grams(memo, using)
+    _index_fulltext([memo], using)
+
+
+def index_memos(memos, using='default', batch_size=1000):
+    """
+    Add or refresh the search index entries of many memos at once
+    """
+    for start in range(0, len(memos), batch_size):
+        batch = memos[start:start + batch_size]
+        MemoGram.objects.using(using).filter(memo_id__in=[memo.pk for memo in batch]).delete()
+        MemoGram.objects.using(using).bulk_create(
+            [MemoGram(gram=gram, memo_id=memo.pk) for memo in batch for gram in memo_grams(memo)]
+        )
+        _index_fulltext(batch, using)
+
+
+def _index_fulltext(memos, using):
+    connection = connections[using]
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.executemany(
+                "UPDATE memo_memo SET search_vector = "
+                "setweight(to_tsvector('{0}', %s), 'A') || setweight(to_tsvector('{0}', %s), 'B') "
+                "WHERE id = %s".format(TS_CONFIG),
+                [(memo.title, memo.text, memo.pk) for memo in memos],
+            )
+        elif connection.vendor == 'sqlite':
+            cursor.executemany(
+                'DELETE FROM {} WHERE rowid = %s'.format(FTS_TABLE),
+                [(memo.pk,) for memo in memos],
+            )
+            cursor.executemany(
+                'INSERT INTO {} (rowid, title, text) VALUES (%s, %s, %s)'.format(FTS_TABLE),
+                [(memo.pk, memo.title, memo.text) for memo in memos],
+            )
+
+
+def _index_memo_grams(memo, using):
+    # Only the difference from the stored grams is written
+    grams = memo_grams(memo)
+    stored = MemoGram.objects.using(using).filter(memo_id=memo.pk)
+    stored_grams = set(stored.values_list('gram', flat=True))
+    removed = stored_grams - grams
+    if removed:
+        stored.filter(gram__in=removed).delete()
+    MemoGram.objects.using(using).bulk_create(
+        [MemoGram(gram=gram, memo_id=memo.pk) for gram in grams - stored_grams]
+    )
+
+
+def unindex_memo(memo):
+    """
+    Remove the search index entry of the deleted memo
+
+    The n-gram entries are removed by the cascade of the memo deletion.
+    """
+    connection = connections[router.db_for_write(Memo, instance=memo)]
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute('DELETE FROM {} WHERE rowid = %s'.format(FTS_TABLE), [memo.pk])
+
+
+def rebuild_index(using='default', batch_size=1000):
+    """
+    Rebuild the whole search index from the memo table
+
+    The full-text index of the compressed texts is written from Python, as
+    the SQL only reads the raw ones.
+    """
+    connection = connections[using]
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute(
+                "UPDATE memo_memo SET search_vector = "
+                "setweight(to_tsvector('{0}', title), 'A') || setweight(to_tsvector('{0}', text), 'B') "
+                "FROM memo_memobody WHERE memo_memobody.memo_id = memo_memo.id".format(TS_CONFIG)
+            )
+        elif connection.vendor == 'sqlite':
+            cursor.execute('DELETE FROM {}'.format(FTS_TABLE))
+            cursor.execute(
+                'INSERT INTO {} (rowid, title, text) SELECT id, title, text '
+                'FROM memo_memo INNER JOIN memo_memobody ON memo_memobody.memo_id = memo_memo.id'.format(FTS_TABLE)
+            )
+
+    MemoGram.objects.using(using).all().delete()
+    memos = Memo.objects.using(using).select_related('body').only('id', 'title', *BODY_COLUMNS['text']).order_by()
+    grams = []
+    compressed = []
+    for memo in memos.iterator(chunk_size=batch_size):
+        grams.extend(MemoGram(gram=gram, memo_id=memo.pk) for gram in memo_grams(memo))
+        if memo.get_body().codec:
+            compressed.append(memo)
+        if len(grams) >= batch_size:
+            MemoGram.objects.using(using).bulk_create(grams)
+            grams = []
+        if len(compressed) >= batch_size:
+            _index_fulltext(compressed, using)
+            compressed = []
+    MemoGram.objects.using(using).bulk_create(grams)
+    _index_fulltext(compressed, using)
@@ -1,38 +1,282 @@
-from rest_framework import serializers
+from collections import OrderedDict
 
-from .models import Memo
+from django.conf import settings
+from django.utils import timezone
+from rest_framework import ISO_8601, serializers
+from rest_framework.settings import api_settings
+from rest_framework.validators import UniqueValidator
 
+from .bulk import bulk_create_memos, bulk_update_memos
+from .metrics import timing
+from .models import Memo, MemoRevision, MemoTombstone
 
-class MemoListSerializer(serializers.ModelSerializer):
+
+def without_unique_slug(serializer):
+    """
+    Drop the per-memo unique slug query of the serializer, for callers which
+    check the slugs of many memos at once
+    """
+    slug = serializer.fields['slug']
+    slug.validators = [
+        validator for validator in slug.validators
+        if not isinstance(validator, UniqueValidator)
+    ]
+    return serializer
+
+
+class MemoBulkListSerializer(serializers.ListSerializer):
+    """
+    Validate and write many memos at once
+
+    The slugs are checked with a single slug__in lookup instead of a query
+    per memo, and the memos are written with bulk queries. Without an
+    instance the memos are created, otherwise the existing memos with the
+    given slugs are updated.
+    """
+    default_error_messages = {
+        'max_length': 'Ensure this field has no more than {max_length} elements.',
+    }
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        without_unique_slug(self.child)
+        self.memos = {}
+
+    def to_internal_value(self, data):
+        max_length = getattr(settings, 'MEMO_BULK_MAX_SIZE', 1000)
+        if isinstance(data, list) and len(data) > max_length:
+            message = self.error_messages['max_length'].format(max_length=max_length)
+            raise serializers.ValidationError(
+                {api_settings.NON_FIELD_ERRORS_KEY: [message]}, code='max_length'
+            )
+        try:
+            items = super().to_internal_value(data)
+            errors = [{} for item in items]
+        except serializers.ValidationError as exc:
+            if not isinstance(exc.detail, list):
+                raise
+            items = None
+            errors = exc.detail
+
+        # Slugs of other types already failed the validation of the child
+        slugs = [item.get('slug') if isinstance(item, dict) else None for item in data]
+        slugs = [slug if isinstance(slug, str) else None for slug in slugs]
+        lookup = [slug for slug in slugs if slug is not None]
+        if self.instance is None:
+            existing = set(Memo.objects.filter(slug__in=lookup).order_by().values_list('slug', flat=True))
+        else:
+            self.memos = {memo.slug: memo for memo in self.instance.filter(slug__in=lookup)}
+            existing = set(self.memos)
+
+        seen = set()
+        for slug, error in zip(slugs, errors):
+            if 'slug' in error:
+                pass
+            elif slug is None:
+                error['slug'] = ['This field is required.']
+            elif slug in seen:
+                error['slug'] = ['This slug is duplicated in the request.']
+            elif self.instance is None and slug in existing:
+                error['slug'] = ['memo with this slug already exists.']
+            elif self.instance is not None and slug not in existing:
+                error['slug'] = ['memo with this slug does not exist.']
+            seen.add(slug)
+        if any(errors):
+            raise serializers.ValidationError(errors)
+        return items
+
+    def create(self, validated_data):
+        return bulk_create_memos([Memo(**item) for item in validated_data])
+
+    def update(self, instance, validated_data):
+        memos = []
+        fields = set()
+        for item in validated_data:
+            memo = self.memos[item['slug']]
+            for field, value in item.items():
+                setattr(memo, field, value)
+            memos.append(memo)
+            fields.update(item)
+        fields.discard('slug')
+        return bulk_update_memos(memos, fields)
+
+
+class TimedListSerializer(serializers.ListSerializer):
+    """ListSerializer recording the time spent in .data as serialization time"""
+
+    @property
+    def data(self):
+        with timing('serialize_ms'):
+            return super().data
+
+
+class TimedDataMixin:
+    """
+    Record the time spent in .data as serialization time of the request
+
+    Meta.list_serializer_class should be TimedListSerializer for many=True.
+    """
+
+    @property
+    def data(self):
+        with timing('serialize_ms'):
+            return super().data
+
+
+class SparseFieldsMixin:
+    """
+    Keep only the fields named by the fields argument, all of them if it is None
+    """
+
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+
+def compile_converter(field):
+    """
+    Return a function converting a non-null value like field.to_representation
+
+    The common fields get a shortcut whose options are resolved here once,
+    the others fall back to to_representation.
+    """
+    if type(field) in (serializers.CharField, serializers.SlugField):
+        return str
+    if type(field) is serializers.IntegerField:
+        return int
+    if type(field) is serializers.DateTimeField:
+        output_format = getattr(field, 'format', api_settings.DATETIME_FORMAT)
+        field_timezone = getattr(field, 'timezone', field.default_timezone())
+        if output_format is None or output_format.lower() != ISO_8601 or field_timezone is None:
+            return field.to_representation
+
+        def convert(value):
+            if timezone.is_naive(value):
+                return field.to_representation(value)
+            value = value.astimezone(field_timezone).isoformat()
+            if value.endswith('+00:00'):
+                value = value[:-6] + 'Z'
+            return value
+        return convert
+    return field.to_representation
+
+
+class ReadOnlySerializer(TimedDataMixin, serializers.BaseSerializer):
+    """
+    Output the representation of serializer_class without running the DRF
+    field machinery for every instance
+
+    The attributes and the converters of the fields are looked up once per
+    serializer, so that every instance only costs a getattr and a call per
+    field. Only plain model fields are supported.
+    """
+    serializer_class = None
 
     class Meta:
-        model = Memo
-        exclude = ('text',)
+        list_serializer_class = TimedListSerializer
+
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields = self.serializer_class(fields=fields).fields
+        self.names = list(self.fields)
+        self.columns = [field.source for field in self.fields.values()]
+        self.converters = [compile_converter(field) for field in self.fields.values()]
 
+    def to_representation(self, instance):
+        data = OrderedDict()
+        for name, source, convert in zip(self.names, self.columns, self.converters):
+            value = getattr(instance, source)
+            data[name] = None if value is None else convert(value)
+        return data
 
-class MemoRetrieveSerializer(serializers.ModelSerializer):
+
+class ValuesSerializer(ReadOnlySerializer):
+    """
+    ReadOnlySerializer over the rows of values_list(*serializer.columns)
+
+    Rows may have more values after the columns, which are ignored.
+    """
+
+    def to_representation(self, row):
+        return OrderedDict(zip(self.names, [
+            None if value is None else convert(value) for convert, value in zip(self.converters, row)
+        ]))
+
+
+class MemoListSerializer(TimedDataMixin, SparseFieldsMixin, serializers.ModelSerializer):
 
     class Meta:
         model = Memo
         fields = '__all__'
+        list_serializer_class = TimedListSerializer
+
+
+class MemoListReadSerializer(ReadOnlySerializer):
+    serializer_class = MemoListSerializer
+
+
+class MemoListValuesSerializer(ValuesSerializer):
+    serializer_class = MemoListSerializer
+
+
+class MemoBodySerializer(serializers.ModelSerializer):
+    """
+    Serialize the memos with the fields of their MemoBody
+    """
+    text = serializers.CharField(label='本文', allow_blank=True, required=False, style={'base_template': 'textarea.html'})
+    text_html = serializers.CharField(label='本文HTML', read_only=True)
+
+
+class MemoRetrieveSerializer(TimedDataMixin, SparseFieldsMixin, MemoBodySerializer):
+
+    class Meta:
+        model = Memo
+        fields = ('id', 'title', 'slug', 'text', 'created_datetime', 'updated_datetime', 'sequence', 'text_html')
+        list_serializer_class = TimedListSerializer
 
 
-class MemoCreateSerializer(serializers.ModelSerializer):
+class MemoCreateSerializer(MemoBodySerializer):
 
     class Meta:
         model = Memo
-        exclude = ('created_datetime', 'updated_datetime')
+        fields = ('id', 'title', 'slug', 'text', 'sequence', 'text_html')
+        list_serializer_class = MemoBulkListSerializer
 
 
-class MemoUpdateSerializer(serializers.ModelSerializer):
+class MemoUpdateSerializer(MemoBodySerializer):
 
     class Meta:
         model = Memo
-        exclude = ('created_datetime', 'updated_datetime')
+        fields = ('id', 'title', 'slug', 'text', 'sequence', 'text_html')
+        list_serializer_class = MemoBulkListSerializer
 
 
 class MemoDestroySerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Memo
-        
\ No newline at end of file
+
+
+class MemoTombstoneSerializer(TimedDataMixin, serializers.ModelSerializer):
+
+    class Meta:
+        model = MemoTombstone
+        fields = ('memo_id', 'slug', 'sequence', 'deleted_datetime')
+        list_serializer_class = TimedListSerializer
+
+
+class MemoRevisionListSerializer(serializers.ModelSerializer):
+
+    class Meta:
+        model = MemoRevision
+        fields = ('number', 'title', 'created_datetime')
+
+
+class MemoRevisionSerializer(serializers.ModelSerializer):
+    text = serializers.CharField(label='本文', read_only=True)
+
+    class Meta:
+        model = MemoRevision
+        fields = ('number', 'title', 'text', 'created_datetime')
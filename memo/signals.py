@@ -0,0 +1,79 @@
+from django.core.signals import request_started
+from django.db import connections
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .cache import bump_list_generation, bump_memo_version
+from .models import Memo, MemoSequence
+from .revisions import record_revisions
+from .rollups import count_memos
+from .sync import record_tombstone
+from .search import index_memo, unindex_memo
+
+
+@receiver(post_save, sender=Memo)
+def update_search_index(sender, instance, raw=False, **kwargs):
+    if not raw:
+        index_memo(instance)
+
+
+@receiver(post_delete, sender=Memo)
+def delete_search_index(sender, instance, **kwargs):
+    unindex_memo(instance)
+
+
+@receiver(post_save, sender=Memo)
+def record_memo_revision(sender, instance, created, raw=False, using=None, **kwargs):
+    if not raw:
+        record_revisions([instance], created=created, using=using)
+
+
+@receiver(post_save, sender=Memo)
+def count_created_memo(sender, instance, created, raw=False, using=None, **kwargs):
+    if created and not raw:
+        count_memos([instance], using=using)
+
+
+@receiver(post_delete, sender=Memo)
+def count_deleted_memo(sender, instance, using, **kwargs):
+    count_memos([instance], delta=-1, using=using)
+
+
+@receiver(post_delete, sender=Memo)
+def record_deleted_memo(sender, instance, using, **kwargs):
+    record_tombstone(instance.pk, instance.slug, using=using)
+
+
+@receiver(post_save, sender=Memo)
+@receiver(post_delete, sender=Memo)
+def invalidate_list_cache(sender, using, **kwargs):
+    bump_list_generation(using=using)
+
+
+@receiver(pre_save, sender=Memo)
+def handle_renamed_memo(sender, instance, raw=False, using=None, **kwargs):
+    if raw or instance.pk is None:
+        return
+    old_slug = Memo.objects.using(using).filter(pk=instance.pk).values_list('slug', flat=True).first()
+    if old_slug is not None and old_slug != instance.slug:
+        bump_memo_version(old_slug, using=using)
+        # The synced clients have to drop the memo under its old slug before
+        # they receive it under the new one
+        record_tombstone(instance.pk, old_slug, using=using)
+        instance.sequence = MemoSequence.allocate(using=using)
+
+
+@receiver(post_save, sender=Memo)
+@receiver(post_delete, sender=Memo)
+def invalidate_memo_cache(sender, instance, using, **kwargs):
+    bump_memo_version(instance.slug, using=using)
+
+
+@receiver(request_started)
+def check_database_connections(sender, **kwargs):
+    # Django 2.2 has no CONN_HEALTH_CHECKS, a persistent connection which was
+    # closed by the server fails the first query of the request otherwise
+    for connection in connections.all():
+        if (connection.settings_dict.get('CONN_HEALTH_CHECKS') and connection.connection is not None
+                and not connection.in_atomic_block and not connection.is_usable()):
+            connection.close()
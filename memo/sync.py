@@ -0,0 +1,44 @@
+import heapq
+from itertools import islice
+from operator import attrgetter
+
+from django.db import router, transaction
+from django.utils import timezone
+
+from .models import Memo, MemoSequence, MemoTombstone
+
+
+def record_tombstone(memo_id, slug, using=None):
+    """
+    Record that the slug was deleted, keeping a single tombstone per slug
+    """
+    using = using or router.db_for_write(MemoTombstone)
+    with transaction.atomic(using=using, savepoint=False):
+        MemoTombstone.objects.using(using).update_or_create(slug=slug, defaults={
+            'memo_id': memo_id,
+            'sequence': MemoSequence.allocate(using=using),
+            'deleted_datetime': timezone.now(),
+        })
+
+
+def get_changes(since=0, limit=100, using=None):
+    """
+    Return the memos and the tombstones changed after the sequence since
+
+    Both are read with a range scan on their sequence index, so the cost
+    follows the number of changes rather than the number of memos. Returns
+    (memos, tombstones, sequence, has_more), where sequence is the cursor
+    for the next call.
+    """
+    memos = Memo.objects.using(using).select_related('body').filter(sequence__gt=since).order_by('sequence')[:limit + 1]
+    tombstones = MemoTombstone.objects.using(using).filter(sequence__gt=since).order_by('sequence')[:limit + 1]
+    changes = list(islice(heapq.merge(memos, tombstones, key=attrgetter('sequence')), limit + 1))
+    has_more = len(changes) > limit
+    changes = changes[:limit]
+    sequence = changes[-1].sequence if changes else since
+    return (
+        [change for change in changes if isinstance(change, Memo)],
+        [change for change in changes if isinstance(change, MemoTombstone)],
+        sequence,
+        has_more,
+    )
@@ -0,0 +1,102 @@
+import datetime
+
+from django import template
+from django.contrib.admin.templatetags.admin_list import date_hierarchy
+from django.contrib.admin.templatetags.base import InclusionAdminNode
+from django.db.models import Max, Min
+from django.utils import formats
+from django.utils.text import capfirst
+from django.utils.translation import gettext as _
+
+from memo.models import MemoDateCount
+
+register = template.Library()
+
+
+def memo_date_hierarchy(cl):
+    """
+    Date hierarchy of the memo changelist listing the days, months and years
+    from the date rollups instead of the distinct dates of the memos
+
+    The rollups count every memo, so a search falls back to the dates of the
+    matching memos.
+    """
+    if cl.query:
+        return date_hierarchy(cl)
+    field_name = cl.date_hierarchy
+    year_field = '%s__year' % field_name
+    month_field = '%s__month' % field_name
+    day_field = '%s__day' % field_name
+    field_generic = '%s__' % field_name
+    year_lookup = cl.params.get(year_field)
+    month_lookup = cl.params.get(month_field)
+    day_lookup = cl.params.get(day_field)
+    days = MemoDateCount.objects.filter(count__gt=0)
+
+    def link(filters):
+        return cl.get_query_string(filters, [field_generic])
+
+    if not (year_lookup or month_lookup or day_lookup):
+        date_range = days.aggregate(first=Min('date'), last=Max('date'))
+        if date_range['first'] and date_range['last']:
+            if date_range['first'].year == date_range['last'].year:
+                year_lookup = date_range['first'].year
+                if date_range['first'].month == date_range['last'].month:
+                    month_lookup = date_range['first'].month
+
+    if year_lookup and month_lookup and day_lookup:
+        day = datetime.date(int(year_lookup), int(month_lookup), int(day_lookup))
+        return {
+            'show': True,
+            'back': {
+                'link': link({year_field: year_lookup, month_field: month_lookup}),
+                'title': capfirst(formats.date_format(day, 'YEAR_MONTH_FORMAT'))
+            },
+            'choices': [{'title': capfirst(formats.date_format(day, 'MONTH_DAY_FORMAT'))}]
+        }
+    elif year_lookup and month_lookup:
+        dates = days.filter(date__year=year_lookup, date__month=month_lookup).order_by('date')
+        return {
+            'show': True,
+            'back': {
+                'link': link({year_field: year_lookup}),
+                'title': str(year_lookup)
+            },
+            'choices': [{
+                'link': link({year_field: year_lookup, month_field: month_lookup, day_field: day.day}),
+                'title': capfirst(formats.date_format(day, 'MONTH_DAY_FORMAT'))
+            } for day in dates.values_list('date', flat=True)]
+        }
+    elif year_lookup:
+        months = days.filter(date__year=year_lookup).dates('date', 'month')
+        return {
+            'show': True,
+            'back': {
+                'link': link({}),
+                'title': _('All dates')
+            },
+            'choices': [{
+                'link': link({year_field: year_lookup, month_field: month.month}),
+                'title': capfirst(formats.date_format(month, 'YEAR_MONTH_FORMAT'))
+            } for month in months]
+        }
+    else:
+        years = days.dates('date', 'year')
+        return {
+            'show': True,
+            'back': None,
+            'choices': [{
+                'link': link({year_field: str(year.year)}),
+                'title': str(year.year),
+            } for year in years]
+        }
+
+
+@register.tag(name='memo_date_hierarchy')
+def memo_date_hierarchy_tag(parser, token):
+    return InclusionAdminNode(
+        parser, token,
+        func=memo_date_hierarchy,
+        template_name='date_hierarchy.html',
+        takes_context=False,
+    )
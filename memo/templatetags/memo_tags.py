@@ -10,4 +10,41 @@ def url_replace(request, field, value):
     """
     url_dict = request.GET.copy()
     url_dict[field] = value
-    return url_dict.urlencode()
\ No newline at end of file
+    return url_dict.urlencode()
+
+@register.simple_tag
+def url_base(request, field):
+    """
+    Return GET parameters without the field, ready to append the field to
+    """
+    url_dict = request.GET.copy()
+    url_dict.pop(field, None)
+    query = url_dict.urlencode()
+    return query + '&' if query else ''
+
+
+@register.simple_tag
+def page_window(page_obj, on_each_side=2, on_ends=1):
+    """
+    Return the page numbers around the current page and at both ends,
+    with None in place of the elided pages
+    """
+    number = page_obj.number
+    num_pages = page_obj.paginator.num_pages
+    if num_pages <= (on_each_side + on_ends) * 2 + 1:
+        return list(range(1, num_pages + 1))
+
+    window = []
+    if number > on_each_side + on_ends + 1:
+        window.extend(range(1, on_ends + 1))
+        window.append(None)
+        window.extend(range(number - on_each_side, number + 1))
+    else:
+        window.extend(range(1, number + 1))
+    if number < num_pages - on_each_side - on_ends:
+        window.extend(range(number + 1, number + on_each_side + 1))
+        window.append(None)
+        window.extend(range(num_pages - on_ends + 1, num_pages + 1))
+    else:
+        window.extend(range(number + 1, num_pages + 1))
+    return window
@@ -1,31 +1,95 @@
-import factory
-from django.test import TestCase
+import asyncio
+import base64
+import contextlib
+import csv
+import datetime
+import io
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.signals import request_started
+from django.db import DEFAULT_DB_ALIAS, connection, connections
+from django.template import Context, Template
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.utils import timezone
 from rest_framework import status
+from rest_framework.renderers import JSONRenderer
 from rest_framework.test import APITestCase
 
+from config.asgi import application as asgi_application
+
+from . import routers
+from .benchmarks import BenchmarkError, compare_results, run_benchmarks, run_list_scan_benchmark, seed_memos
+from .budget import QueryBudgetExceeded, QueryBudgetMixin, query_budget
+from .bulk import bulk_create_memos, bulk_delete_memos, bulk_update_memos, compress_memos, render_memos
+from .cache import get_cache_timeout, get_list_generation, get_memo_version, list_cache_key
+from .factories import MemoFactory
 from .forms import MemoSearchForm
-from .models import Memo
+from .metrics import format_prometheus, registry
+from .middleware import ReplicaRoutingMiddleware
+from .models import Author, Memo, MemoBody, MemoDateCount, MemoGram, MemoRevision
+from .pagination import CachedCountPaginator, EstimatedCountPaginator
+from .pool import ConnectionPool, PoolTimeout
+from .renderers import FastJSONRenderer
+from .revisions import apply_delta, compact_revisions, get_revision, make_delta
+from .rollups import get_day_counts, memo_date, rebuild_date_counts
+from .routers import ReplicaRouter
+from .search import SEARCH_MODES, rebuild_index, search_memos
+from .serializers import MemoListReadSerializer, MemoListSerializer, MemoListValuesSerializer
+from .signals import check_database_connections
+from .sync import get_changes
 
 
 # Create your tests here.
 
-class MemoFactory(factory.django.DjangoModelFactory):
-    """Create data for the Memo model used for tests"""
-    title = 'Example memo'
-    slug = 'example-memo'
-    text = 'This is an example memo.'
-    created_datetime = timezone.now()
-    updated_datetime = timezone.now()
+class OnCommitMixin:
+    """
+    captureOnCommitCallbacks() of Django 3.2, as the transaction of a test
+    never commits
+    """
+
+    @classmethod
+    @contextlib.contextmanager
+    def captureOnCommitCallbacks(cls, *, using=DEFAULT_DB_ALIAS, execute=False):
+        callbacks = []
+        start_count = len(connections[using].run_on_commit)
+        try:
+            yield callbacks
+        finally:
+            callbacks[:] = [func for sids, func in connections[using].run_on_commit[start_count:]]
+            if execute:
+                for callback in callbacks:
+                    callback()
+
+
+class MemoTestCase(OnCommitMixin, QueryBudgetMixin, TestCase):
+    """TestCase which starts every test with an empty cache"""
 
-    class Meta:
-        model = Memo
+    def setUp(self):
+        cache.clear()
+
+
+class MemoAPITestCase(OnCommitMixin, QueryBudgetMixin, APITestCase):
+    """APITestCase which starts every test with an empty cache"""
+
+    def setUp(self):
+        cache.clear()
 
 
 # Tests for the forms
 
-class MemoSearchFormTests(TestCase):
+class MemoSearchFormTests(MemoTestCase):
 
     def test_filter_memos(self):
         memo_1 = MemoFactory(
@@ -52,6 +116,23 @@ class MemoSearchFormTests(TestCase):
         self.assertEqual(memos[2].text, 'This is not the first memo.')
         self.assertEqual(memos[3].title, 'First memo')
 
+    def test_substring_filter_memos(self):
+        memo_1 = MemoFactory(title='買い物リスト', slug='shopping', text='牛乳と卵を買う')
+        memo_2 = MemoFactory(title='会議メモ', slug='meeting', text='明日の会議は十時から')
+        form = MemoSearchForm({'keyword': '卵を買', 'mode': 'substring'})
+        memos = form.filter_memos(Memo.objects.all())
+        self.assertEqual([memo.slug for memo in memos], ['shopping'])
+
+    def test_unknown_mode_filter_memos(self):
+        memo_1 = MemoFactory(title='apple', slug='apple')
+        memo_2 = MemoFactory(title='orange', slug='orange')
+        form = MemoSearchForm({'keyword': 'apple', 'mode': 'bogus'})
+        memos = form.filter_memos(Memo.objects.all())
+        self.assertEqual([memo.slug for memo in memos], ['apple'])
+        self.assertEqual(form.cleaned_data['mode'], settings.MEMO_SEARCH_MODE)
+        res = self.client.get(reverse('memo:index'), data={'keyword': 'apple', 'mode': 'bogus'})
+        self.assertEqual([memo.slug for memo in res.context['memo_list']], ['apple'])
+
     def test_not_filter_memos(self):
         memo_1 = MemoFactory(slug='first-memo')
         memo_2 = MemoFactory(slug='second-memo')
@@ -60,10 +141,73 @@ class MemoSearchFormTests(TestCase):
         self.assertEqual(Memo.objects.count(), 2)
         self.assertEqual(memos.count(), 2)
 
+    def test_fulltext_filter_memos(self):
+        memo_1 = MemoFactory(
+            title='First memo', slug='first-memo', text='This memo is opened.'
+        )
+        memo_2 = MemoFactory(
+            title='Second memo', slug='second-memo', text='This is the second memo.'
+        )
+        memo_3 = MemoFactory(
+            title='Third memo', slug='third-memo', text='The first memo and the first draft.'
+        )
+        form = MemoSearchForm({'keyword': 'first', 'mode': 'fulltext'})
+        memos = form.filter_memos(Memo.objects.all())
+        self.assertEqual(memos.count(), 2)
+        self.assertEqual(memos[0].title, 'Third memo')
+        self.assertEqual(memos[1].title, 'First memo')
+
+    def test_fulltext_index_follows_writes(self):
+        memo = MemoFactory(title='Sample memo', slug='sample-memo', text='Old text')
+        memo.text = 'New text'
+        memo.save()
+        form = MemoSearchForm({'keyword': 'old', 'mode': 'fulltext'})
+        self.assertEqual(form.filter_memos(Memo.objects.all()).count(), 0)
+        form = MemoSearchForm({'keyword': 'new', 'mode': 'fulltext'})
+        self.assertEqual(form.filter_memos(Memo.objects.all()).count(), 1)
+        memo.delete()
+        self.assertEqual(form.filter_memos(Memo.objects.all()).count(), 0)
+
+    def test_fulltext_keyword_with_operators(self):
+        memo = MemoFactory(title='Sample "memo"', slug='sample-memo', text='NOT OR AND')
+        form = MemoSearchForm({'keyword': '"memo" NOT', 'mode': 'fulltext'})
+        self.assertEqual(form.filter_memos(Memo.objects.all()).count(), 1)
+
+    def test_ngram_filter_japanese_memos(self):
+        memo_1 = MemoFactory(title='買い物リスト', slug='shopping', text='牛乳と卵を買う')
+        memo_2 = MemoFactory(title='会議メモ', slug='meeting', text='明日の会議は十時から')
+        memo_3 = MemoFactory(title='日記', slug='diary', text='卵焼きを作った')
+        form = MemoSearchForm({'keyword': '卵', 'mode': 'ngram'})
+        self.assertEqual(form.filter_memos(Memo.objects.all()).count(), 2)
+        form = MemoSearchForm({'keyword': '会議', 'mode': 'ngram'})
+        memos = form.filter_memos(Memo.objects.all())
+        self.assertEqual(memos.count(), 1)
+        self.assertEqual(memos[0].slug, 'meeting')
+        form = MemoSearchForm({'keyword': '卵を買', 'mode': 'ngram'})
+        memos = form.filter_memos(Memo.objects.all())
+        self.assertEqual(memos.count(), 1)
+        self.assertEqual(memos[0].slug, 'shopping')
+
+    def test_ngram_candidates_are_verified(self):
+        memo = MemoFactory(title='abcab', slug='sample-memo', text='')
+        form = MemoSearchForm({'keyword': 'abca', 'mode': 'ngram'})
+        self.assertEqual(form.filter_memos(Memo.objects.all()).count(), 1)
+        form = MemoSearchForm({'keyword': 'bcabc', 'mode': 'ngram'})
+        self.assertEqual(form.filter_memos(Memo.objects.all()).count(), 0)
+
+    def test_ngram_index_follows_writes(self):
+        memo = MemoFactory(title='メモ', slug='sample-memo', text='東京')
+        memo.text = '大阪'
+        memo.save()
+        self.assertFalse(MemoGram.objects.filter(memo=memo, gram='東京').exists())
+        self.assertTrue(MemoGram.objects.filter(memo=memo, gram='大阪').exists())
+        memo.delete()
+        self.assertEqual(MemoGram.objects.count(), 0)
+
 
 # Tests for the views
 
-class MemoListTests(TestCase):
+class MemoListTests(MemoTestCase):
 
     def test_get_memo_list(self):
         memo_1 = MemoFactory(title='First memo', slug='first-memo')
@@ -165,7 +309,278 @@ class MemoListTests(TestCase):
         self.assertEqual(res.status_code, 404)
 
 
-class MemoDetailTests(TestCase):
+class MemoPaginatorTests(MemoTestCase):
+
+    def test_cached_count(self):
+        for i in range(1, 12):
+            MemoFactory(title='Memo {}'.format(i), slug='memo-{}'.format(i))
+        res = self.client.get(reverse('memo:index'))
+        self.assertEqual(res.context['paginator'].count, 11)
+        with self.assertNumQueries(1):
+            res = self.client.get(reverse('memo:index'), data={'page': 2})
+        self.assertEqual(res.context['paginator'].count, 11)
+        with self.captureOnCommitCallbacks(execute=True):
+            MemoFactory(title='Memo 12', slug='memo-12')
+        res = self.client.get(reverse('memo:index'))
+        self.assertEqual(res.context['paginator'].count, 12)
+
+    def test_count_from_list_state(self):
+        for i in range(1, 12):
+            MemoFactory(title='Memo {}'.format(i), slug='memo-{}'.format(i))
+        memo = MemoFactory(title='Memo 12', slug='memo-12')
+        memo.delete()
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.get(reverse('memo:index'))
+        self.assertEqual(res.context['paginator'].count, 11)
+        counts = [query['sql'] for query in queries if 'COUNT(' in query['sql']]
+        self.assertEqual(len(counts), 1)
+        # The latest deletion is read through the index of the sequences
+        self.assertIn('ORDER BY U0."sequence" DESC', counts[0])
+
+    def test_cached_count_per_keyword(self):
+        memo_1 = MemoFactory(title='First memo', slug='first-memo')
+        memo_2 = MemoFactory(title='Second memo', slug='second-memo')
+        res = self.client.get(reverse('memo:index'))
+        self.assertEqual(res.context['paginator'].count, 2)
+        res = self.client.get(reverse('memo:index'), data={'keyword': 'first'})
+        self.assertEqual(res.context['paginator'].count, 1)
+
+    def render_paginator(self, number, num_pages):
+        for i in range(num_pages):
+            MemoFactory(title='Memo {}'.format(i), slug='memo-{}'.format(i))
+        request = RequestFactory().get('/', data={'keyword': 'memo', 'page': number})
+        page_obj = CachedCountPaginator(Memo.objects.all(), 1).page(number)
+        template = Template("{% include 'memo/includes/paginator.html' %}")
+        return template.render(Context({'request': request, 'page_obj': page_obj}))
+
+    def test_render_page_window(self):
+        html = self.render_paginator(10, 20)
+        self.assertEqual(html.count('&hellip;'), 2)
+        for number in (1, 8, 9, 10, 11, 12, 20):
+            self.assertIn('?keyword=memo&amp;page={}"'.format(number), html)
+        for number in (2, 7, 13, 19):
+            self.assertNotIn('?keyword=memo&amp;page={}"'.format(number), html)
+
+    def test_render_all_pages(self):
+        html = self.render_paginator(1, 5)
+        self.assertNotIn('&hellip;', html)
+        for number in range(1, 6):
+            self.assertIn('page={}"'.format(number), html)
+
+
+class MemoListCursorTests(MemoTestCase):
+
+    def test_get_memo_list_by_cursor(self):
+        for i in range(1, 12):
+            MemoFactory(title='Memo {}'.format(i), slug='memo-{}'.format(i))
+        res_page_1 = self.client.get(reverse('memo:index'), data={'cursor': ''})
+        self.assertTemplateUsed(res_page_1, 'memo/includes/cursor_paginator.html')
+        self.assertEqual(len(res_page_1.context['memo_list']), 10)
+        self.assertEqual(res_page_1.context['memo_list'][0].title, 'Memo 11')
+        page_1 = res_page_1.context['page_obj']
+        self.assertFalse(page_1.has_previous())
+        res_page_2 = self.client.get(reverse('memo:index'), data={'cursor': page_1.next_cursor})
+        page_2 = res_page_2.context['page_obj']
+        self.assertEqual([memo.title for memo in page_2], ['Memo 1'])
+        self.assertFalse(page_2.has_next())
+        res_back = self.client.get(reverse('memo:index'), data={'cursor': page_2.previous_cursor})
+        self.assertEqual(
+            [memo.title for memo in res_back.context['page_obj']],
+            [memo.title for memo in page_1]
+        )
+        self.assertFalse(res_back.context['page_obj'].has_previous())
+
+    def test_get_invalid_cursor(self):
+        res = self.client.get(reverse('memo:index'), data={'cursor': 'invalid'})
+        self.assertEqual(res.status_code, 404)
+
+    def test_get_crafted_cursor(self):
+        MemoFactory(slug='sample-memo')
+        for position in (
+            ['2020-01-01T00:00:00+09:00', 10 ** 30, False],
+            ['2020-01-01T00:00:00+09:00', True, False],
+            ['2020-01-01T00:00:00', 1, False],
+            ['2020-13-01T00:00:00+09:00', 1, False],
+            ['yesterday', 1, False],
+        ):
+            cursor = base64.urlsafe_b64encode(json.dumps(position).encode()).decode()
+            res = self.client.get(reverse('memo:index'), data={'cursor': cursor})
+            self.assertEqual(res.status_code, 404)
+            res = self.client.get(reverse('memo:api_list'), data={'cursor': cursor})
+            self.assertEqual(res.status_code, 404)
+
+    def test_get_ranked_list_by_cursor(self):
+        # The most relevant memo is the oldest one
+        MemoFactory(title='Third memo', slug='third-memo', text='The first memo and the first draft.')
+        MemoFactory(title='First memo', slug='first-memo', text='This memo is opened.')
+        data = {'keyword': 'first', 'mode': 'fulltext', 'cursor': ''}
+        res = self.client.get(reverse('memo:index'), data=data)
+        self.assertEqual([memo.slug for memo in res.context['memo_list']], ['third-memo', 'first-memo'])
+
+
+class MemoCacheTestsMixin:
+
+    def test_cache_memo_list(self):
+        memo = MemoFactory(title='First memo', slug='first-memo')
+        self.client.get(reverse('memo:index'))
+        with self.assertNumQueries(0):
+            res = self.client.get(reverse('memo:index'))
+        self.assertContains(res, 'First memo')
+        with self.captureOnCommitCallbacks(execute=True):
+            MemoFactory(title='Second memo', slug='second-memo')
+        res = self.client.get(reverse('memo:index'))
+        self.assertContains(res, 'Second memo')
+
+    def test_cache_memo_detail(self):
+        memo = MemoFactory(title='Sample memo', slug='sample-memo', text='Old text')
+        self.client.get(reverse('memo:detail', kwargs={'slug': 'sample-memo'}))
+        with self.assertNumQueries(0):
+            res = self.client.get(reverse('memo:detail', kwargs={'slug': 'sample-memo'}))
+        self.assertContains(res, 'Old text')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(
+                reverse('memo:edit_memo', kwargs={'slug': 'sample-memo'}),
+                data={'title': 'Sample memo', 'slug': 'sample-memo', 'text': 'New text'}
+            )
+        res = self.client.get(reverse('memo:detail', kwargs={'slug': 'sample-memo'}))
+        self.assertContains(res, 'New text')
+
+    def test_cache_renamed_memo(self):
+        memo = MemoFactory(title='Sample memo', slug='sample-memo')
+        self.client.get(reverse('memo:detail', kwargs={'slug': 'sample-memo'}))
+        self.client.get(reverse('memo:api_retrieve', kwargs={'slug': 'sample-memo'}))
+        memo.slug = 'renamed-memo'
+        with self.captureOnCommitCallbacks(execute=True):
+            memo.save()
+        res = self.client.get(reverse('memo:detail', kwargs={'slug': 'sample-memo'}))
+        self.assertEqual(res.status_code, 404)
+        res = self.client.get(reverse('memo:api_retrieve', kwargs={'slug': 'sample-memo'}))
+        self.assertEqual(res.status_code, 404)
+
+    def test_cache_memo_api(self):
+        memo = MemoFactory(title='Sample memo', slug='sample-memo', text='Old text')
+        self.client.get(reverse('memo:api_list'))
+        self.client.get(reverse('memo:api_retrieve', kwargs={'slug': 'sample-memo'}))
+        with self.assertNumQueries(0):
+            res_list = self.client.get(reverse('memo:api_list'))
+            res_retrieve = self.client.get(reverse('memo:api_retrieve', kwargs={'slug': 'sample-memo'}))
+        self.assertEqual(res_list.data['results'][0]['title'], 'Sample memo')
+        self.assertEqual(res_retrieve.data['text'], 'Old text')
+        memo.title = 'Updated memo'
+        memo.text = 'New text'
+        with self.captureOnCommitCallbacks(execute=True):
+            memo.save()
+        res_list = self.client.get(reverse('memo:api_list'))
+        res_retrieve = self.client.get(reverse('memo:api_retrieve', kwargs={'slug': 'sample-memo'}))
+        self.assertEqual(res_list.data['results'][0]['title'], 'Updated memo')
+        self.assertEqual(res_retrieve.data['text'], 'New text')
+        with self.captureOnCommitCallbacks(execute=True):
+            memo.delete()
+        res_retrieve = self.client.get(reverse('memo:api_retrieve', kwargs={'slug': 'sample-memo'}))
+        self.assertEqual(res_retrieve.status_code, 404)
+
+    def test_invalidated_on_commit(self):
+        memo = MemoFactory(title='Sample memo', slug='sample-memo')
+        generation, version = get_list_generation(), get_memo_version('sample-memo')
+        memo.title = 'Updated memo'
+        with self.captureOnCommitCallbacks() as callbacks:
+            memo.save()
+            bulk_update_memos([memo], ['title'])
+        # A read before the commit would cache the memo as it was
+        self.assertEqual((get_list_generation(), get_memo_version('sample-memo')), (generation, version))
+        for callback in callbacks:
+            callback()
+        self.assertGreater(get_list_generation(), generation)
+        self.assertGreater(get_memo_version('sample-memo'), version)
+
+
+class MemoLocMemCacheTests(MemoCacheTestsMixin, MemoTestCase):
+
+    def test_not_shared(self):
+        # The writes of the other workers are seen once the entries expire
+        url = reverse('memo:index')
+        self.client.get(url)
+        key = list_cache_key('page', url)
+        self.assertIsNotNone(cache.get(key))
+        with mock.patch('time.time', return_value=time.time() + settings.MEMO_LOCAL_CACHE_TIMEOUT + 1):
+            self.assertIsNone(cache.get(key))
+        with override_settings(MEMO_CACHE_SHARED=True):
+            self.assertEqual(get_cache_timeout(), settings.MEMO_CACHE_TIMEOUT)
+
+
+class MemoFileBasedCacheTests(MemoCacheTestsMixin, MemoTestCase):
+
+    def setUp(self):
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir)
+        settings_override = override_settings(CACHES={
+            'default': {
+                'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+                'LOCATION': cache_dir,
+            }
+        })
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        super().setUp()
+
+
+class MemoConditionalGetTests(MemoTestCase):
+
+    def test_not_modified_memo_list(self):
+        memo = MemoFactory(title='First memo', slug='first-memo')
+        res = self.client.get(reverse('memo:index'))
+        self.assertTrue(res.has_header('Last-Modified'))
+        with self.assertNumQueries(0):
+            res = self.client.get(reverse('memo:index'), HTTP_IF_NONE_MATCH=res['ETag'])
+        self.assertEqual(res.status_code, 304)
+        self.assertEqual(res.content, b'')
+
+    def test_modified_memo_list(self):
+        memo_1 = MemoFactory(title='First memo', slug='first-memo')
+        memo_2 = MemoFactory(title='Second memo', slug='second-memo')
+        res = self.client.get(reverse('memo:api_list'))
+        etag, last_modified = res['ETag'], res['Last-Modified']
+        res = self.client.get(reverse('memo:api_list'), data={'page_size': 1}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, 200)
+        deleted_datetime = timezone.now() + datetime.timedelta(minutes=1)
+        with mock.patch('memo.sync.timezone.now', return_value=deleted_datetime):
+            with self.captureOnCommitCallbacks(execute=True):
+                memo_1.delete()
+        res = self.client.get(reverse('memo:api_list'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, 200)
+        res = self.client.get(reverse('memo:api_list'), HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(res.status_code, 200)
+        # The deletion is read from the database, not from a cache of this process
+        cache.clear()
+        res = self.client.get(reverse('memo:api_list'), HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(res.status_code, 200)
+
+    def test_not_modified_memo(self):
+        memo = MemoFactory(title='Sample memo', slug='sample-memo')
+        for url in (
+            reverse('memo:detail', kwargs={'slug': 'sample-memo'}),
+            reverse('memo:api_retrieve', kwargs={'slug': 'sample-memo'}),
+        ):
+            res = self.client.get(url)
+            res_etag = self.client.get(url, HTTP_IF_NONE_MATCH=res['ETag'])
+            res_modified = self.client.get(url, HTTP_IF_MODIFIED_SINCE=res['Last-Modified'])
+            self.assertEqual(res_etag.status_code, 304)
+            self.assertEqual(res_modified.status_code, 304)
+
+    def test_modified_memo(self):
+        memo = MemoFactory(title='Sample memo', slug='sample-memo')
+        url = reverse('memo:api_retrieve', kwargs={'slug': 'sample-memo'})
+        etag = self.client.get(url)['ETag']
+        memo.title = 'Updated memo'
+        with self.captureOnCommitCallbacks(execute=True):
+            memo.save()
+        res = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.data['title'], 'Updated memo')
+        self.assertNotEqual(res['ETag'], etag)
+
+
+class MemoDetailTests(MemoTestCase):
 
     def test_get_memo(self):
         memo = MemoFactory(title='Sample memo', slug='sample-memo')
@@ -178,7 +593,7 @@ class MemoDetailTests(TestCase):
         self.assertEqual(res.status_code, 404)
 
 
-class MemoCreateTests(TestCase):
+class MemoCreateTests(MemoTestCase):
 
     def test_get_create_form(self):
         res = self.client.get(reverse('memo:new_memo'))
@@ -200,7 +615,7 @@ class MemoCreateTests(TestCase):
         self.assertEqual(Memo.objects.count(), 0)
 
 
-class MemoDeleteTests(TestCase):
+class MemoDeleteTests(MemoTestCase):
 
     def test_get_delete_page(self):
         memo = MemoFactory(slug='sample-memo')
@@ -218,7 +633,7 @@ class MemoDeleteTests(TestCase):
         self.assertEqual(res.status_code, 404)
 
 
-class MemoUpdateTests(TestCase):
+class MemoUpdateTests(MemoTestCase):
 
     def test_get_update_form(self):
         memo = MemoFactory(slug='sample-memo')
@@ -243,7 +658,7 @@ class MemoUpdateTests(TestCase):
         self.assertEqual(res.status_code, 404)
 
 
-class MemoListAPITests(APITestCase):
+class MemoListAPITests(MemoAPITestCase):
 
     def test_get_memos_api(self):
         memo_1 = MemoFactory(title='first memo', slug='first-memo')
@@ -252,8 +667,109 @@ class MemoListAPITests(APITestCase):
         self.assertEqual(res.status_code, status.HTTP_200_OK)
         self.assertEqual(Memo.objects.count(), 2)
 
+    def test_get_memos_api_by_cursor(self):
+        for i in range(1, 6):
+            MemoFactory(title='Memo {}'.format(i), slug='memo-{}'.format(i))
+        res = self.client.get(reverse('memo:api_list'), data={'page_size': 3}, format='json')
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotIn('count', res.data)
+        self.assertIsNone(res.data['previous'])
+        self.assertEqual([memo['slug'] for memo in res.data['results']], ['memo-5', 'memo-4', 'memo-3'])
+        res = self.client.get(res.data['next'], format='json')
+        self.assertEqual([memo['slug'] for memo in res.data['results']], ['memo-2', 'memo-1'])
+        self.assertIsNone(res.data['next'])
 
-class MemoRetrieveAPITests(APITestCase):
+    def test_get_memos_api_with_count(self):
+        memo_1 = MemoFactory(title='first memo', slug='first-memo')
+        res = self.client.get(reverse('memo:api_list'), data={'count': 'true'}, format='json')
+        self.assertEqual(res.data['count'], 1)
+
+    def test_get_memos_api_invalid_cursor(self):
+        res = self.client.get(reverse('memo:api_list'), data={'cursor': 'invalid'}, format='json')
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_get_memos_api_same_as_list_serializer(self):
+        MemoFactory(title='first memo', slug='first-memo')
+        MemoFactory(title='second memo', slug='second-memo')
+        res = self.client.get(reverse('memo:api_list'), format='json')
+        self.assertEqual(res.data['results'], MemoListSerializer(Memo.objects.all(), many=True).data)
+        self.assertEqual(
+            MemoListReadSerializer(Memo.objects.all(), many=True).data,
+            MemoListSerializer(Memo.objects.all(), many=True).data,
+        )
+
+    def test_values_serializer_same_bytes(self):
+        MemoFactory(title='"引用"\u2028\x01 😀', slug='first-memo')
+        MemoFactory(title='second memo', slug='second-memo')
+        expected = JSONRenderer().render(MemoListSerializer(Memo.objects.all(), many=True).data)
+        values = Memo.objects.values_list(*MemoListValuesSerializer().columns)
+        data = MemoListValuesSerializer(values, many=True).data
+        self.assertEqual(JSONRenderer().render(data), expected)
+        self.assertEqual(FastJSONRenderer().render(data), expected)
+
+    def test_get_memos_api_fast_json(self):
+        MemoFactory(title='first memo', slug='first-memo')
+        res = self.client.get(reverse('memo:api_list'), format='json')
+        with override_settings(MEMO_FAST_JSON=True):
+            cache.clear()
+            fast_res = self.client.get(reverse('memo:api_list'), format='json')
+        self.assertEqual(fast_res.content, res.content)
+
+    def test_get_memos_api_fields(self):
+        for i in range(1, 4):
+            MemoFactory(title='Memo {}'.format(i), slug='memo-{}'.format(i), text='本文')
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.get(
+                reverse('memo:api_list'), data={'fields': 'slug,title', 'page_size': 2}, format='json'
+            )
+        self.assertEqual(res.data['results'], [
+            {'slug': 'memo-3', 'title': 'Memo 3'}, {'slug': 'memo-2', 'title': 'Memo 2'},
+        ])
+        select = [query['sql'] for query in queries if 'FROM "memo_memo"' in query['sql']][-1]
+        self.assertNotIn('"updated_datetime"', select)
+        self.assertNotIn('"text"', select)
+        res = self.client.get(res.data['next'], format='json')
+        self.assertEqual(res.data['results'], [{'slug': 'memo-1', 'title': 'Memo 1'}])
+
+    def test_get_memos_api_unknown_fields(self):
+        res = self.client.get(reverse('memo:api_list'), data={'fields': 'slug,text'}, format='json')
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class MemoSearchAPITests(MemoAPITestCase):
+
+    def test_search_memos_api(self):
+        memo_1 = MemoFactory(title='買い物リスト', slug='shopping', text='牛乳と卵を買う')
+        memo_2 = MemoFactory(title='会議メモ', slug='meeting', text='明日の会議は十時から')
+        res = self.client.get(reverse('memo:api_search'), data={'keyword': '牛乳'}, format='json')
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([memo['slug'] for memo in res.data['results']], ['shopping'])
+
+    def test_search_memos_api_pagination(self):
+        for i in range(3):
+            MemoFactory(title='メモ {}'.format(i), slug='memo-{}'.format(i), text='牛乳')
+        res = self.client.get(reverse('memo:api_search'), data={'keyword': '牛乳', 'page_size': 2}, format='json')
+        self.assertEqual([memo['slug'] for memo in res.data['results']], ['memo-2', 'memo-1'])
+        res = self.client.get(res.data['next'], format='json')
+        self.assertEqual([memo['slug'] for memo in res.data['results']], ['memo-0'])
+        self.assertIsNone(res.data['next'])
+
+    def test_search_memos_api_rank(self):
+        # The most relevant memo is the oldest one
+        memo_1 = MemoFactory(title='Third memo', slug='third-memo', text='The first memo and the first draft.')
+        memo_2 = MemoFactory(title='Second memo', slug='second-memo', text='This is the second memo.')
+        memo_3 = MemoFactory(title='First memo', slug='first-memo', text='This memo is opened.')
+        data = {'keyword': 'first', 'mode': 'fulltext', 'page_size': 1}
+        res = self.client.get(reverse('memo:api_search'), data=data, format='json')
+        self.assertEqual([memo['slug'] for memo in res.data['results']], ['third-memo'])
+        res = self.client.get(res.data['next'], format='json')
+        self.assertEqual([memo['slug'] for memo in res.data['results']], ['first-memo'])
+        self.assertIsNone(res.data['next'])
+        res = self.client.get(res.data['previous'], format='json')
+        self.assertEqual([memo['slug'] for memo in res.data['results']], ['third-memo'])
+
+
+class MemoRetrieveAPITests(MemoAPITestCase):
 
     def test_get_memo_api(self):
         memo = MemoFactory(title='Sample memo', slug='sample-memo')
@@ -264,8 +780,16 @@ class MemoRetrieveAPITests(APITestCase):
         res = self.client.get(reverse('memo:api_retrieve', kwargs={'slug': 'sample-memo'}), format='json')
         self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
 
+    def test_get_memo_api_fields(self):
+        memo = MemoFactory(title='Sample memo', slug='sample-memo', text='本文')
+        url = reverse('memo:api_retrieve', kwargs={'slug': 'sample-memo'})
+        res = self.client.get(url, data={'fields': 'title'}, format='json')
+        self.assertEqual(res.data, {'title': 'Sample memo'})
+        res = self.client.get(url, format='json')
+        self.assertEqual(res.data['text'], '本文')
+
 
-class MemoCreateAPITests(APITestCase):
+class MemoCreateAPITests(MemoAPITestCase):
 
     def test_post_api(self):
         new_memo = {
@@ -288,7 +812,7 @@ class MemoCreateAPITests(APITestCase):
         self.assertEqual(Memo.objects.count(), 0)
 
 
-class MemoUpdateAPITests(APITestCase):
+class MemoUpdateAPITests(MemoAPITestCase):
 
     def test_put_api(self):
         memo = MemoFactory(title='Sample memo', slug='sample-memo', text='This is a sample memo.')
@@ -309,7 +833,7 @@ class MemoUpdateAPITests(APITestCase):
         self.assertEqual(memo.text, 'This is a sample memo.')
 
 
-class MemoDestroyAPITests(APITestCase):
+class MemoDestroyAPITests(MemoAPITestCase):
 
     def test_delete_api(self):
         memo = MemoFactory(title='Sample', slug='sample-memo', text='This is a sample memo.')
@@ -320,3 +844,1039 @@ class MemoDestroyAPITests(APITestCase):
     def test_delete_invalid_api(self):
         res = self.client.delete(reverse('memo:api_delete', kwargs={'slug': 'sample-memo'}))
         self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class MemoBulkAPITests(MemoAPITestCase):
+
+    def test_bulk_create_api(self):
+        new_memos = [
+            {'title': 'Memo {}'.format(i), 'slug': 'memo-{}'.format(i), 'text': 'メモ {}'.format(i)}
+            for i in range(1, 51)
+        ]
+        # 15 queries, and 3 more to create the date rollup of the first memo of the day
+        with self.assertNumQueries(18):
+            res = self.client.post(reverse('memo:api_bulk_create'), data=new_memos, format='json')
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(res.data[0], {'slug': 'memo-1', 'status': 'created'})
+        self.assertEqual(Memo.objects.count(), 50)
+        form = MemoSearchForm({'keyword': 'メモ 42'})
+        self.assertEqual(form.filter_memos(Memo.objects.all()).count(), 1)
+
+    def test_bulk_create_invalid_api(self):
+        memo = MemoFactory(slug='existing-memo')
+        new_memos = [
+            {'title': 'New memo', 'slug': 'new-memo', 'text': ''},
+            {'title': '', 'slug': 'empty-memo', 'text': ''},
+            {'title': 'Existing memo', 'slug': 'existing-memo', 'text': ''},
+            {'title': 'New memo', 'slug': 'new-memo', 'text': ''},
+        ]
+        res = self.client.post(reverse('memo:api_bulk_create'), data=new_memos, format='json')
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(res.data[0], {})
+        self.assertIn('title', res.data[1])
+        self.assertIn('slug', res.data[2])
+        self.assertIn('slug', res.data[3])
+        self.assertEqual(Memo.objects.count(), 1)
+
+    def test_bulk_invalid_slug_type_api(self):
+        MemoFactory(slug='existing-memo')
+        for slug in ([], {}):
+            items = [{'title': 'Memo', 'slug': slug}, {'title': 'Memo', 'slug': 'existing-memo'}]
+            res = self.client.post(reverse('memo:api_bulk_create'), data=items, format='json')
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertIn('slug', res.data[0])
+            self.assertIn('slug', res.data[1])
+            res = self.client.patch(reverse('memo:api_bulk_update'), data=[{'slug': slug}], format='json')
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertIn('slug', res.data[0])
+
+    @override_settings(MEMO_BULK_MAX_SIZE=2)
+    def test_bulk_create_too_many_api(self):
+        new_memos = [{'title': 'Memo', 'slug': 'memo-{}'.format(i), 'text': ''} for i in range(3)]
+        res = self.client.post(reverse('memo:api_bulk_create'), data=new_memos, format='json')
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Memo.objects.count(), 0)
+
+    def test_bulk_update_api(self):
+        memo_1 = MemoFactory(title='First memo', slug='first-memo', text='Old text')
+        memo_2 = MemoFactory(title='Second memo', slug='second-memo', text='Old text')
+        self.client.get(reverse('memo:api_retrieve', kwargs={'slug': 'first-memo'}))
+        updated_memos = [
+            {'title': 'First memo', 'slug': 'first-memo', 'text': 'New text'},
+            {'title': 'Second memo', 'slug': 'second-memo', 'text': 'New text'},
+        ]
+        with self.captureOnCommitCallbacks(execute=True):
+            res = self.client.put(reverse('memo:api_bulk_update'), data=updated_memos, format='json')
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data[1], {'slug': 'second-memo', 'status': 'updated'})
+        memo_1.refresh_from_db()
+        self.assertEqual(memo_1.text, 'New text')
+        self.assertGreater(memo_1.updated_datetime, memo_2.updated_datetime)
+        res = self.client.get(reverse('memo:api_retrieve', kwargs={'slug': 'first-memo'}))
+        self.assertEqual(res.data['text'], 'New text')
+
+    def test_bulk_partial_update_api(self):
+        memo = MemoFactory(title='First memo', slug='first-memo', text='Old text')
+        res = self.client.patch(
+            reverse('memo:api_bulk_update'), data=[{'slug': 'first-memo', 'text': 'New text'}], format='json'
+        )
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        memo.refresh_from_db()
+        self.assertEqual(memo.title, 'First memo')
+        self.assertEqual(memo.text, 'New text')
+
+    def test_bulk_update_non_existent_api(self):
+        memo = MemoFactory(title='First memo', slug='first-memo', text='Old text')
+        updated_memos = [
+            {'title': 'First memo', 'slug': 'first-memo', 'text': 'New text'},
+            {'title': 'Second memo', 'slug': 'second-memo', 'text': 'New text'},
+        ]
+        res = self.client.put(reverse('memo:api_bulk_update'), data=updated_memos, format='json')
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(res.data[0], {})
+        memo.refresh_from_db()
+        self.assertEqual(memo.text, 'Old text')
+
+    def test_bulk_delete_api(self):
+        memo_1 = MemoFactory(slug='first-memo')
+        memo_2 = MemoFactory(slug='second-memo')
+        res = self.client.delete(
+            reverse('memo:api_bulk_delete'), data=['first-memo', 'third-memo'], format='json'
+        )
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data, [
+            {'slug': 'first-memo', 'status': 'deleted'},
+            {'slug': 'third-memo', 'status': 'not_found'},
+        ])
+        self.assertEqual(list(Memo.objects.values_list('slug', flat=True)), ['second-memo'])
+
+    def test_bulk_delete_invalid_api(self):
+        res = self.client.delete(reverse('memo:api_bulk_delete'), data={'slug': 'memo'}, format='json')
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class MemoExportTests(MemoTestCase):
+
+    def test_export_ndjson(self):
+        memo_1 = MemoFactory(title='First memo', slug='first-memo', text='一行目\n二行目')
+        memo_2 = MemoFactory(title='Second memo', slug='second-memo')
+        res = self.client.get(reverse('memo:api_export'))
+        self.assertEqual(res.status_code, 200)
+        self.assertTrue(res.streaming)
+        rows = [json.loads(line) for line in b''.join(res.streaming_content).decode().splitlines()]
+        self.assertEqual([row['slug'] for row in rows], ['first-memo', 'second-memo'])
+        self.assertEqual(rows[0]['text'], '一行目\n二行目')
+        retrieved = self.client.get(reverse('memo:api_retrieve', kwargs={'slug': 'first-memo'})).json()
+        self.assertEqual(rows[0]['updated_datetime'], retrieved['updated_datetime'])
+
+    def test_export_csv(self):
+        memo = MemoFactory(title='First, memo', slug='first-memo', text='"quoted"')
+        res = self.client.get(reverse('memo:api_export'), data={'format': 'csv'})
+        self.assertEqual(res['Content-Type'], 'text/csv; charset=utf-8')
+        rows = list(csv.DictReader(io.StringIO(b''.join(res.streaming_content).decode())))
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]['title'], 'First, memo')
+        self.assertEqual(rows[0]['text'], '"quoted"')
+
+    def test_export_updated_range(self):
+        memo_1 = MemoFactory(slug='old-memo')
+        Memo.objects.filter(pk=memo_1.pk).update(
+            updated_datetime=timezone.now() - datetime.timedelta(days=2)
+        )
+        memo_2 = MemoFactory(slug='new-memo')
+        since = (timezone.now() - datetime.timedelta(days=1)).isoformat()
+        res = self.client.get(reverse('memo:api_export'), data={'updated_since': since})
+        rows = [json.loads(line) for line in b''.join(res.streaming_content).decode().splitlines()]
+        self.assertEqual([row['slug'] for row in rows], ['new-memo'])
+        res = self.client.get(reverse('memo:api_export'), data={'updated_until': since})
+        rows = [json.loads(line) for line in b''.join(res.streaming_content).decode().splitlines()]
+        self.assertEqual([row['slug'] for row in rows], ['old-memo'])
+
+    def test_export_invalid_parameters(self):
+        res = self.client.get(reverse('memo:api_export'), data={'format': 'xml'})
+        self.assertEqual(res.status_code, 400)
+        res = self.client.get(reverse('memo:api_export'), data={'updated_since': 'yesterday'})
+        self.assertEqual(res.status_code, 400)
+
+    def test_export_command(self):
+        for i in range(5):
+            MemoFactory(slug='memo-{}'.format(i))
+        out = io.StringIO()
+        call_command('export_memos', '--chunk-size', '2', stdout=out)
+        self.assertEqual(len(out.getvalue().splitlines()), 5)
+        out = io.StringIO()
+        call_command('export_memos', '--format', 'csv', stdout=out)
+        self.assertEqual(len(out.getvalue().splitlines()), 6)
+
+
+class MemoImportTests(MemoTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir)
+
+    def write_file(self, name, content):
+        path = '{}/{}'.format(self.tmp_dir, name)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(content)
+        return path
+
+    def import_memos(self, *args):
+        out, err = io.StringIO(), io.StringIO()
+        call_command('import_memos', *args, stdout=out, stderr=err)
+        return out.getvalue(), err.getvalue()
+
+    def test_import_ndjson(self):
+        path = self.write_file('memos.ndjson', '\n'.join(
+            json.dumps({'title': 'Memo {}'.format(i), 'slug': 'memo-{}'.format(i), 'text': 'テキスト'})
+            for i in range(5)
+        ))
+        out, err = self.import_memos(path, '--batch-size', '2')
+        self.assertIn('5 created', out)
+        self.assertEqual(Memo.objects.count(), 5)
+        self.assertEqual(Memo.objects.get(slug='memo-3').title, 'Memo 3')
+        self.assertQuerysetEqual(
+            MemoSearchForm({'keyword': 'テキ'}).filter_memos(Memo.objects.all()),
+            Memo.objects.all(), ordered=False, transform=lambda memo: memo
+        )
+
+    def test_import_csv(self):
+        path = self.write_file('memos.csv', 'title,slug,text\n"First, memo",first-memo,"一行目\n二行目"\n')
+        self.import_memos(path)
+        memo = Memo.objects.get(slug='first-memo')
+        self.assertEqual(memo.title, 'First, memo')
+        self.assertEqual(memo.text, '一行目\n二行目')
+
+    def test_import_existing_slug(self):
+        MemoFactory(title='Old title', slug='first-memo')
+        path = self.write_file('memos.ndjson', json.dumps({'title': 'New title', 'slug': 'first-memo'}))
+        out, err = self.import_memos(path)
+        self.assertIn('1 skipped', out)
+        self.assertEqual(Memo.objects.get(slug='first-memo').title, 'Old title')
+        out, err = self.import_memos(path, '--upsert')
+        self.assertIn('1 updated', out)
+        self.assertEqual(Memo.objects.get(slug='first-memo').title, 'New title')
+
+    def test_import_invalid_and_duplicated_rows(self):
+        path = self.write_file('memos.ndjson', '\n'.join([
+            json.dumps({'title': 'First', 'slug': 'first-memo'}),
+            'not json',
+            json.dumps({'title': 'Invalid', 'slug': 'invalid slug'}),
+            json.dumps({'title': 'Second', 'slug': 'first-memo'}),
+        ]))
+        out, err = self.import_memos(path)
+        self.assertIn('1 duplicated, 2 invalid', out)
+        self.assertIn('Row 2:', err)
+        self.assertIn('Row 3:', err)
+        self.assertEqual(list(Memo.objects.values_list('title', flat=True)), ['Second'])
+
+    def test_import_resume(self):
+        path = self.write_file('memos.ndjson', '\n'.join(
+            json.dumps({'title': 'Memo {}'.format(i), 'slug': 'memo-{}'.format(i)}) for i in range(5)
+        ))
+        progress_file = self.write_file('progress', '3')
+        self.import_memos(path, '--progress-file', progress_file)
+        self.assertEqual(
+            sorted(Memo.objects.values_list('slug', flat=True)), ['memo-3', 'memo-4']
+        )
+        self.assertFalse(os.path.exists(progress_file))
+        self.import_memos(path, '--resume-from', '4')
+        self.assertEqual(Memo.objects.count(), 2)
+
+
+class MemoChangesAPITests(MemoAPITestCase):
+
+    def get_changes(self, since=0, **params):
+        res = self.client.get(reverse('memo:api_changes'), data=dict(params, since=since))
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return res.json()
+
+    def test_changes_since_sequence(self):
+        memo_1 = MemoFactory(slug='first-memo')
+        memo_2 = MemoFactory(slug='second-memo')
+        data = self.get_changes()
+        self.assertEqual([memo['slug'] for memo in data['memos']], ['first-memo', 'second-memo'])
+        self.assertEqual(data['deleted'], [])
+        sequence = data['sequence']
+
+        memo_1.title = 'Updated'
+        memo_1.save()
+        memo_2_pk = memo_2.pk
+        memo_2.delete()
+        MemoFactory(slug='third-memo')
+        data = self.get_changes(sequence)
+        self.assertEqual([memo['slug'] for memo in data['memos']], ['first-memo', 'third-memo'])
+        self.assertEqual(data['memos'][0]['title'], 'Updated')
+        self.assertEqual([memo['slug'] for memo in data['deleted']], ['second-memo'])
+        self.assertEqual(data['deleted'][0]['memo_id'], memo_2_pk)
+        self.assertFalse(data['has_more'])
+
+        data = self.get_changes(data['sequence'])
+        self.assertEqual((data['memos'], data['deleted']), ([], []))
+
+    def test_changes_pages(self):
+        for i in range(5):
+            MemoFactory(slug='memo-{}'.format(i))
+        Memo.objects.get(slug='memo-0').delete()
+        slugs = []
+        sequence, has_more = 0, True
+        while has_more:
+            data = self.get_changes(sequence, limit=2)
+            slugs += [memo['slug'] for memo in data['memos'] + data['deleted']]
+            sequence, has_more = data['sequence'], data['has_more']
+        self.assertEqual(slugs, ['memo-1', 'memo-2', 'memo-3', 'memo-4', 'memo-0'])
+
+    def test_changes_renamed_memo(self):
+        memo = MemoFactory(slug='old-slug')
+        sequence = self.get_changes()['sequence']
+        memo.slug = 'new-slug'
+        memo.save()
+        data = self.get_changes(sequence)
+        self.assertEqual([memo['slug'] for memo in data['memos']], ['new-slug'])
+        self.assertEqual([memo['slug'] for memo in data['deleted']], ['old-slug'])
+        self.assertGreater(data['memos'][0]['sequence'], data['deleted'][0]['sequence'])
+
+    def test_changes_bulk_writes(self):
+        data = [{'title': 'Memo {}'.format(i), 'slug': 'memo-{}'.format(i)} for i in range(3)]
+        self.client.post(reverse('memo:api_bulk_create'), data, format='json')
+        sequence = self.get_changes()['sequence']
+        self.client.patch(reverse('memo:api_bulk_update'), [{'slug': 'memo-1', 'title': 'Updated'}], format='json')
+        self.client.delete(reverse('memo:api_bulk_delete'), ['memo-2'], format='json')
+        data = self.get_changes(sequence)
+        self.assertEqual([memo['slug'] for memo in data['memos']], ['memo-1'])
+        self.assertEqual([memo['slug'] for memo in data['deleted']], ['memo-2'])
+
+    def test_changes_invalid_parameters(self):
+        res = self.client.get(reverse('memo:api_changes'), data={'since': 'abc'})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        res = self.client.get(reverse('memo:api_changes'), data={'limit': 0})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class MemoBenchmarkTests(MemoTestCase):
+
+    def test_run_benchmarks(self):
+        seed_memos(30, batch_size=10)
+        self.assertEqual(Memo.objects.count(), 30)
+        results = run_benchmarks(['index', 'api_list', 'api_bulk_delete'], iterations=2, bulk_size=5)
+        self.assertEqual(results['meta']['memos'], 30)
+        self.assertEqual(set(results['cases']), {'index', 'api_list', 'api_bulk_delete'})
+        self.assertEqual(results['cases']['api_list']['iterations'], 2)
+        self.assertGreater(results['cases']['api_list']['queries'], 0)
+
+    def test_run_list_scan_benchmark(self):
+        seed_memos(5, text_size=500)
+        self.assertEqual(len(Memo.objects.first().text), 500)
+        result = run_list_scan_benchmark(iterations=2)
+        self.assertEqual(set(result['cases']), {'split', 'wide'})
+        self.assertEqual(result['cases']['wide']['rows'], 5)
+        with connection.cursor() as cursor:
+            self.assertNotIn('memo_memo_wide_benchmark', connection.introspection.table_names(cursor))
+
+    def test_run_unknown_benchmark(self):
+        MemoFactory()
+        with self.assertRaises(BenchmarkError):
+            run_benchmarks(['unknown'])
+
+    def test_compare_results(self):
+        baseline = {'cases': {'index': {'p50_ms': 10.0, 'queries': 3}}}
+        results = {'cases': {
+            'index': {'p50_ms': 11.0, 'queries': 3},
+            'detail': {'p50_ms': 5.0, 'queries': 2},
+        }}
+        self.assertEqual(compare_results(results, baseline, threshold=0.2), [])
+        results['cases']['index'] = {'p50_ms': 13.0, 'queries': 4}
+        self.assertEqual(len(compare_results(results, baseline, threshold=0.2)), 2)
+
+
+@override_settings(MEMO_METRICS=True)
+class MemoMetricsTests(MemoTestCase):
+
+    def setUp(self):
+        super().setUp()
+        registry.clear()
+
+    def test_server_timing(self):
+        MemoFactory()
+        res = self.client.get(reverse('memo:index'))
+        self.assertRegex(res['Server-Timing'], r'^db;dur=[\d.]+;desc="[1-9]\d* queries", serialize;dur=')
+        snapshot = registry.snapshot()
+        self.assertEqual(snapshot['memo:index']['total_ms']['count'], 1)
+        self.assertGreater(snapshot['memo:index']['render_ms']['sum'], 0)
+
+    def test_api_serialization_time(self):
+        MemoFactory()
+        self.client.get(reverse('memo:api_list'))
+        self.client.get(reverse('memo:api_list'), data={'fields': 'slug'})
+        snapshot = registry.snapshot()
+        self.assertEqual(snapshot['memo:api_list']['queries']['count'], 2)
+        self.assertGreater(snapshot['memo:api_list']['serialize_ms']['sum'], 0)
+
+    def test_metrics_endpoint(self):
+        self.client.get(reverse('memo:index'))
+        res = self.client.get(reverse('memo:metrics'))
+        self.assertIn('memo_request_queries_count{view="memo:index"} 1', res.content.decode())
+        res = self.client.get(reverse('memo:metrics'), data={'format': 'json'})
+        self.assertIn('memo:index', res.json())
+        res = self.client.get(reverse('memo:metrics'), REMOTE_ADDR='10.0.0.1')
+        self.assertEqual(res.status_code, 403)
+
+    @override_settings(MEMO_METRICS=False)
+    def test_disabled(self):
+        res = self.client.get(reverse('memo:index'))
+        self.assertNotIn('Server-Timing', res)
+        self.assertEqual(registry.snapshot(), {})
+
+
+class MemoQueryBudgetTests(MemoTestCase):
+
+    def create_memos(self, count):
+        for i in range(count):
+            MemoFactory(title='Memo {}'.format(i), slug='memo-{}'.format(i))
+
+    def test_views_budget(self):
+        for count in (3, 30):
+            Memo.objects.all().delete()
+            self.create_memos(count)
+            for url in (
+                reverse('memo:index'),
+                reverse('memo:index') + '?keyword=Memo',
+                reverse('memo:detail', kwargs={'slug': 'memo-1'}),
+                reverse('memo:api_list'),
+                reverse('memo:api_retrieve', kwargs={'slug': 'memo-1'}),
+            ):
+                cache.clear()
+                with self.assertQueryBudget(max_queries=4, max_repeats=1):
+                    self.client.get(url)
+
+    def test_detect_repeated_queries(self):
+        self.create_memos(3)
+        with self.assertRaises(QueryBudgetExceeded) as cm:
+            with self.assertQueryBudget(max_repeats=1):
+                for memo in Memo.objects.all():
+                    Memo.objects.get(pk=memo.pk)
+        self.assertIn('3 times, more than 1', str(cm.exception))
+        self.assertIn('tests.py', str(cm.exception))
+
+    def test_max_queries_and_time(self):
+        with self.assertRaises(QueryBudgetExceeded):
+            with self.assertQueryBudget(max_queries=1):
+                Memo.objects.count()
+                Memo.objects.exists()
+        with self.assertRaises(QueryBudgetExceeded):
+            with self.assertQueryBudget(max_time_ms=0):
+                Memo.objects.count()
+
+    def test_decorator_warns(self):
+        @query_budget(max_queries=0, action='warn')
+        def count_memos():
+            return Memo.objects.count()
+
+        with self.assertLogs('memo.budget', 'WARNING') as logs:
+            self.assertEqual(count_memos(), 0)
+            count_memos()
+        self.assertEqual(len(logs.records), 2)
+
+
+class AsgiApplicationTests(SimpleTestCase):
+
+    def request(self, path, query_string=b'', headers=()):
+        messages = []
+
+        async def receive():
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+        async def send(message):
+            messages.append(message)
+
+        scope = {
+            'type': 'http', 'method': 'GET', 'path': path, 'query_string': query_string,
+            'headers': [(b'host', b'testserver')] + list(headers), 'client': ('127.0.0.1', 50000),
+        }
+        asyncio.run(asgi_application(scope, receive, send))
+        return messages
+
+    def test_get(self):
+        messages = self.request('/metrics/', b'format=json', [(b'accept', b'application/json')])
+        self.assertEqual(messages[0]['type'], 'http.response.start')
+        self.assertEqual(messages[0]['status'], 200)
+        self.assertIn((b'content-type', b'application/json'), messages[0]['headers'])
+        body = b''.join(message.get('body', b'') for message in messages[1:])
+        self.assertIsInstance(json.loads(body.decode()), dict)
+        self.assertFalse(messages[-1].get('more_body', False))
+
+    def test_not_found(self):
+        messages = self.request('/not-found/')
+        self.assertEqual(messages[0]['status'], 404)
+
+
+class ConnectionPoolTests(SimpleTestCase):
+
+    def create_pool(self, max_size=2, timeout=0.05, check=None):
+        return ConnectionPool(lambda: sqlite3.connect(':memory:', check_same_thread=False), max_size, timeout, check)
+
+    def test_reuse(self):
+        pool = self.create_pool()
+        first = pool.acquire()
+        pool.release(first)
+        self.assertIs(pool.acquire(), first)
+        self.assertEqual(pool.get_stats()['connections'], 1)
+
+    def test_bounded(self):
+        pool = self.create_pool(max_size=1)
+        first = pool.acquire()
+        with self.assertRaises(PoolTimeout):
+            pool.acquire()
+        threading.Timer(0.01, pool.release, [first]).start()
+        pool.timeout = 5
+        self.assertIs(pool.acquire(), first)
+        stats = pool.get_stats()
+        self.assertEqual((stats['timeouts'], stats['waits'], stats['connections']), (1, 1, 1))
+        self.assertGreater(stats['wait_ms'], 0)
+
+    def test_discard(self):
+        pool = self.create_pool()
+        first = pool.acquire()
+        pool.release(first, discard=True)
+        self.assertIsNot(pool.acquire(), first)
+        self.assertEqual(pool.get_stats()['discarded'], 1)
+
+    def test_check(self):
+        pool = self.create_pool(check=lambda connection: False)
+        first = pool.acquire()
+        pool.release(first)
+        self.assertIsNot(pool.acquire(), first)
+        self.assertEqual(pool.get_stats()['connections'], 1)
+
+    def test_prometheus(self):
+        pool = self.create_pool()
+        pool.acquire()
+        output = format_prometheus({}, {'default': pool.get_stats()})
+        self.assertIn('memo_pool_connections{database="default"} 1', output)
+        self.assertIn('# TYPE memo_pool_waits counter', output)
+
+
+class ConnectionHealthCheckTests(TestCase):
+
+    def test_unusable_connection_closed(self):
+        # The connection of a TestCase is in a transaction, so fake a reused one
+        with mock.patch.dict(connection.settings_dict, CONN_HEALTH_CHECKS=True), \
+                mock.patch.object(connection, 'in_atomic_block', False), \
+                mock.patch.object(connection, 'is_usable', return_value=False), \
+                mock.patch.object(connection, 'close') as close:
+            check_database_connections(sender=None)
+        close.assert_called_once_with()
+        self.assertIn(check_database_connections, [
+            receiver() for key, receiver in request_started.receivers
+        ])
+
+    def test_disabled(self):
+        with mock.patch.object(connection, 'is_usable') as is_usable:
+            check_database_connections(sender=None)
+        is_usable.assert_not_called()
+
+
+@override_settings(MEMO_READ_REPLICAS=['replica1'])
+class ReplicaRoutingTests(MemoTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.memo = MemoFactory()
+        # The replica alias isn't configured in the tests, so the chosen
+        # replica is recorded and the query sent to the default database
+        patcher = mock.patch('memo.routers.random.choice', return_value='default')
+        self.choice = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_router(self):
+        router = ReplicaRouter()
+        state, token = routers.start_request()
+        try:
+            self.assertIsNone(router.db_for_read(Memo))
+            routers.read_from_replica()
+            self.assertEqual(router.db_for_read(Memo), 'default')
+            self.choice.assert_called_once_with(['replica1'])
+            self.assertIsNone(router.db_for_read(Author))
+            self.assertFalse(state.wrote)
+            router.db_for_write(Memo)
+            self.assertTrue(state.wrote)
+        finally:
+            routers.end_request(token)
+        self.assertFalse(router.allow_migrate('replica1', 'memo'))
+
+    def test_reads_from_replica(self):
+        for url in [reverse('memo:index'), reverse('memo:api_retrieve', kwargs={'slug': self.memo.slug})]:
+            self.choice.reset_mock()
+            res = self.client.get(url)
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            self.assertTrue(self.choice.called)
+            self.assertNotIn(ReplicaRoutingMiddleware.cookie_name, res.cookies)
+
+    def test_read_your_writes(self):
+        res = self.client.post(reverse('memo:edit_memo', kwargs={'slug': self.memo.slug}), {
+            'title': 'Updated', 'slug': self.memo.slug, 'text': '本文',
+        })
+        self.assertEqual(res.status_code, 302)
+        self.assertFalse(self.choice.called)
+        self.assertEqual(res.cookies[ReplicaRoutingMiddleware.cookie_name]['max-age'], 10)
+        res = self.client.get(reverse('memo:detail', kwargs={'slug': self.memo.slug}))
+        self.assertContains(res, 'Updated')
+        self.assertFalse(self.choice.called)
+
+    @override_settings(MEMO_CACHE_SHARED=True, MEMO_REPLICA_STICKY_SECONDS=10)
+    def test_replica_reads_cached_briefly(self):
+        url = reverse('memo:index')
+        self.client.get(url)
+        self.assertTrue(self.choice.called)
+        keys = [list_cache_key('page', url), list_cache_key('state')]
+        with self.assertNumQueries(0):
+            self.client.get(url)
+        # The replica may have been behind the last write
+        with mock.patch('time.time', return_value=time.time() + 11):
+            self.assertEqual([cache.get(key) for key in keys], [None, None])
+        with override_settings(MEMO_READ_REPLICAS=[]):
+            cache.clear()
+            self.client.get(url)
+            keys = [list_cache_key('page', url), list_cache_key('state')]
+        with mock.patch('time.time', return_value=time.time() + 11):
+            self.assertNotIn(None, [cache.get(key) for key in keys])
+
+    @override_settings(MEMO_READ_REPLICAS=[])
+    def test_disabled(self):
+        self.client.get(reverse('memo:index'))
+        self.assertFalse(self.choice.called)
+
+
+class MemoIndexTests(MemoTestCase):
+    """The list, admin, sync and search queries are served by indexes"""
+
+    def setUp(self):
+        super().setUp()
+        seed_memos(5)
+        if connection.vendor == 'postgresql':
+            # The planner scans such small tables whatever the indexes
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+
+    def assertUsesIndex(self, queryset, index):
+        plan = queryset.explain()
+        self.assertIn(index, plan)
+        if connection.vendor == 'postgresql':
+            self.assertNotIn('Seq Scan on memo_memo ', plan)
+            self.assertNotIn('Sort Key', plan)
+        elif connection.vendor == 'sqlite':
+            # A scan of the index in order is fine, a scan of the table is not
+            self.assertNotRegex(plan, r'(?m)SCAN (TABLE )?memo_memo$')
+            self.assertNotIn('FOR ORDER BY', plan)
+
+    def test_list(self):
+        self.assertUsesIndex(Memo.objects.all()[:20], 'memo_created_id_idx')
+        cursor_page = Memo.objects.filter(created_datetime__lt=timezone.now())[:20]
+        self.assertUsesIndex(cursor_page, 'memo_created_id_idx')
+
+    def test_updated(self):
+        self.assertUsesIndex(Memo.objects.order_by('-updated_datetime', '-id')[:20], 'memo_updated_id_idx')
+        self.assertUsesIndex(Memo.objects.order_by('updated_datetime', 'id')[:20], 'memo_updated_id_idx')
+        updated = Memo.objects.filter(updated_datetime__gte=timezone.now()).order_by('-updated_datetime', '-id')
+        self.assertUsesIndex(updated, 'memo_updated_id_idx')
+
+    def test_search(self):
+        plan = search_memos(Memo.objects.all(), 'memo', mode='ngram').explain()
+        self.assertRegex(plan, 'memo_memogram_gram_memo_id_[0-9a-f]+_uniq')
+        if connection.vendor == 'postgresql':
+            self.assertIn('memo_memo_title_trgm_idx', Memo.objects.filter(title__icontains='memo').explain())
+
+
+class MemoTextHtmlTests(MemoTestCase):
+    text = '<b>Links</b>\nhttps://example.com/a?b=1&c=2\n\nwww.djangoproject.com'
+
+    def test_rendering(self):
+        expected = Template('{{ text|linebreaks|urlize }}').render(Context({'text': self.text}))
+        memo = MemoFactory(text=self.text)
+        self.assertEqual(memo.text_html, expected)
+        self.assertEqual(Memo.objects.get(pk=memo.pk).get_text_html(), expected)
+
+    def test_served(self):
+        memo = MemoFactory(text=self.text)
+        res = self.client.get(reverse('memo:detail', kwargs={'slug': memo.slug}))
+        self.assertContains(res, memo.text_html, html=False)
+        res = self.client.get(reverse('memo:api_retrieve', kwargs={'slug': memo.slug}))
+        self.assertEqual(res.json()['text_html'], memo.text_html)
+        self.assertNotIn('text_html_key', res.json())
+
+    def test_stale_not_served(self):
+        memo = MemoFactory(text=self.text)
+        MemoBody.objects.filter(pk=memo.pk).update(text_html='stale')
+        url = reverse('memo:api_retrieve', kwargs={'slug': memo.slug})
+        self.assertEqual(self.client.get(url).json()['text_html'], 'stale')
+        cache.clear()
+        # A new rendering version is served before render_memos runs
+        with mock.patch('memo.rendering.RENDERING_VERSION', 2):
+            self.assertEqual(self.client.get(url).json()['text_html'], memo.text_html)
+            self.assertEqual(Memo.objects.get(pk=memo.pk).text_html, memo.text_html)
+
+    def test_rendered_on_write(self):
+        memo = MemoFactory()
+        memo.text = 'https://example.com'
+        memo.save(update_fields=['text'])
+        self.assertIn('href="https://example.com"', Memo.objects.get(pk=memo.pk).text_html)
+        memo.text = 'http://example.org'
+        bulk_update_memos([memo], ['text'])
+        self.assertIn('href="http://example.org"', Memo.objects.get(pk=memo.pk).text_html)
+
+    def test_backfill(self):
+        memo = MemoFactory(text=self.text)
+        MemoBody.objects.update(text_html='', text_html_key='')
+        self.assertEqual(Memo.objects.get(pk=memo.pk).get_text_html(), memo.text_html)
+        call_command('render_memos', stdout=io.StringIO())
+        self.assertEqual(Memo.objects.get(pk=memo.pk).text_html, memo.text_html)
+        self.assertEqual(render_memos(), 0)
+
+    def test_backfill_sequence(self):
+        memo_1 = MemoFactory(slug='memo-1', text=self.text)
+        memo_2 = MemoFactory(slug='memo-2', text=self.text)
+        MemoBody.objects.filter(pk=memo_1.pk).update(text_html='', text_html_key='')
+        MemoBody.objects.filter(pk=memo_2.pk).update(text_html_key='')
+        self.assertEqual(render_memos(), 2)
+        # Only the memo whose HTML changed is synced again
+        memos, tombstones, sequence, has_more = get_changes(since=memo_2.sequence)
+        self.assertEqual([memo.pk for memo in memos], [memo_1.pk])
+        self.assertEqual(memos[0].text_html, memo_1.text_html)
+        self.assertEqual(Memo.objects.get(pk=memo_2.pk).sequence, memo_2.sequence)
+        self.assertEqual(Memo.objects.get(pk=memo_1.pk).updated_datetime, memo_1.updated_datetime)
+
+
+class MemoBodyTests(MemoTestCase):
+
+    def get_queried_tables(self, queries):
+        return [table for table in ('"memo_memo"', '"memo_memobody"') if any(table in query['sql'] for query in queries)]
+
+    def test_lists_skip_bodies(self):
+        seed_memos(3)
+        for url in (reverse('memo:index'), reverse('memo:api_list'), reverse('memo:api_archive', kwargs={
+            'year': timezone.localdate().year, 'month': timezone.localdate().month,
+        })):
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(self.client.get(url).status_code, 200)
+            self.assertEqual(self.get_queried_tables(queries), ['"memo_memo"'])
+
+    def test_detail_joins_body(self):
+        memo = MemoFactory(text='本文')
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.get(reverse('memo:detail', kwargs={'slug': memo.slug}))
+        self.assertContains(res, '本文')
+        self.assertEqual(len([query for query in queries if '"memo_memobody"' in query['sql']]), 1)
+        res = self.client.get(reverse('memo:api_retrieve', kwargs={'slug': memo.slug}), {'fields': 'slug,text'})
+        self.assertEqual(res.json(), {'slug': memo.slug, 'text': '本文'})
+
+    def test_body_written_with_text(self):
+        memo = MemoFactory(text='Old text')
+        memo = Memo.objects.get(pk=memo.pk)
+        memo.title = 'New title'
+        memo.save(update_fields=['title'])
+        self.assertEqual(MemoBody.objects.get(pk=memo.pk).text, 'Old text')
+        memo = Memo.objects.get(pk=memo.pk)
+        memo.text = 'New text'
+        with CaptureQueriesContext(connection) as queries:
+            memo.save()
+        self.assertFalse(any('SELECT' in query['sql'] and '"memo_memobody"' in query['sql'] for query in queries))
+        self.assertEqual(MemoBody.objects.get(pk=memo.pk).text, 'New text')
+        self.assertEqual(Memo.objects.get(pk=memo.pk).text_html, '<p>New text</p>')
+        memo.delete()
+        self.assertFalse(MemoBody.objects.exists())
+
+
+@override_settings(MEMO_BODY_COMPRESSION='zlib', MEMO_BODY_COMPRESSION_THRESHOLD=100)
+class MemoCompressionTests(MemoTestCase):
+    text = '2026-10-18 12:00:00 INFO 東京 request served\n' * 50
+
+    def test_compressed(self):
+        memo = MemoFactory(text=self.text)
+        body = MemoBody.objects.get(pk=memo.pk)
+        self.assertEqual((body.text, body.codec), ('', 'zlib'))
+        self.assertLess(len(body.data), len(self.text.encode()) / 10)
+        self.assertEqual(Memo.objects.get(pk=memo.pk).text, self.text)
+        self.assertEqual(Memo.objects.get(pk=memo.pk).get_text_html(), memo.text_html)
+        res = self.client.get(reverse('memo:api_retrieve', kwargs={'slug': memo.slug}))
+        self.assertEqual(res.json()['text'], self.text)
+        res = self.client.get(reverse('memo:edit_memo', kwargs={'slug': memo.slug}))
+        self.assertEqual(res.context['form'].initial['text'], self.text)
+        rows = [json.loads(line) for line in self.client.get(reverse('memo:api_export')).streaming_content]
+        self.assertEqual(rows[0]['text'], self.text)
+
+    def test_html_compressed(self):
+        memo = MemoFactory(text=self.text)
+        body = MemoBody.objects.get(pk=memo.pk)
+        self.assertEqual((body.text_html, body.html_codec), ('', 'zlib'))
+        self.assertLess(len(body.html_data), len(memo.text_html.encode()) / 10)
+        self.assertEqual(body.get_text_html(), memo.text_html)
+        res = self.client.get(reverse('memo:api_retrieve', kwargs={'slug': memo.slug}))
+        self.assertEqual(res.json()['text_html'], memo.text_html)
+        res = self.client.get(reverse('memo:detail', kwargs={'slug': memo.slug}))
+        self.assertContains(res, memo.text_html, html=False)
+
+    def test_short_text_stored_raw(self):
+        memo = MemoFactory(text='短いメモ')
+        body = MemoBody.objects.get(pk=memo.pk)
+        self.assertEqual((body.text, body.data, body.codec), ('短いメモ', None, ''))
+
+    def test_search(self):
+        memo = MemoFactory(title='Log', text=self.text)
+        MemoFactory(title='Other', slug='other', text='大阪 ' * 50)
+        for mode in SEARCH_MODES:
+            self.assertEqual(list(search_memos(Memo.objects.all(), '東京', mode=mode)), [memo], mode)
+            self.assertEqual(list(search_memos(Memo.objects.all(), 'served', mode=mode)), [memo], mode)
+        rebuild_index()
+        self.assertEqual(list(search_memos(Memo.objects.all(), 'served', mode='fulltext')), [memo])
+
+    def test_search_false_positive(self):
+        memo = MemoFactory(title='Log', text='abcab ' * 30)
+        self.assertEqual(MemoBody.objects.get(pk=memo.pk).codec, 'zlib')
+        for mode in SEARCH_MODES:
+            self.assertEqual(list(search_memos(Memo.objects.all(), 'BCABC', mode=mode)), [], mode)
+            self.assertEqual(list(search_memos(Memo.objects.all(), 'ABCAB', mode=mode)), [memo], mode)
+
+    def test_search_short_keyword(self):
+        memo = MemoFactory(title='Log', text=self.text)
+        # The gram index answers for the keywords of up to two characters
+        with mock.patch('memo.models.unpack_text') as unpack_text:
+            self.assertEqual(list(search_memos(Memo.objects.all(), '東京', mode='substring')), [memo])
+        unpack_text.assert_not_called()
+
+    @override_settings(MEMO_SEARCH_DECOMPRESS_LIMIT=1)
+    def test_search_decompress_limit(self):
+        memo_1 = MemoFactory(title='Log 1', slug='log-1', text=self.text)
+        memo_2 = MemoFactory(title='Log 2', slug='log-2', text=self.text)
+        self.assertEqual(list(search_memos(Memo.objects.all(), 'served', mode='substring')), [memo_2])
+
+    def test_backfill(self):
+        with override_settings(MEMO_BODY_COMPRESSION=''):
+            memo = MemoFactory(text=self.text)
+        self.assertEqual(MemoBody.objects.get(pk=memo.pk).codec, '')
+        call_command('compress_memos', stdout=io.StringIO())
+        self.assertEqual(MemoBody.objects.get(pk=memo.pk).codec, 'zlib')
+        self.assertEqual(compress_memos(), 0)
+        with override_settings(MEMO_BODY_COMPRESSION=''):
+            self.assertEqual(compress_memos(), 1)
+        body = MemoBody.objects.get(pk=memo.pk)
+        self.assertEqual((body.text, body.codec), (self.text, ''))
+
+
+@override_settings(MEMO_REVISION_SNAPSHOT_INTERVAL=3)
+class MemoRevisionTests(MemoTestCase):
+    text = ''.join('line {}\n'.format(i) for i in range(20))
+
+    def edit(self, memo, texts):
+        for i, text in enumerate(texts):
+            res = self.client.put(
+                reverse('memo:api_update', kwargs={'slug': memo.slug}),
+                data={'title': memo.title, 'slug': memo.slug, 'text': text}, content_type='application/json',
+            )
+            self.assertEqual(res.status_code, 200)
+
+    def get_texts(self, memo):
+        return [
+            self.client.get(reverse('memo:api_revision', kwargs={'slug': memo.slug, 'number': number})).json()['text']
+            for number in MemoRevision.objects.filter(memo=memo).order_by('number').values_list('number', flat=True)
+        ]
+
+    def test_delta(self):
+        texts = ['', 'a', 'a\nb\n', 'a\nc\nb', 'x\r\ny\n\nz', '\n']
+        for old in texts:
+            for new in texts:
+                self.assertEqual(apply_delta(old, make_delta(old, new)), new)
+
+    def test_recorded(self):
+        texts = [self.text + 'edit {}'.format(i) for i in range(6)]
+        memo = MemoFactory(text=texts[0])
+        self.edit(memo, texts[1:])
+        memo = Memo.objects.get(pk=memo.pk)
+        memo.save()
+        revisions = MemoRevision.objects.filter(memo=memo).order_by('number')
+        self.assertEqual(
+            list(revisions.values_list('number', 'is_snapshot')),
+            [(1, True), (2, False), (3, False), (4, True), (5, False), (6, False)],
+        )
+        self.assertEqual(self.get_texts(memo), texts)
+        memo.title = 'New title'
+        bulk_update_memos([memo], ['title'])
+        revision = get_revision(memo.pk, 7)
+        self.assertEqual((revision.title, revision.text, revision.is_snapshot), ('New title', texts[-1], True))
+
+    @override_settings(MEMO_BODY_COMPRESSION='zlib', MEMO_BODY_COMPRESSION_THRESHOLD=100)
+    def test_compressed_snapshots(self):
+        texts = [self.text * 10 + 'edit {}'.format(i) for i in range(4)]
+        memo = MemoFactory(text=texts[0])
+        self.edit(memo, texts[1:])
+        snapshots = MemoRevision.objects.filter(memo=memo, is_snapshot=True)
+        self.assertEqual(list(snapshots.values_list('number', 'content', 'codec')), [(1, '', 'zlib'), (4, '', 'zlib')])
+        self.assertEqual(self.get_texts(memo), texts)
+        self.assertEqual(compact_revisions(keep=2), {'deleted': 2, 'rewritten': 2})
+        self.assertEqual(MemoRevision.objects.get(memo=memo, number=3).codec, 'zlib')
+        self.assertEqual(self.get_texts(memo), texts[2:])
+
+    def test_api(self):
+        memo = MemoFactory(text='Old text')
+        self.edit(memo, ['New text'])
+        res = self.client.get(reverse('memo:api_revisions', kwargs={'slug': memo.slug}))
+        self.assertEqual([revision['number'] for revision in res.json()], [2, 1])
+        with self.assertNumQueries(2):
+            res = self.client.get(reverse('memo:api_revision', kwargs={'slug': memo.slug, 'number': 1}))
+        self.assertEqual(res.json()['text'], 'Old text')
+        res = self.client.get(reverse('memo:api_revision', kwargs={'slug': memo.slug, 'number': 3}))
+        self.assertEqual(res.status_code, 404)
+        res = self.client.get(reverse('memo:api_revisions', kwargs={'slug': 'missing'}))
+        self.assertEqual(res.status_code, 404)
+
+    def test_compact(self):
+        texts = [self.text + 'edit {}'.format(i) for i in range(8)]
+        memo = MemoFactory(text=texts[0])
+        self.edit(memo, texts[1:])
+        call_command('compact_revisions', keep=4, stdout=io.StringIO())
+        revisions = MemoRevision.objects.filter(memo=memo).order_by('number')
+        self.assertEqual(
+            list(revisions.values_list('number', 'is_snapshot')),
+            [(5, True), (6, False), (7, False), (8, True)],
+        )
+        self.assertEqual(self.get_texts(memo), texts[4:])
+        with override_settings(MEMO_REVISION_SNAPSHOT_INTERVAL=10):
+            self.assertEqual(compact_revisions(), {'deleted': 0, 'rewritten': 1})
+        self.assertEqual(self.get_texts(memo), texts[4:])
+        self.assertEqual(compact_revisions(before=timezone.now()), {'deleted': 3, 'rewritten': 1})
+        self.assertEqual(self.get_texts(memo), texts[-1:])
+
+
+class MemoDateCountTests(MemoTestCase):
+
+    def get_counts(self):
+        return dict(MemoDateCount.objects.filter(count__gt=0).values_list('date', 'count'))
+
+    def test_maintained(self):
+        today = memo_date(timezone.now())
+        memo = MemoFactory()
+        bulk_create_memos([Memo(title='Memo', slug='memo-{}'.format(i)) for i in range(3)])
+        self.assertEqual(self.get_counts(), {today: 4})
+        memo.delete()
+        bulk_delete_memos(['memo-0'])
+        self.assertEqual(self.get_counts(), {today: 2})
+
+    def test_rebuild(self):
+        MemoFactory()
+        created = timezone.make_aware(datetime.datetime(2020, 6, 21, 23, 30), datetime.timezone.utc)
+        Memo.objects.update(created_datetime=created)
+        self.assertEqual(rebuild_date_counts(), 1)
+        # 23:30 UTC is the next day in Tokyo
+        self.assertEqual(self.get_counts(), {datetime.date(2020, 6, 22): 1})
+
+
+class MemoAdminTests(MemoTestCase):
+
+    def setUp(self):
+        super().setUp()
+        admin = Author.objects.create_superuser('admin', 'admin@example.com', 'password')
+        self.client.force_login(admin)
+        self.url = reverse('admin:memo_memo_changelist')
+
+    def test_cursor_pages(self):
+        seed_memos(150)
+        res = self.client.get(self.url)
+        self.assertEqual(len(res.context['cl'].result_list), 100)
+        next_url = res.context['cl'].next_url()
+        self.assertIsNone(res.context['cl'].previous_url())
+        res = self.client.get(self.url + next_url)
+        self.assertEqual(len(res.context['cl'].result_list), 50)
+        self.assertIsNone(res.context['cl'].next_url())
+        self.assertEqual(res.context['cl'].result_count, 150)
+        res = self.client.get(self.url, {'cursor': 'invalid'})
+        self.assertEqual(res.status_code, 302)
+
+    def test_sorted_pages(self):
+        seed_memos(5)
+        res = self.client.get(self.url, {'o': '-5'})
+        self.assertIsNone(res.context['cl'].cursor_page)
+        self.assertEqual(len(res.context['cl'].result_list), 5)
+
+    def test_estimated_count(self):
+        seed_memos(5)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        with CaptureQueriesContext(connection) as captured, \
+                mock.patch.object(EstimatedCountPaginator, 'exact_below', 0):
+            res = self.client.get(self.url)
+        self.assertEqual(res.context['cl'].result_count, 5)
+        self.assertFalse([query for query in captured if 'COUNT(' in query['sql'] and '"memo_memo"' in query['sql']])
+
+    def test_search(self):
+        MemoFactory(slug='first-memo', title='買い物リスト')
+        MemoFactory(slug='second-memo', title='会議メモ')
+        res = self.client.get(self.url, {'q': '会議'})
+        self.assertEqual([memo.slug for memo in res.context['cl'].result_list], ['second-memo'])
+
+    def test_date_hierarchy(self):
+        MemoFactory()
+        MemoDateCount.objects.create(date=datetime.date(2019, 1, 1), count=1)
+        with CaptureQueriesContext(connection) as captured:
+            res = self.client.get(self.url)
+        self.assertContains(res, '?created_datetime__year=2019')
+        self.assertFalse([query for query in captured if 'DISTINCT' in query['sql'] and '"memo_memo"' in query['sql']])
+        res = self.client.get(self.url, {'created_datetime__year': '2019'})
+        self.assertContains(res, 'created_datetime__month=1')
+        self.assertEqual(len(res.context['cl'].result_list), 0)
+
+
+class MemoArchiveTests(MemoTestCase):
+
+    def setUp(self):
+        super().setUp()
+        tz = timezone.get_default_timezone()
+        for i, created in enumerate([
+            datetime.datetime(2020, 6, 1, 0, 30), datetime.datetime(2020, 6, 21, 12),
+            datetime.datetime(2020, 6, 21, 13), datetime.datetime(2020, 7, 1),
+        ]):
+            memo = MemoFactory(title='Memo {}'.format(i), slug='memo-{}'.format(i))
+            Memo.objects.filter(pk=memo.pk).update(created_datetime=timezone.make_aware(created, tz))
+        rebuild_date_counts()
+
+    def test_archive(self):
+        with self.assertNumQueries(3):
+            res = self.client.get(reverse('memo:archive', kwargs={'year': 2020, 'month': 6}))
+        self.assertEqual([memo.slug for memo in res.context['memo_list']], ['memo-2', 'memo-1', 'memo-0'])
+        self.assertEqual(res.context['paginator'].count, 3)
+        self.assertEqual(
+            res.context['day_counts'], [(datetime.date(2020, 6, 1), 1), (datetime.date(2020, 6, 21), 2)]
+        )
+        self.assertContains(res, reverse('memo:archive', kwargs={'year': 2020, 'month': 7}))
+        res = self.client.get(reverse('memo:archive', kwargs={'year': 2020, 'month': 13}))
+        self.assertEqual(res.status_code, 404)
+
+    def test_archive_year_range(self):
+        for name in ('memo:archive', 'memo:api_archive'):
+            for year, month in ((0, 1), (9999, 12)):
+                res = self.client.get(reverse(name, kwargs={'year': year, 'month': month}))
+                self.assertEqual(res.status_code, 404)
+            for year, month in ((1, 2), (9999, 11)):
+                res = self.client.get(reverse(name, kwargs={'year': year, 'month': month}))
+                self.assertEqual(res.status_code, 200)
+
+    def test_archive_api(self):
+        res = self.client.get(reverse('memo:api_archive', kwargs={'year': 2020, 'month': 6}))
+        self.assertEqual(res.data['count'], 3)
+        self.assertEqual(res.data['days'], [{'date': '2020-06-01', 'count': 1}, {'date': '2020-06-21', 'count': 2}])
+        self.assertEqual([memo['slug'] for memo in res.data['results']], ['memo-2', 'memo-1', 'memo-0'])
+
+    def test_facets(self):
+        res = self.client.get(reverse('memo:index'))
+        self.assertEqual(res.context['date_facets'], [(datetime.date(2020, 7, 1), 1), (datetime.date(2020, 6, 1), 3)])
+        res = self.client.get(reverse('memo:api_search'), {'keyword': 'Memo 1', 'facets': 'month'})
+        self.assertEqual(len(res.data['results']), 1)
+        self.assertEqual(res.data['facets'], {'month': [{'month': '2020-06', 'count': 1}]})
+        res = self.client.get(reverse('memo:api_search'), {'keyword': 'Memo'})
+        self.assertEqual(len(res.data['results']), 4)
+        self.assertNotIn('facets', res.data)
+
+    def test_rebuild_command(self):
+        MemoDateCount.objects.all().delete()
+        call_command('rebuild_date_counts', stdout=io.StringIO())
+        self.assertEqual(get_day_counts(2020, 7), [(datetime.date(2020, 7, 1), 1)])
@@ -16,7 +16,9 @@ Including another URLconf
 from django.urls import path
 
 from .views import (
-    MemoList, MemoDetail, MemoCreate, MemoDelete, MemoUpdate, MemoListAPI, MemoRetirieveAPI, MemoCreateAPI, MemoUpdateAPI, MemoDestroyAPI,
+    MemoList, MemoDetail, MemoCreate, MemoDelete, MemoUpdate, MemoListAPI, MemoSearchAPI, MemoRetirieveAPI, MemoCreateAPI, MemoUpdateAPI, MemoDestroyAPI,
+    MemoBulkCreateAPI, MemoBulkUpdateAPI, MemoBulkDestroyAPI, MemoExportAPI, MemoChangesAPI, MetricsView,
+    MemoArchive, MemoArchiveAPI, MemoRevisionListAPI, MemoRevisionAPI,
 )
 
 app_name = 'memo'
@@ -26,9 +28,20 @@ urlpatterns = [
     path('detail/<slug:slug>', MemoDetail.as_view(), name='detail'),
     path('delete/<slug:slug>', MemoDelete.as_view(), name='delete_memo'),
     path('edit/<slug:slug>', MemoUpdate.as_view(), name='edit_memo'),
+    path('archive/<int:year>/<int:month>', MemoArchive.as_view(), name='archive'),
     path('api/memos/', MemoListAPI.as_view(), name='api_list'),
+    path('api/memos/search/', MemoSearchAPI.as_view(), name='api_search'),
     path('api/memos/detail/<slug:slug>/', MemoRetirieveAPI.as_view(), name='api_retrieve'),
     path('api/memos/new/', MemoCreateAPI.as_view(), name='api_create'),
     path('api/memos/edit/<slug:slug>/', MemoUpdateAPI.as_view(), name='api_update'),
     path('api/memos/delete/<slug:slug>/', MemoDestroyAPI.as_view(), name='api_delete'),
+    path('api/memos/bulk/new/', MemoBulkCreateAPI.as_view(), name='api_bulk_create'),
+    path('api/memos/bulk/edit/', MemoBulkUpdateAPI.as_view(), name='api_bulk_update'),
+    path('api/memos/bulk/delete/', MemoBulkDestroyAPI.as_view(), name='api_bulk_delete'),
+    path('api/memos/export/', MemoExportAPI.as_view(), name='api_export'),
+    path('api/memos/changes/', MemoChangesAPI.as_view(), name='api_changes'),
+    path('api/memos/archive/<int:year>/<int:month>/', MemoArchiveAPI.as_view(), name='api_archive'),
+    path('api/memos/revisions/<slug:slug>/', MemoRevisionListAPI.as_view(), name='api_revisions'),
+    path('api/memos/revisions/<slug:slug>/<int:number>/', MemoRevisionAPI.as_view(), name='api_revision'),
+    path('metrics/', MetricsView.as_view(), name='metrics'),
 ]
@@ -1,24 +1,46 @@
+import datetime
+
+from django.conf import settings
+from django.db import router, transaction
+from django.core.exceptions import PermissionDenied
+from django.http import Http404, HttpResponse, HttpResponseBadRequest, JsonResponse, StreamingHttpResponse
 from django.shortcuts import resolve_url
 from django.urls import reverse_lazy
 from django.views.generic import (
-    ListView, DetailView, CreateView, DeleteView, UpdateView,
+    View, ListView, DetailView, CreateView, DeleteView, UpdateView,
 )
+from rest_framework import serializers, status
 from rest_framework.generics import (
-    ListAPIView, RetrieveAPIView, CreateAPIView, UpdateAPIView, DestroyAPIView,
+    GenericAPIView, ListAPIView, RetrieveAPIView, CreateAPIView, UpdateAPIView, DestroyAPIView,
 )
+from rest_framework.response import Response
 
+from .bulk import bulk_delete_memos
+from .export import CONTENT_TYPES, EXPORT_FORMATS, export_queryset, iter_export, iter_rows, parse_timestamp
 from .forms import MemoForm, MemoSearchForm
-from .models import Memo
+from .mixins import (
+    CachedDetailMixin, CachedListAPIMixin, CachedListMixin, CachedRetrieveAPIMixin, DateFacetsAPIMixin,
+    FastJSONMixin, MemoDetailConditionalMixin, MemoListConditionalMixin, ReplicaReadMixin, SparseFieldsAPIMixin,
+)
+from .metrics import format_prometheus, registry
+from .models import Memo, MemoRevision
+from .pagination import CachedCountPaginator, CursorPaginator, InvalidCursor, KnownCountPaginator, MemoCursorPagination
+from .pool import pool_stats
+from .revisions import get_revision
+from .rollups import date_facets, get_day_counts, get_month_counts, month_range
 from .serializers import (
-    MemoListSerializer, MemoRetrieveSerializer, MemoCreateSerializer, MemoUpdateSerializer, MemoDestroySerializer,
+    MemoListSerializer, MemoListValuesSerializer, MemoRetrieveSerializer, MemoCreateSerializer, MemoUpdateSerializer, MemoDestroySerializer,
+    MemoTombstoneSerializer, MemoRevisionListSerializer, MemoRevisionSerializer,
 )
+from .sync import get_changes
 
 # Create your views here.
 
-class MemoList(ListView):
+class MemoList(ReplicaReadMixin, MemoListConditionalMixin, CachedListMixin, ListView):
     model = Memo
     template_name = 'memo/index.html'
     paginate_by = 10
+    paginator_class = CachedCountPaginator
 
     def get_queryset(self):
         form = MemoSearchForm(self.request.GET)
@@ -26,14 +48,84 @@ class MemoList(ListView):
         queryset = form.filter_memos(queryset)
         return queryset
 
+    def get_paginator(self, queryset, per_page, **kwargs):
+        if not self.request.GET.get('keyword'):
+            # Every memo is listed, as counted by the list state
+            return KnownCountPaginator(queryset, per_page, count=self.get_list_state()['count'], **kwargs)
+        count_key = (self.request.GET.get('keyword', ''), self.request.GET.get('mode', ''))
+        return super().get_paginator(queryset, per_page, count_key=count_key, **kwargs)
+
+    def use_cursor_pagination(self):
+        return (
+            'cursor' in self.request.GET
+            or getattr(settings, 'MEMO_LIST_PAGINATION', 'page') == 'cursor'
+        )
+
+    def paginate_queryset(self, queryset, page_size):
+        if not self.use_cursor_pagination():
+            return super().paginate_queryset(queryset, page_size)
+        paginator = CursorPaginator(queryset, page_size)
+        try:
+            page = paginator.page(self.request.GET.get('cursor'))
+        except InvalidCursor:
+            raise Http404('Invalid cursor')
+        return (paginator, page, page.object_list, page.has_other_pages())
+
     def get_context_data(self):
         context = super().get_context_data()
         context['search_form'] = MemoSearchForm(self.request.GET)
+        context['cursor_pagination'] = self.use_cursor_pagination()
+        context['date_facets'] = date_facets(self.object_list)
         return context
 
 
-class MemoDetail(DetailView):
+class MemoArchiveMixin:
+    """
+    Memos created in the year and month of the URL, in the default time zone
+    """
+
+    def get_month(self):
+        year, month = self.kwargs['year'], self.kwargs['month']
+        if not 1 <= month <= 12:
+            raise Http404('Invalid month')
+        # Months at the ends of the datetime range have no aware start or end
+        try:
+            month_range(year, month)
+        except (ValueError, OverflowError):
+            raise Http404('Invalid month')
+        return year, month
+
+    def get_queryset(self):
+        start, end = month_range(*self.get_month())
+        return super().get_queryset().filter(created_datetime__gte=start, created_datetime__lt=end)
+
+    def get_day_counts(self):
+        if not hasattr(self, '_day_counts'):
+            self._day_counts = get_day_counts(*self.get_month())
+        return self._day_counts
+
+
+class MemoArchive(ReplicaReadMixin, CachedListMixin, MemoArchiveMixin, ListView):
     model = Memo
+    template_name = 'memo/archive.html'
+    paginate_by = 10
+
+    def get_paginator(self, queryset, per_page, **kwargs):
+        # Counted from the rollups rather than the memos
+        count = sum(count for date, count in self.get_day_counts())
+        return KnownCountPaginator(queryset, per_page, count=count, **kwargs)
+
+    def get_context_data(self):
+        context = super().get_context_data()
+        year, month = self.get_month()
+        context['month'] = datetime.date(year, month, 1)
+        context['day_counts'] = self.get_day_counts()
+        context['date_facets'] = get_month_counts()
+        return context
+
+
+class MemoDetail(ReplicaReadMixin, MemoDetailConditionalMixin, CachedDetailMixin, DetailView):
+    queryset = Memo.objects.select_related('body')
     template_name = 'memo/detail.html'
 
 
@@ -51,18 +143,74 @@ class MemoDelete(DeleteView):
 
 
 class MemoUpdate(UpdateView):
-    model = Memo
+    queryset = Memo.objects.select_related('body')
     form_class = MemoForm
     template_name = 'memo/edit.html'
     success_url = reverse_lazy('memo:index')
 
 
-class MemoListAPI(ListAPIView):
+class MemoListAPI(ReplicaReadMixin, MemoListConditionalMixin, CachedListAPIMixin, FastJSONMixin, SparseFieldsAPIMixin, ListAPIView):
     queryset = Memo.objects.all()
+    serializer_class = MemoListValuesSerializer
+    pagination_class = MemoCursorPagination
+    # The cursors are built from the ordering columns
+    required_fields = CursorPaginator.ordering_fields
+    use_values = True
+
+
+class MemoSearchAPI(ReplicaReadMixin, MemoListConditionalMixin, CachedListAPIMixin, DateFacetsAPIMixin, ListAPIView):
     serializer_class = MemoListSerializer
+    pagination_class = MemoCursorPagination
+
+    def get_queryset(self):
+        form = MemoSearchForm(self.request.query_params)
+        return form.filter_memos(Memo.objects.all())
+
+
+class MemoArchiveAPI(ReplicaReadMixin, CachedListAPIMixin, MemoArchiveMixin, ListAPIView):
+    queryset = Memo.objects.all()
+    serializer_class = MemoListSerializer
+    pagination_class = MemoCursorPagination
+
+    def get_paginated_response(self, data):
+        response = super().get_paginated_response(data)
+        day_counts = self.get_day_counts()
+        response.data['count'] = sum(count for date, count in day_counts)
+        response.data['days'] = [{'date': date.isoformat(), 'count': count} for date, count in day_counts]
+        return response
+
+
+class MemoRevisionMixin:
+    """
+    Look up the revisions of the memo of the slug in the URL
+    """
+
+    def get_memo(self):
+        memo = Memo.objects.filter(slug=self.kwargs['slug']).only('id').first()
+        if memo is None:
+            raise Http404('No memo found matching the query')
+        return memo
+
+
+class MemoRevisionListAPI(ReplicaReadMixin, MemoRevisionMixin, ListAPIView):
+    serializer_class = MemoRevisionListSerializer
+
+    def get_queryset(self):
+        return self.get_memo().revisions.only('number', 'title', 'created_datetime').order_by('-number')
+
+
+class MemoRevisionAPI(ReplicaReadMixin, MemoRevisionMixin, RetrieveAPIView):
+    serializer_class = MemoRevisionSerializer
+
+    def get_object(self):
+        memo = self.get_memo()
+        try:
+            return get_revision(memo.pk, self.kwargs['number'], using=memo._state.db)
+        except MemoRevision.DoesNotExist:
+            raise Http404('No revision found matching the query')
 
 
-class MemoRetirieveAPI(RetrieveAPIView):
+class MemoRetirieveAPI(ReplicaReadMixin, MemoDetailConditionalMixin, CachedRetrieveAPIMixin, SparseFieldsAPIMixin, RetrieveAPIView):
     queryset = Memo.objects.all()
     serializer_class = MemoRetrieveSerializer
     lookup_field = 'slug'
@@ -83,3 +231,119 @@ class MemoDestroyAPI(DestroyAPIView):
     queryset = Memo.objects.all()
     serializer_class = MemoDestroySerializer
     lookup_field = 'slug'
+
+
+class MemoBulkCreateAPI(GenericAPIView):
+    queryset = Memo.objects.all()
+    serializer_class = MemoCreateSerializer
+
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data, many=True)
+        with transaction.atomic(using=router.db_for_write(Memo)):
+            serializer.is_valid(raise_exception=True)
+            memos = serializer.save()
+        results = [{'slug': memo.slug, 'status': 'created'} for memo in memos]
+        return Response(results, status=status.HTTP_201_CREATED)
+
+
+class MemoBulkUpdateAPI(GenericAPIView):
+    queryset = Memo.objects.all()
+    serializer_class = MemoUpdateSerializer
+
+    def put(self, request, *args, **kwargs):
+        return self.update(request, partial=False)
+
+    def patch(self, request, *args, **kwargs):
+        return self.update(request, partial=True)
+
+    def update(self, request, partial):
+        with transaction.atomic(using=router.db_for_write(Memo)):
+            serializer = self.get_serializer(
+                self.get_queryset().select_for_update(), data=request.data, many=True, partial=partial
+            )
+            serializer.is_valid(raise_exception=True)
+            memos = serializer.save()
+        results = [{'slug': memo.slug, 'status': 'updated'} for memo in memos]
+        return Response(results)
+
+
+class MemoBulkDestroyAPI(GenericAPIView):
+    queryset = Memo.objects.all()
+
+    def delete(self, request, *args, **kwargs):
+        field = serializers.ListField(
+            child=serializers.SlugField(), allow_empty=False,
+            max_length=getattr(settings, 'MEMO_BULK_MAX_SIZE', 1000),
+        )
+        slugs = field.run_validation(request.data)
+        with transaction.atomic(using=router.db_for_write(Memo)):
+            deleted = bulk_delete_memos(slugs)
+        results = [
+            {'slug': slug, 'status': 'deleted' if slug in deleted else 'not_found'}
+            for slug in slugs
+        ]
+        return Response(results)
+
+
+class MemoChangesAPI(GenericAPIView):
+    """
+    Feed of the memos changed after the sequence `since`
+
+    Clients apply `deleted` before `memos` and pass back `sequence` until
+    `has_more` is false.
+    """
+    queryset = Memo.objects.all()
+    serializer_class = MemoRetrieveSerializer
+    page_size = 100
+    max_page_size = 1000
+
+    def get(self, request, *args, **kwargs):
+        since = serializers.IntegerField(min_value=0, required=False).run_validation(
+            request.query_params.get('since', 0)
+        )
+        limit = serializers.IntegerField(min_value=1, max_value=self.max_page_size).run_validation(
+            request.query_params.get('limit', self.page_size)
+        )
+        memos, tombstones, sequence, has_more = get_changes(since, limit)
+        return Response({
+            'sequence': sequence,
+            'has_more': has_more,
+            'memos': self.get_serializer(memos, many=True).data,
+            'deleted': MemoTombstoneSerializer(tombstones, many=True).data,
+        })
+
+
+class MetricsView(View):
+    """
+    Request histograms and connection pool stats of this process in the
+    Prometheus text format, or the histograms as JSON with ?format=json
+    """
+
+    def get(self, request, *args, **kwargs):
+        if not (request.META.get('REMOTE_ADDR') in settings.INTERNAL_IPS or request.user.is_staff):
+            raise PermissionDenied
+        snapshot = registry.snapshot()
+        if request.GET.get('format') == 'json':
+            return JsonResponse(snapshot)
+        return HttpResponse(format_prometheus(snapshot, pool_stats()), content_type='text/plain; version=0.0.4')
+
+
+class MemoExportAPI(View):
+    chunk_size = 1000
+
+    def get(self, request, *args, **kwargs):
+        export_format = request.GET.get('format', 'ndjson')
+        if export_format not in EXPORT_FORMATS:
+            return HttpResponseBadRequest('Unknown format: {}'.format(export_format))
+        try:
+            updated_since = parse_timestamp(request.GET['updated_since']) if request.GET.get('updated_since') else None
+            updated_until = parse_timestamp(request.GET['updated_until']) if request.GET.get('updated_until') else None
+        except ValueError as e:
+            return HttpResponseBadRequest(str(e))
+
+        rows = iter_rows(export_queryset(updated_since, updated_until), chunk_size=self.chunk_size)
+        response = StreamingHttpResponse(
+            iter_export(export_format, rows), content_type=CONTENT_TYPES[export_format]
+        )
+        response['Content-Disposition'] = 'attachment; filename="memos.{}"'.format(export_format)
+        return response